@@ -4,67 +4,54 @@ Random Martingale Trading Bot - 优化版本
 优化了配置管理，所有配置集中到config.json
 """
 
-import MetaTrader5 as mt5
+import importlib
+import signal
+import sys
+import queue
+import threading
 import time
-import random
 import os
 import json
-from datetime import datetime, timedelta
-from typing import Optional, Tuple, Dict, Any, List
-from dataclasses import dataclass, asdict
-from enum import Enum
+from decimal import Decimal
+from typing import Optional, Tuple, Dict, Any, List, Set
+from dataclasses import dataclass
 import logging
+from concurrent.futures import Future
+from contextlib import contextmanager
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('trading_bot.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
+from martingale_core import (
+    Clock, ConfigManager, DecisionScheduler, MartingaleManager, MT5Config, OrderType, SeedManager,
+    TradeResult, TradeStrategy, TradingConfig
 )
-logger = logging.getLogger(__name__)
+from martingale_core import strategy as core_strategy
 
 
-class OrderType(Enum):
-    """订单类型枚举"""
-    BUY = mt5.ORDER_TYPE_BUY
-    SELL = mt5.ORDER_TYPE_SELL
+class _LazyModule:
+    """首次访问属性时才导入的模块，导入本模块不需要安装 MetaTrader5，也不加载 NumPy"""
+    
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+    
+    def __getattr__(self, attribute: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
 
 
-class TradeResult(Enum):
-    """交易结果枚举"""
-    PROFIT = "profit"
-    LOSS = "loss"
-    BREAK_EVEN = "break_even"
+mt5 = _LazyModule("MetaTrader5")
+np = _LazyModule("numpy")
 
+logger = logging.getLogger(__name__)
 
-@dataclass
-class TradingConfig:
-    """交易配置"""
-    symbol: str = "XAUUSDm"
-    base_lot_size: float = 0.01
-    max_martingale_multiplier: int = 8
-    cooling_time: int = 64
-    check_interval: int = 5
-    magic_number: int = 234000
-    deviation: int = 20
-    seed: int = 1006111951111
-    
-    def to_dict(self) -> Dict[str, Any]:
-        return asdict(self)
-    
-    @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'TradingConfig':
-        return cls(**data)
+# 交易过程日志来自本模块和策略核心
+TRADING_LOGGERS = (__name__, "martingale_core.config", "martingale_core.strategy")
 
 
-@dataclass
-class TradeStrategy:
-    """交易策略"""
-    tp_points: int
-    sl_points: int
+def setup_logging(log_file: str = 'trading_bot.log', events_file: str = 'trading_events.jsonl'):
+    """由程序入口调用：交易线程只入队日志记录，后台线程写文本日志、JSON lines 事件和控制台"""
+    import log_pipeline
+    return log_pipeline.setup(log_file, events_file)
 
 
 @dataclass
@@ -74,248 +61,230 @@ class PositionInfo:
     order_type: OrderType
     lot_size: float
     ticket: int
+    sl_price: Optional[float] = None
+    tp_price: Optional[float] = None
+    
+    @classmethod
+    def from_position(cls, position) -> 'PositionInfo':
+        """从 mt5.positions_get 返回的持仓构建"""
+        order_type = OrderType.BUY if position.type == mt5.POSITION_TYPE_BUY else OrderType.SELL
+        return cls(
+            open_price=position.price_open,
+            order_type=order_type,
+            lot_size=position.volume,
+            ticket=position.ticket,
+            sl_price=position.sl or None,
+            tp_price=position.tp or None
+        )
 
 
 @dataclass
-class MT5Config:
-    """MT5连接配置"""
-    login: int
-    server: str
-    password: str
+class LossStreak:
+    """历史连续亏损统计"""
+    count: int = 0
+    total_loss: float = 0.0
+    last_lot_size: float = 0.0
+
+
+class BarRing:
+    """固定容量的K线环形缓冲区
+
+    每根K线同时写入 i 和 i+capacity 两个位置，因此最近任意N根都是一段连续内存，
+    view() 及其字段（如 view()['close']）都是不复制的视图。
+    """
     
-    def to_dict(self) -> Dict[str, Any]:
-        return asdict(self)
+    def __init__(self, capacity: int, dtype: 'np.dtype'):
+        self.capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype=dtype)
+        self._count = 0
     
-    @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'MT5Config':
-        return cls(**data)
-
-
-class ConfigManager:
-    """配置管理器 - 优化版本"""
-    
-    def __init__(self, config_file: str = "config.json"):
-        self.config_file = config_file
-        self.last_modified = 0
-        self.config = self._load_config()
-    
-    def _load_config(self) -> Dict[str, Any]:
-        """加载配置文件"""
-        default_config = {
-            "mt5": {
-                "login": 0,
-                "server": "",
-                "password": ""
-            },
-            "trading": {
-                "symbol": "XAUUSDm",
-                "base_lot_size": 0.01,
-                "max_martingale_multiplier": 8,
-                "cooling_time": 64,
-                "magic_number": 234000,
-                "deviation": 20,
-                "seed": 1006111951111
-            }
-        }
-        
-        if not os.path.exists(self.config_file):
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(default_config, f, indent=2, ensure_ascii=False)
-            logger.info(f"创建默认配置文件: {self.config_file}")
-            return default_config
-        
-        try:
-            with open(self.config_file, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-                
-            # 确保配置完整性，添加缺失的字段
-            updated = False
-            for section, default_values in default_config.items():
-                if section not in config:
-                    config[section] = default_values
-                    updated = True
-                else:
-                    for key, value in default_values.items():
-                        if key not in config[section]:
-                            config[section][key] = value
-                            updated = True
-            
-            if updated:
-                with open(self.config_file, 'w', encoding='utf-8') as f:
-                    json.dump(config, f, indent=2, ensure_ascii=False)
-                logger.info("配置文件已更新，添加了缺失的字段")
-                
-            return config
-        except Exception as e:
-            logger.error(f"加载配置文件失败: {e}")
-            return default_config
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
     
-    def check_for_updates(self) -> bool:
-        """检查配置文件是否有更新"""
-        if not os.path.exists(self.config_file):
-            return False
-            
-        current_modified = os.path.getmtime(self.config_file)
-        if current_modified > self.last_modified:
-            new_config = self._load_config()
-            if new_config != self.config:
-                self.config = new_config
-                self.last_modified = current_modified
-                return True
-                
-        return False
+    @property
+    def last_time(self) -> Optional[int]:
+        """最新一根K线的开盘时间"""
+        if self._count == 0:
+            return None
+        return int(self._data[(self._count - 1) % self.capacity]['time'])
     
-    def get_mt5_config(self) -> MT5Config:
-        """获取MT5配置"""
-        mt5_config = self.config.get("mt5", {})
-        return MT5Config.from_dict(mt5_config)
+    def append(self, bar):
+        """追加一根K线"""
+        index = self._count % self.capacity
+        self._data[index] = bar
+        self._data[index + self.capacity] = bar
+        self._count += 1
     
-    def get_trading_config(self) -> TradingConfig:
-        """获取交易配置"""
-        trading_config = self.config.get("trading", {})
-        return TradingConfig.from_dict(trading_config)
+    def replace_last(self, bar):
+        """用新数据覆盖最新一根K线（未走完的K线）"""
+        index = (self._count - 1) % self.capacity
+        self._data[index] = bar
+        self._data[index + self.capacity] = bar
     
-    def update_trading_config(self, updates: Dict[str, Any]) -> bool:
-        """更新交易配置"""
-        try:
-            if "trading" not in self.config:
-                self.config["trading"] = {}
-                
-            self.config["trading"].update(updates)
-            
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=2, ensure_ascii=False)
-                
-            self.last_modified = os.path.getmtime(self.config_file)
-            logger.info("交易配置已更新")
-            return True
-        except Exception as e:
-            logger.error(f"更新交易配置失败: {e}")
-            return False
+    def update_last(self, price: float):
+        """用最新价格更新未走完K线的收盘价和高低价"""
+        index = (self._count - 1) % self.capacity
+        for position in (index, index + self.capacity):
+            bar = self._data[position]
+            bar['close'] = price
+            bar['high'] = max(bar['high'], price)
+            bar['low'] = min(bar['low'], price)
+    
+    def view(self, count: Optional[int] = None) -> 'np.ndarray':
+        """按时间顺序返回最近 count 根K线的视图（不复制）"""
+        count = len(self) if count is None else min(count, len(self))
+        end = self._count % self.capacity + self.capacity
+        return self._data[end - count:end]
 
 
-class SeedManager:
-    """种子管理器 - 简化版本，从配置管理器获取种子"""
-    
-    def __init__(self, config_manager: ConfigManager):
-        self.config_manager = config_manager
-        self.current_seed = self.config_manager.get_trading_config().seed
-    
-    def get_seed(self) -> int:
-        """获取当前种子，如果配置有更新则重新加载"""
-        if self.config_manager.check_for_updates():
-            new_seed = self.config_manager.get_trading_config().seed
-            if new_seed != self.current_seed:
-                self.current_seed = new_seed
-                logger.info(f"种子配置已更新: {self.current_seed}")
-        
-        return self.current_seed
-
-
-class StrategyCalculator:
-    """策略计算器"""
-    
-    # 策略映射表：(K线形态, 随机数1, 随机数2, 随机数3) -> (TP点数, SL点数)
-    STRATEGY_MAP = {
-        (1, 1, 1, 1): TradeStrategy(4, 1),  # 阳阳阳阳
-        (1, 1, 1, 0): TradeStrategy(3, 2),  # 阳阳阳阴
-        (1, 1, 0, 1): TradeStrategy(2, 3),  # 阳阳阴阳
-        (1, 1, 0, 0): TradeStrategy(3, 2),  # 阳阳阴阴
-        (1, 0, 1, 1): TradeStrategy(2, 3),  # 阳阴阳阳
-        (1, 0, 1, 0): TradeStrategy(1, 4),  # 阳阴阳阴
-        (1, 0, 0, 1): TradeStrategy(2, 3),  # 阳阴阴阳
-        (1, 0, 0, 0): TradeStrategy(3, 2),  # 阳阴阴阴
-        (0, 1, 1, 1): TradeStrategy(3, 2),  # 阴阳阳阳
-        (0, 1, 1, 0): TradeStrategy(2, 3),  # 阴阳阳阴
-        (0, 1, 0, 1): TradeStrategy(1, 4),  # 阴阳阴阳
-        (0, 1, 0, 0): TradeStrategy(2, 3),  # 阴阳阴阴
-        (0, 0, 1, 1): TradeStrategy(3, 2),  # 阴阴阳阳
-        (0, 0, 1, 0): TradeStrategy(2, 3),  # 阴阴阳阴
-        (0, 0, 0, 1): TradeStrategy(3, 2),  # 阴阴阴阳
-        (0, 0, 0, 0): TradeStrategy(4, 1),  # 阴阴阴阴
-    }
+class BarCache:
+    """单品种多周期K线缓存 - 只拉取比缓存中最新K线更新的部分"""
     
-    @staticmethod
-    def get_candle_pattern(symbol: str) -> Optional[int]:
-        """获取当前K线的阴阳形态"""
-        rates = mt5.copy_rates_from_pos(symbol, mt5.TIMEFRAME_M1, 0, 1)
-        if rates is None or len(rates) == 0:
-            return None
+    def __init__(self, symbol: str, capacity: int = 1440):
+        self.symbol = symbol
+        self.capacity = capacity
+        self._rings: Dict[int, BarRing] = {}
+        self._timeframe_seconds = {
+            mt5.TIMEFRAME_M1: 60, mt5.TIMEFRAME_M5: 300, mt5.TIMEFRAME_M15: 900,
+            mt5.TIMEFRAME_M30: 1800, mt5.TIMEFRAME_H1: 3600, mt5.TIMEFRAME_H4: 14400,
+            mt5.TIMEFRAME_D1: 86400,
+        }
+    
+    def update(self, timeframe: int) -> bool:
+        """同步指定周期的K线，成功返回 True"""
+        ring = self._rings.get(timeframe)
+        if ring is None:
+            rates = mt5.copy_rates_from_pos(self.symbol, timeframe, 0, self.capacity)
+            if rates is None or len(rates) == 0:
+                return False
+            ring = BarRing(self.capacity, rates.dtype)
+            for bar in rates:
+                ring.append(bar)
+            self._rings[timeframe] = ring
+            return True
         
-        latest_candle = rates[0]
-        open_price = latest_candle['open']
-        close_price = latest_candle['close']
+        seconds = self._timeframe_seconds[timeframe]
+        last_time = ring.last_time
+        tick = mt5.symbol_info_tick(self.symbol)
+        if tick is not None and tick.time < last_time + seconds:
+            # 仍在同一根K线内，直接用tick更新，不访问K线数据
+            ring.update_last(tick.bid)
+            return True
         
-        return 1 if close_price > open_price else 0
+        # 出现新K线：只拉取缓存之后的部分（含正在形成的K线）
+        missing = (tick.time - last_time) // seconds + 1 if tick is not None else 1
+        rates = mt5.copy_rates_from_pos(self.symbol, timeframe, 0, int(min(self.capacity, missing + 1)))
+        if rates is None or len(rates) == 0:
+            return False
+        for bar in rates:
+            if bar['time'] == last_time:
+                ring.replace_last(bar)
+            elif bar['time'] > last_time:
+                ring.append(bar)
+                last_time = int(bar['time'])
+        return True
     
-    @staticmethod
-    def generate_random_sequence(seed: int) -> Tuple[int, int, int]:
-        """基于种子和当前时间戳生成3个随机数"""
-        current_timestamp = int(time.time())
-        combined_seed = seed + current_timestamp
-        random.seed(combined_seed)
-        
-        return (
-            random.randint(0, 1),
-            random.randint(0, 1),
-            random.randint(0, 1)
-        )
+    def bars(self, timeframe: int, count: Optional[int] = None) -> Optional['np.ndarray']:
+        """同步后返回最近 count 根K线（最后一根为正在形成的K线）"""
+        if not self.update(timeframe):
+            return None
+        return self._rings[timeframe].view(count)
+
+
+class StrategyCalculator(core_strategy.StrategyCalculator):
+    """策略计算器 - 在策略核心之上从MT5终端读取当前K线"""
     
-    @classmethod
-    def get_trade_strategy(cls, candle_pattern: int, r1: int, r2: int, r3: int) -> Tuple[OrderType, TradeStrategy]:
-        """根据4位序列获取交易策略"""
-        sequence = (candle_pattern, r1, r2, r3)
-        strategy = cls.STRATEGY_MAP.get(sequence, TradeStrategy(2, 2))
-        
-        # 判断开仓方向：随机数中阳的数量大于阴就开多，否则开空
-        yang_count = sum([r1, r2, r3])
-        order_type = OrderType.BUY if yang_count > 1 else OrderType.SELL
+    @staticmethod
+    def get_candle_pattern(symbol: str, bar_cache: Optional[BarCache] = None) -> Optional[int]:
+        """获取最近一根已收盘K线的阴阳形态（与回测相同），提供 bar_cache 时从缓存读取
         
-        return order_type, strategy
+        决策时刻在新K线开盘后 decision_offset 秒，此时正在形成的K线几乎没有走势，因此读取上一根。
+        """
+        if bar_cache is not None:
+            rates = bar_cache.bars(mt5.TIMEFRAME_M1, 2)
+            rates = rates[:-1] if rates is not None else None
+        else:
+            rates = mt5.copy_rates_from_pos(symbol, mt5.TIMEFRAME_M1, 1, 1)
+        return StrategyCalculator.candle_pattern(rates)
 
 
-class MartingaleManager:
-    """马丁格尔管理器"""
+class StateJournal:
+    """马丁格尔状态日志 - 追加写入、批量fsync、定期压缩，重启时直接恢复手数与累计亏损"""
     
-    def __init__(self, base_lot_size: float, max_multiplier: int = 8):
-        self.base_lot_size = base_lot_size
-        self.max_multiplier = max_multiplier
-        self.cumulative_loss = 0.0
+    def __init__(self, file_path: str, clock: Optional[Clock] = None,
+                 sync_every: int = 8, compact_every: int = 1000):
+        self.file_path = file_path
+        self.clock = clock or Clock()
+        self.sync_every = sync_every          # 累计多少条未落盘记录后强制 fsync
+        self.compact_every = compact_every    # 日志超过多少条记录后压缩为一条快照
+        self.state: Optional[Dict[str, Any]] = None
+        self._file = None
+        self._pending = 0
+        self._records = 0
     
-    def calculate_next_lot_size(self, current_lot_size: float, result: TradeResult, pnl: float) -> float:
-        """计算下一次交易的手数"""
-        max_lot_size = self.base_lot_size * self.max_multiplier
+    def load(self) -> Optional[Dict[str, Any]]:
+        """读取最后一条完整记录，忽略崩溃时写了一半的行"""
+        if not os.path.exists(self.file_path):
+            return None
         
-        if result == TradeResult.PROFIT:
-            # 更新累计亏损：减去本次盈利
-            self.cumulative_loss = max(0, self.cumulative_loss - abs(pnl))
-            
-            if self.cumulative_loss > 0:
-                # 还有未回本的亏损，马丁倍数减半
-                new_lot_size = max(self.base_lot_size, current_lot_size / 2)
-                multiplier = new_lot_size / self.base_lot_size
-                logger.info(f"盈利 +{abs(pnl):.2f} USD | 累计亏损: -{self.cumulative_loss:.2f} USD | 未回本，马丁减半: {multiplier:.0f}x")
-            else:
-                # 已回本，重置为基础手数
-                new_lot_size = self.base_lot_size
-                logger.info(f"盈利 +{abs(pnl):.2f} USD | 已回本 | 马丁重置: 1x")
-        
-        elif result == TradeResult.LOSS:
-            # 累计亏损增加
-            self.cumulative_loss += abs(pnl)
-            
-            # 亏损后倍增手数，但不超过最大手数
-            new_lot_size = min(max_lot_size, current_lot_size * 2)
-            multiplier = new_lot_size / self.base_lot_size
-            logger.error(f"亏损 {pnl:.2f} USD | 累计亏损: -{self.cumulative_loss:.2f} USD | 下一次马丁倍数: {multiplier:.0f}x")
+        torn = False
+        with open(self.file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    self.state = json.loads(line)
+                    self._records += 1
+                except ValueError:
+                    torn = True
+                    continue
+                torn = not line.endswith('\n')
+        
+        if torn and self.state is not None:
+            # 清理残缺行，避免后续追加写到半行之后
+            self.compact()
+        return self.state
+    
+    def append(self, **state: Any):
+        """追加一条完整状态记录"""
+        record = {"time": round(self.clock.time(), 3), **state}
+        if self._file is None:
+            self._file = open(self.file_path, 'a', encoding='utf-8')
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        self.state = record
+        self._pending += 1
+        self._records += 1
         
-        else:  # BREAK_EVEN
-            # 平手时保持当前手数
-            new_lot_size = current_lot_size
-            multiplier = new_lot_size / self.base_lot_size
-            logger.info(f"平手 {pnl:.2f} USD | 累计亏损: -{self.cumulative_loss:.2f} USD | 下一次马丁倍数: {multiplier:.0f}x")
+        if self._pending >= self.sync_every:
+            self.sync()
+        if self._records >= self.compact_every:
+            self.compact()
+    
+    def sync(self):
+        """把已写入的记录 fsync 到磁盘"""
+        if self._file is not None and self._pending:
+            os.fsync(self._file.fileno())
+            self._pending = 0
+    
+    def compact(self):
+        """用最新状态的单条快照原子替换日志文件"""
+        if self.state is None:
+            return
+        self.close()
         
-        return new_lot_size
+        temp_path = self.file_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(self.state, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.file_path)
+        self._records = 1
+    
+    def close(self):
+        """落盘并关闭文件"""
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
 
 
 class MT5Connector:
@@ -355,102 +324,590 @@ class MT5Connector:
         self.disconnect()
 
 
-class TradeExecutor:
-    """交易执行器"""
+class MT5Gateway:
+    """MT5 串行请求队列 - MetaTrader5 模块不是线程安全的，所有终端调用都交给同一个线程按顺序执行
+    
+    接口与 MetaTrader5 模块相同：常量直接透传，函数调用排队后阻塞等待结果。
+    调用失败（返回 None/False）时在同一线程内取 last_error，按调用线程分别保存，避免被其他线程的调用覆盖。
+    """
+    
+    def __init__(self, module):
+        self._module = module
+        self._requests: queue.Queue = queue.Queue()
+        self._errors = threading.local()
+        self._functions: Dict[str, Any] = {}
+        self._thread = threading.Thread(target=self._serve, name="mt5-gateway", daemon=True)
+        self._thread.start()
+    
+    def _serve(self):
+        while True:
+            future, function, args, kwargs = self._requests.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = function(*args, **kwargs)
+                error = self._module.last_error() if result is None or result is False else None
+                future.set_result((result, error))
+            except BaseException as e:
+                future.set_exception(e)
+    
+    def call(self, function, *args, **kwargs):
+        """在请求线程中执行 function 并返回结果"""
+        if threading.current_thread() is self._thread:
+            return function(*args, **kwargs)
+        future: Future = Future()
+        self._requests.put((future, function, args, kwargs))
+        result, error = future.result()
+        self._errors.last = error
+        return result
+    
+    def last_error(self):
+        """本线程最近一次失败调用的错误，没有时查询终端"""
+        error = getattr(self._errors, "last", None)
+        return error if error is not None else self.call(self._module.last_error)
+    
+    def __getattr__(self, name: str):
+        value = getattr(self._module, name)
+        if not callable(value):
+            return value
+        function = self._functions.get(name)
+        if function is None:
+            def function(*args, **kwargs):
+                return self.call(value, *args, **kwargs)
+            self._functions[name] = function
+        return function
+
+
+def serialize_mt5_calls() -> MT5Gateway:
+    """让本模块的所有 mt5 调用经过串行请求队列（多线程运行前调用）"""
+    global mt5
+    if not isinstance(mt5, MT5Gateway):
+        mt5 = MT5Gateway(mt5)
+    return mt5
+
+
+class RollingWindow:
+    """固定容量的滚动样本窗口，按需计算分位数"""
+    
+    def __init__(self, capacity: int = 2048):
+        self._samples = np.zeros(capacity, dtype=np.float64)
+        self._count = 0
+    
+    def add(self, value: float):
+        self._samples[self._count % len(self._samples)] = value
+        self._count += 1
+    
+    def summary(self) -> Dict[str, float]:
+        """返回样本总数及窗口内的 p50/p95/p99/max"""
+        samples = self._samples[:min(self._count, len(self._samples))]
+        if len(samples) == 0:
+            return {"count": 0}
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        return {"count": self._count, "p50": float(p50), "p95": float(p95), "p99": float(p99),
+                "max": float(samples.max())}
+
+
+class TradeMetrics:
+    """终端调用耗时与成交滑点统计
+
+    耗时单位为毫秒（time.perf_counter 实测），滑点单位为点，正值表示对我方不利。
+    """
+    
+    def __init__(self, file_path: Optional[str] = None, dump_interval: float = 3600.0):
+        self.file_path = file_path
+        self.dump_interval = dump_interval
+        self.windows: Dict[str, RollingWindow] = {}
+        self._last_dump = time.monotonic()
+    
+    def record(self, name: str, value: float):
+        window = self.windows.get(name)
+        if window is None:
+            window = self.windows[name] = RollingWindow()
+        window.add(value)
+    
+    @contextmanager
+    def timed(self, name: str):
+        """统计代码块耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000)
+    
+    def record_slippage(self, name: str, order_type: OrderType, requested: float, executed: float, point: float):
+        """记录成交价相对请求价的滑点"""
+        if not executed or not point:
+            return
+        direction = 1 if order_type == OrderType.BUY else -1
+        self.record(name, (executed - requested) * direction / point)
+    
+    def report(self) -> Dict[str, Dict[str, float]]:
+        return {name: window.summary() for name, window in sorted(self.windows.items())}
+    
+    def dump(self):
+        """输出统计到日志，并写入统计文件"""
+        report = self.report()
+        for name, summary in report.items():
+            if summary["count"]:
+                logger.info(f"统计 {name} | 次数: {summary['count']} | p50: {summary['p50']:.2f} | "
+                            f"p95: {summary['p95']:.2f} | p99: {summary['p99']:.2f} | 最大: {summary['max']:.2f}")
+        if self.file_path:
+            with open(self.file_path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+        self._last_dump = time.monotonic()
+    
+    def maybe_dump(self):
+        """距上次输出超过 dump_interval 时输出统计"""
+        if self.dump_interval and time.monotonic() - self._last_dump >= self.dump_interval:
+            self.dump()
+
+
+class CloseWatcher:
+    """平仓检测器 - 每次轮询都向终端确认持仓，按当前平仓价与止损/止盈价位的距离自适应缩短间隔
+    
+    positions_get 同时返回持仓是否存在和当前平仓价（price_current），每次轮询只有一次终端调用，
+    价格冲过价位又回来也不会漏检。间隔最长为原来的固定轮询周期（check_interval），平仓检测延迟不超过它；
+    距离按策略点数计算（价差 / 1个策略点的价格距离），与品种报价精度无关。
+    """
+    
+    def __init__(self, clock: Optional[Clock] = None, min_interval: float = 0.5, max_interval: float = 5.0,
+                 near_distance: float = 0.05, metrics: Optional[TradeMetrics] = None):
+        self.clock = clock or Clock()
+        self.metrics = metrics or TradeMetrics()
+        self.min_interval = min_interval          # 价格贴近价位时的轮询间隔（秒）
+        self.max_interval = max_interval          # 价格远离价位时的最长轮询间隔（秒），即最大检测延迟
+        self.near_distance = near_distance        # 距最近价位小于该策略点数时使用最短间隔
+        self.last_stats: Dict[str, float] = {}
+    
+    def wait(self, symbol: str, position_info: PositionInfo, point: float = 1.0):
+        """阻塞直到持仓平仓，point 为1个策略点对应的价格距离"""
+        start = self.clock.time()
+        calls = 0
+        
+        while True:
+            with self.metrics.timed("positions_get"):
+                positions = mt5.positions_get(ticket=position_info.ticket)
+            calls += 1
+            if not positions:
+                break
+            distance = self._distance(position_info, positions[0].price_current)
+            self.clock.sleep(self._interval(None if distance is None else distance / point))
+        
+        self.last_stats = {
+            "elapsed": self.clock.time() - start,
+            "calls": calls,
+        }
+        logger.debug(f"平仓检测完成 | 持仓: {position_info.ticket} | 耗时: {self.last_stats['elapsed']:.1f}s | "
+                     f"持仓查询: {calls}")
+    
+    @staticmethod
+    def _distance(position_info: PositionInfo, price: float) -> Optional[float]:
+        """当前平仓价（多单为 bid，空单为 ask）距最近止损/止盈价位的价差，价位未知时为 None"""
+        levels = [level for level in (position_info.tp_price, position_info.sl_price) if level is not None]
+        if not levels:
+            return None
+        return min(abs(price - level) for level in levels)
+    
+    def _interval(self, distance: Optional[float]) -> float:
+        """按距最近价位的策略点数计算轮询间隔：价格走完一段距离的时间约与距离的平方成正比"""
+        if distance is None:
+            return self.max_interval
+        interval = self.min_interval * (distance / self.near_distance) ** 2
+        return min(self.max_interval, max(self.min_interval, interval))
+
+
+class DealHistory:
+    """成交历史游标 - 只拉取上次之后的新成交，按持仓ID索引本实例开出的持仓
+    
+    同一魔术号下其他品种、其他实例或手动改单的成交不进入索引，by_position 的大小只取决于尚未对账的持仓数。
+    """
+    
+    # 服务器时间可能领先本地时间，查询终点放宽一天
+    FUTURE_MARGIN = 86400
     
-    def __init__(self, magic_number: int = 234000, deviation: int = 20):
+    def __init__(self, magic_number: int, clock: Optional[Clock] = None, lookback: int = 2 * 86400,
+                 metrics: Optional[TradeMetrics] = None):
         self.magic_number = magic_number
-        self.deviation = deviation
+        self.clock = clock or Clock()
+        self.metrics = metrics or TradeMetrics()
+        self.lookback = lookback
+        self.last_time = int(self.clock.time()) - lookback
+        self.last_ticket = 0
+        self.tracked: Set[int] = set()  # 本实例开出、尚未对账的持仓ID
+        self.by_position: Dict[int, List[Any]] = {}
     
-    def execute_trade(self, symbol: str, order_type: OrderType, strategy: TradeStrategy, 
-                     lot_size: float, pattern_sequence: Tuple[int, int, int, int]) -> Optional[PositionInfo]:
-        """执行交易"""
-        tick = mt5.symbol_info_tick(symbol)
-        if tick is None:
-            logger.error(f"获取价格失败: {mt5.last_error()}")
+    def track(self, position_id: int):
+        """登记本实例开出的持仓，之后只收集这些持仓的成交"""
+        self.tracked.add(position_id)
+    
+    def refresh(self) -> int:
+        """拉取游标之后的新成交，返回新增数量"""
+        with self.metrics.timed("history_deals_get"):
+            deals = mt5.history_deals_get(self.last_time, int(self.clock.time()) + self.FUTURE_MARGIN)
+        if not deals:
+            return 0
+        
+        added = 0
+        for deal in deals:
+            # 成交单号单调递增，游标所在秒内已处理过的成交直接跳过
+            if deal.ticket <= self.last_ticket:
+                continue
+            self.last_ticket = deal.ticket
+            self.last_time = max(self.last_time, deal.time)
+            if deal.magic != self.magic_number or deal.position_id not in self.tracked:
+                continue
+            self.by_position.setdefault(deal.position_id, []).append(deal)
+            added += 1
+        return added
+    
+    def close_deal(self, position_id: int) -> Optional[Tuple[float, float]]:
+        """返回持仓的 (平仓价格, 净盈亏)，尚未平仓时返回 None"""
+        return self._close_result(self.by_position.get(position_id))
+    
+    @staticmethod
+    def _close_result(deals: Optional[List[Any]]) -> Optional[Tuple[float, float]]:
+        """按一个持仓的全部成交计算 (平仓价格, 净盈亏)，净盈亏包含手续费、隔夜利息和费用"""
+        if not deals:
             return None
         
+        exits = [deal for deal in deals if deal.entry == mt5.DEAL_ENTRY_OUT]
+        if not exits:
+            return None
+        
+        pnl = sum(deal.profit for deal in exits)
+        pnl += sum(deal.commission + deal.swap + getattr(deal, 'fee', 0.0) for deal in deals)
+        return exits[-1].price, pnl
+    
+    def wait_for_close_deal(self, position_id: int, attempts: int = 3,
+                            retry_delay: float = 0.5) -> Optional[Tuple[float, float]]:
+        """刷新游标直到查到平仓成交，平仓成交可能比持仓消失稍晚写入历史"""
+        for attempt in range(attempts):
+            closed = self.close_deal(position_id)
+            if closed is None and self.refresh():
+                closed = self.close_deal(position_id)
+            if closed is not None:
+                return closed
+            if attempt < attempts - 1:
+                self.clock.sleep(retry_delay)
+        return None
+    
+    def loss_streak(self, symbol: str) -> LossStreak:
+        """启动时一次性拉取回看范围内本魔术号在该品种上的成交，从最新平仓的持仓开始倒序统计连续亏损
+        
+        遇到第一笔非亏损持仓即停止；分组结果只在本次统计中使用，不进入 by_position。
+        """
+        now = int(self.clock.time())
+        with self.metrics.timed("history_deals_get"):
+            deals = mt5.history_deals_get(now - self.lookback, now + self.FUTURE_MARGIN)
+        by_position: Dict[int, List[Any]] = {}
+        for deal in deals or ():
+            if deal.magic == self.magic_number and deal.symbol == symbol:
+                by_position.setdefault(deal.position_id, []).append(deal)
+        
+        closed = []
+        for position_id, position_deals in by_position.items():
+            exits = [deal for deal in position_deals if deal.entry == mt5.DEAL_ENTRY_OUT]
+            if exits:
+                closed.append((exits[-1].time_msc, position_id, sum(deal.volume for deal in exits)))
+        closed.sort(reverse=True)
+        
+        streak = LossStreak()
+        for _, position_id, volume in closed:
+            _, pnl = self._close_result(by_position[position_id])
+            if pnl >= 0:
+                break
+            if streak.count == 0:
+                streak.last_lot_size = volume
+            streak.count += 1
+            streak.total_loss += abs(pnl)
+        return streak
+    
+    def forget(self, position_id: int):
+        """释放已对账持仓的索引"""
+        self.by_position.pop(position_id, None)
+        self.tracked.discard(position_id)
+
+
+@dataclass
+class SymbolSpec:
+    """品种交易规格（经纪商单位）"""
+    symbol: str
+    point: float
+    digits: int
+    tick_value: float
+    tick_size: float
+    contract_size: float
+    volume_min: float
+    volume_max: float
+    volume_step: float
+    stops_level: int
+    filling_mode: int
+    
+    @classmethod
+    def from_symbol_info(cls, info) -> 'SymbolSpec':
+        """从 mt5.symbol_info 返回值构建"""
+        return cls(
+            symbol=info.name,
+            point=info.point,
+            digits=info.digits,
+            tick_value=info.trade_tick_value,
+            tick_size=info.trade_tick_size or info.point,
+            contract_size=info.trade_contract_size,
+            volume_min=info.volume_min,
+            volume_max=info.volume_max,
+            volume_step=info.volume_step or info.volume_min,
+            stops_level=info.trade_stops_level,
+            filling_mode=info.filling_mode
+        )
+    
+    def normalize_volume(self, lot_size: float) -> float:
+        """手数按步长取整并限制在最小/最大手数之间"""
+        steps = round(lot_size / self.volume_step)
+        volume = min(max(steps * self.volume_step, self.volume_min), self.volume_max)
+        step_digits = max(0, -Decimal(str(self.volume_step)).normalize().as_tuple().exponent)
+        return round(volume, step_digits)
+    
+    def normalize_price(self, price: float) -> float:
+        """价格按品种小数位取整"""
+        return round(price, self.digits)
+    
+    def order_filling(self) -> int:
+        """选择品种支持的成交模式：优先IOC，其次FOK，否则RETURN"""
+        if self.filling_mode & mt5.SYMBOL_FILLING_IOC:
+            return mt5.ORDER_FILLING_IOC
+        if self.filling_mode & mt5.SYMBOL_FILLING_FOK:
+            return mt5.ORDER_FILLING_FOK
+        return mt5.ORDER_FILLING_RETURN
+    
+    def stop_levels(self, order_type: OrderType, tick, distance_sl: float,
+                    distance_tp: float) -> Tuple[float, float]:
+        """按开仓价计算止损/止盈，至少保持经纪商要求的最小止损距离"""
+        min_distance = (self.stops_level + 1) * self.point if self.stops_level else 0.0
         if order_type == OrderType.BUY:
-            price = tick.ask
-            tp_price = price + strategy.tp_points * 1.0
-            sl_price = price - strategy.sl_points * 1.0
-            direction = "BUY"
+            # 多单的止损/止盈以 bid 触发
+            sl_price = min(tick.ask - distance_sl, tick.bid - min_distance)
+            tp_price = max(tick.ask + distance_tp, tick.bid + min_distance)
         else:
-            price = tick.bid
-            tp_price = price - strategy.tp_points * 1.0
-            sl_price = price + strategy.sl_points * 1.0
-            direction = "SELL"
+            sl_price = max(tick.bid + distance_sl, tick.ask + min_distance)
+            tp_price = min(tick.bid - distance_tp, tick.ask - min_distance)
+        return self.normalize_price(sl_price), self.normalize_price(tp_price)
+    
+    def profit(self, price_diff: float, lot_size: float) -> float:
+        """按 tick 价值估算盈亏（账户货币）"""
+        return price_diff / self.tick_size * self.tick_value * lot_size
+
+
+class SymbolSpecCache:
+    """品种规格缓存 - 每个品种首次使用时加载，过期或下单被拒后再重新读取"""
+    
+    # 这些拒单原因说明缓存的规格已与经纪商不一致
+    STALE_RETCODES = ("TRADE_RETCODE_INVALID_VOLUME", "TRADE_RETCODE_INVALID_STOPS", "TRADE_RETCODE_INVALID_FILL")
+    
+    def __init__(self, clock: Optional[Clock] = None, max_age: float = 3600.0):
+        self.clock = clock or Clock()
+        self.max_age = max_age
+        self._specs: Dict[str, Tuple[float, SymbolSpec]] = {}
+    
+    def get(self, symbol: str) -> Optional[SymbolSpec]:
+        """获取品种规格，读取失败时沿用旧值"""
+        cached = self._specs.get(symbol)
+        now = self.clock.time()
+        if cached is not None and now - cached[0] < self.max_age:
+            return cached[1]
         
-        request = {
+        info = mt5.symbol_info(symbol)
+        if info is None:
+            logger.warning(f"获取品种信息失败: {symbol}, {mt5.last_error()}")
+            return cached[1] if cached else None
+        spec = SymbolSpec.from_symbol_info(info)
+        self._specs[symbol] = (now, spec)
+        return spec
+    
+    def invalidate(self, symbol: str, retcode: Optional[int] = None):
+        """使缓存失效；指定 retcode 时仅在规格相关的拒单时失效"""
+        if retcode is None or retcode in {getattr(mt5, name, None) for name in self.STALE_RETCODES}:
+            self._specs.pop(symbol, None)
+
+
+class TradeExecutor:
+    """交易执行器"""
+    
+    # 报价变动/超时类拒单，刷新报价后可以立即重发
+    RETRY_RETCODES = ("TRADE_RETCODE_REQUOTE", "TRADE_RETCODE_PRICE_CHANGED", "TRADE_RETCODE_PRICE_OFF",
+                      "TRADE_RETCODE_TIMEOUT")
+    
+    def __init__(self, magic_number: int = 234000, deviation: int = 20, clock: Optional[Clock] = None,
+                 metrics: Optional[TradeMetrics] = None, base_lot_size: float = 0.01,
+                 strategy_point: float = 1.0, max_attempts: int = 5, retry_budget: float = 0.5,
+                 retry_delay: float = 0.01, journal: Optional['TradeJournal'] = None,
+                 check_interval: float = 5.0):
+        self.magic_number = magic_number
+        self.deviation = deviation
+        self.clock = clock or Clock()
+        self.metrics = metrics or TradeMetrics()
+        self.base_lot_size = base_lot_size
+        self.strategy_point = strategy_point  # 策略中1个点对应的价格距离
+        self.close_watcher = CloseWatcher(self.clock, max_interval=check_interval, metrics=self.metrics)
+        self.deal_history = DealHistory(magic_number, self.clock, metrics=self.metrics)
+        self.symbol_specs = SymbolSpecCache(self.clock)
+        self.max_attempts = max_attempts
+        self.retry_budget = retry_budget
+        self.retry_delay = retry_delay
+        self.journal = journal  # 开仓与平仓写入交易记录库（trade_journal.TradeJournal），None 时不记录
+    
+    def _build_request(self, symbol: str, spec: SymbolSpec, order_type: OrderType, strategy: TradeStrategy,
+                       volume: float, tick) -> Dict[str, Any]:
+        """按当前报价构建市价单请求"""
+        sl_price, tp_price = spec.stop_levels(order_type, tick, strategy.sl_points * self.strategy_point,
+                                              strategy.tp_points * self.strategy_point)
+        return {
             "action": mt5.TRADE_ACTION_DEAL,
             "symbol": symbol,
-            "volume": lot_size,
+            "volume": volume,
             "type": order_type.value,
-            "price": price,
+            "price": tick.ask if order_type == OrderType.BUY else tick.bid,
             "sl": sl_price,
             "tp": tp_price,
             "deviation": self.deviation,
             "magic": self.magic_number,
             "comment": "RandomMartingale",
             "type_time": mt5.ORDER_TIME_GTC,
-            "type_filling": mt5.ORDER_FILLING_IOC,
+            "type_filling": spec.order_filling(),
         }
-        
-        result = mt5.order_send(request)
-        if result.retcode != mt5.TRADE_RETCODE_DONE:
-            logger.error(f"交易失败: {result.retcode}, {result.comment}")
+    
+    def execute_trade(self, symbol: str, order_type: OrderType, strategy: TradeStrategy, 
+                     lot_size: float, pattern_sequence: Tuple[int, int, int, int]) -> Optional[PositionInfo]:
+        """执行交易"""
+        with self.metrics.timed("execute_trade"):
+            return self._execute_trade(symbol, order_type, strategy, lot_size, pattern_sequence)
+    
+    def _execute_trade(self, symbol: str, order_type: OrderType, strategy: TradeStrategy,
+                       lot_size: float, pattern_sequence: Tuple[int, int, int, int]) -> Optional[PositionInfo]:
+        spec = self.symbol_specs.get(symbol)
+        if spec is None:
+            logger.error(f"获取品种规格失败: {symbol}")
             return None
         
+        volume = spec.normalize_volume(lot_size)
+        if volume != lot_size:
+            logger.warning(f"手数 {lot_size} 不符合品种规格，调整为 {volume}")
+        direction = "BUY" if order_type == OrderType.BUY else "SELL"
+        
+        # 报价变动类拒单立即刷新报价重发，直到成功、遇到不可重试的错误或超出次数/时间预算
+        deadline = self.clock.time() + self.retry_budget
+        decision_price = None
+        for attempt in range(1, self.max_attempts + 1):
+            with self.metrics.timed("symbol_info_tick"):
+                tick = mt5.symbol_info_tick(symbol)
+            if tick is None:
+                logger.error(f"获取价格失败: {mt5.last_error()}")
+                return None
+            
+            request = self._build_request(symbol, spec, order_type, strategy, volume, tick)
+            if decision_price is None:
+                decision_price = request["price"]
+            
+            with self.metrics.timed("order_send"):
+                result = mt5.order_send(request)
+            if result is None:
+                logger.error(f"交易请求发送失败: {mt5.last_error()}")
+                return None
+            if result.retcode == mt5.TRADE_RETCODE_DONE:
+                break
+            
+            retryable = result.retcode in {getattr(mt5, name, None) for name in self.RETRY_RETCODES}
+            if not retryable or attempt == self.max_attempts or self.clock.time() >= deadline:
+                logger.error(f"交易失败: {result.retcode}, {result.comment} | 尝试次数: {attempt}")
+                self.metrics.record("order_attempts", attempt)
+                self.symbol_specs.invalidate(symbol, result.retcode)
+                return None
+            logger.warning(f"报价变动 {result.retcode}, {result.comment} | 第{attempt}次重试")
+            self.clock.sleep(self.retry_delay)
+        
+        # 记录尝试次数和相对首次报价的最终滑点，持仓按实际成交价记录（止损/止盈价位以请求为准）
+        self.metrics.record("order_attempts", attempt)
+        price = result.price or request["price"]
+        self.metrics.record_slippage("open_slippage", order_type, decision_price, price, spec.point)
+        sl_price, tp_price = request["sl"], request["tp"]
+        if attempt > 1:
+            logger.info(f"重试成交 | 尝试次数: {attempt} | 首次报价: {decision_price:.3f} | 成交: {price:.3f}")
+        
         # 格式化阴阳组合显示
         pattern_display = ''.join(['阳' if x == 1 else '阴' for x in pattern_sequence])
-        multiplier = lot_size / 0.01  # 假设基础手数是0.01
+        multiplier = volume / self.base_lot_size
         
-        logger.info(f"RandomMartingale | {direction} | 开仓: {price:.3f} | "
-                   f"止损: {strategy.sl_points:.0f} | 止盈: {strategy.tp_points:.0f} | "
-                   f"马丁倍数: {multiplier:.0f}x --( {pattern_display} )--")
+        # 只入队，格式化和写文件在日志线程完成
+        # 品种和持仓单号用于在多品种交错的日志中配对开仓与平仓
+        logger.info("RandomMartingale | %s | 开仓: %.3f | 止损: %.0f | 止盈: %.0f | 马丁倍数: %.0fx --( %s )-- | "
+                    "品种: %s | 持仓: %d", direction, price, strategy.sl_points, strategy.tp_points, multiplier,
+                    pattern_display, symbol, result.order,
+                    extra={"event": {"type": "open", "symbol": symbol, "ticket": result.order,
+                                     "direction": direction, "price": price, "sl": sl_price, "tp": tp_price,
+                                     "sl_points": strategy.sl_points, "tp_points": strategy.tp_points,
+                                     "lot": volume, "multiplier": multiplier, "sequence": pattern_display}})
+        self.deal_history.track(result.order)
+        if self.journal is not None:
+            self.journal.record_open(symbol, self.magic_number, result.order, direction, pattern_display,
+                                     multiplier, volume, strategy.tp_points, strategy.sl_points,
+                                     self.clock.time(), price, sl_price, tp_price)
         
         return PositionInfo(
             open_price=price,
             order_type=order_type,
-            lot_size=lot_size,
-            ticket=result.order
+            lot_size=volume,
+            ticket=result.order,
+            sl_price=sl_price,
+            tp_price=tp_price
         )
     
+    def own_positions(self, symbol: str) -> Tuple[Any, ...]:
+        """本实例（按品种和魔术号）的持仓，忽略手动单和其他品种、其他实例的持仓"""
+        with self.metrics.timed("positions_get"):
+            positions = mt5.positions_get(symbol=symbol)
+        if not positions:
+            return ()
+        return tuple(position for position in positions
+                     if position.magic == self.magic_number and position.symbol == symbol)
+    
     def has_position(self, symbol: str) -> bool:
-        """检查是否有持仓"""
-        positions = mt5.positions_get(symbol=symbol)
-        return positions is not None and len(positions) > 0
+        """检查本实例是否有持仓"""
+        return len(self.own_positions(symbol)) > 0
     
     def wait_for_close(self, symbol: str, position_info: PositionInfo) -> Tuple[TradeResult, float]:
         """等待持仓平仓并返回交易结果"""
-        while self.has_position(symbol):
-            time.sleep(5)
+        self.close_watcher.wait(symbol, position_info, self.strategy_point)
         
         return self._calculate_pnl(position_info, symbol)
     
+    def _record_close_slippage(self, position_info: PositionInfo, close_price: float, symbol: str):
+        """记录平仓价相对触发的止损/止盈价位的滑点"""
+        levels = [level for level in (position_info.sl_price, position_info.tp_price) if level is not None]
+        if not levels:
+            return
+        level = min(levels, key=lambda x: abs(x - close_price))
+        # 平仓方向与开仓相反：多单平仓价低于价位为不利
+        close_type = OrderType.SELL if position_info.order_type == OrderType.BUY else OrderType.BUY
+        spec = self.symbol_specs.get(symbol)
+        self.metrics.record_slippage("close_slippage", close_type, level, close_price, spec.point if spec else 0.0)
+    
     def _calculate_pnl(self, position_info: PositionInfo, symbol: str) -> Tuple[TradeResult, float]:
         """计算交易盈亏"""
-        # 尝试从历史记录获取实际平仓信息
-        end_time = datetime.now()
-        start_time = end_time - timedelta(minutes=10)
-        
+        # 尝试从历史记录获取实际平仓信息（按持仓单号精确匹配）
         try:
-            deals = mt5.history_deals_get(start_time, end_time)
-            if deals:
-                for deal in reversed(deals):
-                    if (deal.magic == self.magic_number and 
-                        deal.symbol == symbol and
-                        deal.entry == mt5.DEAL_ENTRY_OUT):
-                        pnl = deal.profit
-                        account_info = mt5.account_info()
-                        logger.info(f"实际平仓价格: {deal.price:.5f} | 实际盈亏: {pnl:.2f} USD | 余额: ${account_info.balance:.2f}")
-                        
-                        if pnl > 0:
-                            return TradeResult.PROFIT, pnl
-                        elif pnl < 0:
-                            return TradeResult.LOSS, pnl
-                        else:
-                            return TradeResult.BREAK_EVEN, pnl
+            closed = self.deal_history.wait_for_close_deal(position_info.ticket)
+            if closed is not None:
+                close_price, pnl = closed
+                self.deal_history.forget(position_info.ticket)
+                self._record_close_slippage(position_info, close_price, symbol)
+                account_info = mt5.account_info()
+                logger.info("实际平仓价格: %.5f | 实际盈亏: %.2f USD | 余额: $%.2f | 品种: %s | 持仓: %d",
+                            close_price, pnl, account_info.balance, symbol, position_info.ticket,
+                            extra={"event": {"type": "close", "symbol": symbol, "ticket": position_info.ticket,
+                                             "price": close_price, "pnl": pnl, "balance": account_info.balance}})
+                if self.journal is not None:
+                    self.journal.record_close(position_info.ticket, self.magic_number, self.clock.time(),
+                                              close_price, pnl, account_info.balance)
+                return TradeResult.from_pnl(pnl), pnl
         except Exception as e:
             logger.warning(f"获取历史记录失败: {e}")
         
@@ -467,7 +924,13 @@ class TradeExecutor:
             estimated_close_price = tick.ask
             price_diff = position_info.open_price - estimated_close_price
         
-        estimated_pnl = price_diff * position_info.lot_size * 100
+        spec = self.symbol_specs.get(symbol)
+        if spec is None:
+            return TradeResult.BREAK_EVEN, 0
+        estimated_pnl = spec.profit(price_diff, position_info.lot_size)
+        if self.journal is not None:
+            self.journal.record_close(position_info.ticket, self.magic_number, self.clock.time(),
+                                      estimated_close_price, estimated_pnl, estimated=True)
         
         if estimated_pnl > 0:
             return TradeResult.PROFIT, estimated_pnl
@@ -480,87 +943,215 @@ class TradeExecutor:
 class TradingBot:
     """交易机器人主类"""
     
-    def __init__(self):
-        self.config_manager = ConfigManager()
-        self.trading_config = self.config_manager.get_trading_config()
+    def __init__(self, config_file: str = "config.json", clock: Optional[Clock] = None,
+                 config_manager: Optional[ConfigManager] = None, strategy: Optional[int] = None,
+                 trade_journal: Optional['TradeJournal'] = None, data_dir: str = ".",
+                 journal_file: Optional[str] = "trades.db"):
+        self.clock = clock or Clock()
+        self.data_dir = data_dir  # 状态日志、统计文件和交易记录库所在目录（模拟运行时指向单独目录）
+        self.config_manager = config_manager or ConfigManager(config_file)
+        self.strategy = strategy  # 多品种引擎中的策略序号，None 表示使用 "trading" 配置
+        self.trading_config = self.config_manager.get_trading_config(strategy)
         self.mt5_config = self.config_manager.get_mt5_config()
-        self.seed_manager = SeedManager(self.config_manager)
+        self.seed_manager = SeedManager(self.config_manager, strategy)
+        self.stopping = threading.Event()
         self.martingale_manager = MartingaleManager(
             self.trading_config.base_lot_size,
             self.trading_config.max_martingale_multiplier
         )
+        self.metrics = TradeMetrics(os.path.join(
+            data_dir, f"trade_metrics_{self.trading_config.symbol}_{self.trading_config.magic_number}.json"
+        ))
+        # 交易记录库（相对 data_dir），None 时不记录；没有传入共用的记录库时在 serve 中才打开
+        self.journal_file = os.path.join(data_dir, journal_file) if journal_file else None
+        self.trade_journal = trade_journal
+        self.owns_journal = False
         self.trade_executor = TradeExecutor(
             self.trading_config.magic_number,
-            self.trading_config.deviation
+            self.trading_config.deviation,
+            self.clock,
+            self.metrics,
+            self.trading_config.base_lot_size,
+            self.trading_config.strategy_point,
+            journal=self.trade_journal,
+            check_interval=self.trading_config.check_interval
         )
         self.current_lot_size = self.trading_config.base_lot_size
+        self.bar_cache = BarCache(self.trading_config.symbol)
+        self.scheduler = DecisionScheduler(self.clock, self.metrics, offset=self.trading_config.decision_offset)
+        self.state_journal = StateJournal(os.path.join(
+            data_dir, f"martingale_state_{self.trading_config.symbol}_{self.trading_config.magic_number}.jsonl"
+        ), self.clock)
+    
+    def _save_state(self, open_ticket: Optional[int] = None):
+        """记录当前马丁格尔状态，open_ticket 为按 lot_size 开出、尚未结算的持仓"""
+        self.state_journal.append(
+            symbol=self.trading_config.symbol,
+            base_lot_size=self.trading_config.base_lot_size,
+            lot_size=self.current_lot_size,
+            cumulative_loss=round(self.martingale_manager.cumulative_loss, 2),
+            open_ticket=open_ticket
+        )
+    
+    def _restore_state(self) -> Optional[float]:
+        """从状态日志恢复手数和累计亏损，没有可用记录时返回 None"""
+        state = self.state_journal.load()
+        if state is None or state.get("symbol") != self.trading_config.symbol:
+            return None
+        
+        # 基础手数被修改时按倍数换算
+        base_lot_size = self.trading_config.base_lot_size
+        max_lot_size = base_lot_size * self.trading_config.max_martingale_multiplier
+        multiplier = state["lot_size"] / state["base_lot_size"]
+        lot_size = min(max_lot_size, base_lot_size * multiplier)
+        self.martingale_manager.cumulative_loss = state["cumulative_loss"]
+        logger.info(f"从状态日志恢复 | 马丁倍数: {lot_size / base_lot_size:.0f}x | 累计亏损: -{state['cumulative_loss']:.2f} USD")
+        
+        open_ticket = state.get("open_ticket")
+        if open_ticket is not None:
+            lot_size = self._settle_open_ticket(open_ticket, lot_size, state["time"])
+        return lot_size
+    
+    def _settle_open_ticket(self, ticket: int, lot_size: float, opened_at: float) -> float:
+        """结算停机前开出的持仓：仍未平仓时先等待平仓，再按成交历史计入累计亏损并推进马丁手数"""
+        symbol = self.trading_config.symbol
+        executor = self.trade_executor
+        for position in executor.own_positions(symbol):
+            if position.ticket == ticket:
+                logger.info(f"停机前的持仓 {ticket} 仍未平仓，等待平仓后结算")
+                executor.close_watcher.wait(symbol, PositionInfo.from_position(position), executor.strategy_point)
+        
+        # 从开仓时刻起拉取成交历史（停机可能超过游标默认的回看范围）
+        deal_history = executor.deal_history
+        deal_history.track(ticket)
+        deal_history.last_time = min(deal_history.last_time, int(opened_at) - 60)
+        closed = deal_history.wait_for_close_deal(ticket)
+        if closed is None:
+            logger.warning(f"未查到持仓 {ticket} 的平仓成交，无法结算，沿用开仓手数")
+            return lot_size
+        
+        close_price, pnl = closed
+        deal_history.forget(ticket)
+        logger.info(f"结算停机前的持仓 {ticket} | 平仓价格: {close_price:.5f} | 盈亏: {pnl:.2f} USD")
+        if executor.journal is not None:
+            executor.journal.record_close(ticket, executor.magic_number, self.clock.time(), close_price, pnl)
+        return self.martingale_manager.calculate_next_lot_size(lot_size, TradeResult.from_pnl(pnl), pnl)
     
     def _get_initial_lot_size(self) -> float:
         """获取初始手数"""
-        if self.trade_executor.has_position(self.trading_config.symbol):
-            positions = mt5.positions_get(symbol=self.trading_config.symbol)
-            if positions and len(positions) > 0:
-                position_lot_size = positions[0].volume
-                multiplier = position_lot_size / self.trading_config.base_lot_size
-                logger.info(f"检测到现有持仓 | 持仓手数: {position_lot_size} | 当前马丁倍数: {multiplier:.0f}x")
-                return position_lot_size
-        
-        # 没有持仓时，使用配置中的基础手数
+        lot_size = self._restore_state()
+        if lot_size is not None:
+            return lot_size
+        
+        # 一次性拉取两天成交并按持仓分组，恢复连续亏损状态
+        streak = self.trade_executor.deal_history.loss_streak(self.trading_config.symbol)
+        self.martingale_manager.cumulative_loss = streak.total_loss
+        
+        positions = self.trade_executor.own_positions(self.trading_config.symbol)
+        if positions:
+            position_lot_size = positions[0].volume
+            multiplier = position_lot_size / self.trading_config.base_lot_size
+            logger.info(f"检测到现有持仓 | 持仓手数: {position_lot_size} | 当前马丁倍数: {multiplier:.0f}x")
+            return position_lot_size
+        
+        if streak.count > 0:
+            max_lot_size = self.trading_config.base_lot_size * self.trading_config.max_martingale_multiplier
+            lot_size = min(max_lot_size, streak.last_lot_size * 2)
+            multiplier = lot_size / self.trading_config.base_lot_size
+            logger.info(f"历史连续亏损: {streak.count} 次 | 累计亏损: -{streak.total_loss:.2f} USD | 恢复马丁倍数: {multiplier:.0f}x")
+            return lot_size
+        
+        # 没有持仓和连续亏损时，使用配置中的基础手数
         return self.trading_config.base_lot_size
     
     def run(self):
         """运行交易机器人"""
         logger.info("交易机器人启动")
-        logger.info(f"当前随机数种子: {self.seed_manager.get_seed()}")
+        
+        # POSIX 下可用 kill -USR1 <pid> 随时输出耗时与滑点统计
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.metrics.dump())
         
         try:
             with MT5Connector(self.mt5_config) as connector:
-                self.current_lot_size = self._get_initial_lot_size()
-                multiplier = self.current_lot_size / self.trading_config.base_lot_size
-                logger.info(f"程序启动 | 启动倍数: {multiplier:.0f}x")
-                
-                while True:
-                    try:
-                        # 检查配置更新
-                        if self.config_manager.check_for_updates():
-                            self.trading_config = self.config_manager.get_trading_config()
-                            logger.info("配置已更新，应用新设置")
-                        
-                        self._trading_loop()
-                    except Exception as e:
-                        logger.error(f"交易循环出错: {e}")
-                        time.sleep(60)
-                        
+                self.serve()
         except KeyboardInterrupt:
             logger.info("程序被用户中断")
         except Exception as e:
             logger.error(f"程序运行出错: {e}")
     
+    def attach_journal(self, journal: Optional['TradeJournal']):
+        """设置开仓、平仓写入的交易记录库（多品种引擎中各策略共用一个）"""
+        self.trade_journal = journal
+        self.trade_executor.journal = journal
+    
+    def serve(self):
+        """在已连接的MT5会话中恢复状态并持续交易，直到 stopping 被设置"""
+        try:
+            if self.trade_journal is None and self.journal_file:
+                from trade_journal import TradeJournal
+                self.attach_journal(TradeJournal(self.journal_file))
+                self.owns_journal = True
+            logger.info(f"当前随机数种子: {self.seed_manager.get_seed()}")
+            self.current_lot_size = self._get_initial_lot_size()
+            self._save_state()
+            multiplier = self.current_lot_size / self.trading_config.base_lot_size
+            logger.info(f"程序启动 | 启动倍数: {multiplier:.0f}x")
+            
+            while not self.stopping.is_set():
+                try:
+                    # 检查配置更新（只比较文件状态，文件未变时不解析）
+                    self.config_manager.check_for_updates()
+                    trading_config = self.config_manager.get_trading_config(self.strategy)
+                    if self.trading_config is not trading_config:
+                        self.trading_config = trading_config
+                        logger.info("配置已更新，应用新设置")
+                    
+                    self._trading_loop()
+                    self.metrics.maybe_dump()
+                except Exception as e:
+                    logger.error(f"交易循环出错: {e}")
+                    self.scheduler.plan_next_bar()
+                    self.scheduler.wait()
+        finally:
+            self.state_journal.close()
+            if self.owns_journal:
+                self.trade_journal.close()
+                self.attach_journal(None)
+                self.owns_journal = False
+            self.metrics.dump()
+    
     def _trading_loop(self):
         """交易循环"""
-        # 检查是否有持仓
-        if self.trade_executor.has_position(self.trading_config.symbol):
+        # 检查本实例是否有持仓（其他魔术号的持仓不影响本实例）
+        positions = self.trade_executor.own_positions(self.trading_config.symbol)
+        if positions:
             logger.info("检测到已有持仓，等待平仓...")
-            while self.trade_executor.has_position(self.trading_config.symbol):
-                time.sleep(self.trading_config.check_interval)
+            for position in positions:
+                self.trade_executor.close_watcher.wait(self.trading_config.symbol, PositionInfo.from_position(position),
+                                                       self.trade_executor.strategy_point)
             logger.info("持仓已平仓，继续交易循环")
-            time.sleep(self.trading_config.cooling_time)
+            self.scheduler.plan(self.clock.time() + self.trading_config.cooling_time)
             return
         
+        # 等到计划的决策时刻
+        self.scheduler.wait()
+        
         # 获取当前K线形态
-        candle_pattern = StrategyCalculator.get_candle_pattern(self.trading_config.symbol)
+        candle_pattern = StrategyCalculator.get_candle_pattern(self.trading_config.symbol, self.bar_cache)
         if candle_pattern is None:
-            time.sleep(60)
+            self.scheduler.plan_next_bar()
             return
         
         # 生成随机数序列
         current_seed = self.seed_manager.get_seed()
-        r1, r2, r3 = StrategyCalculator.generate_random_sequence(current_seed)
+        r1, r2, r3 = StrategyCalculator.random_sequence_at(current_seed, int(self.clock.time()))
         
         # 获取交易策略
         order_type, strategy = StrategyCalculator.get_trade_strategy(candle_pattern, r1, r2, r3)
         
-        # 执行交易
+        # 执行交易（开仓前确保马丁状态已落盘）
+        self.state_journal.sync()
         pattern_sequence = (candle_pattern, r1, r2, r3)
         position_info = self.trade_executor.execute_trade(
             self.trading_config.symbol, order_type, strategy, 
@@ -568,18 +1159,117 @@ class TradingBot:
         )
         
         if position_info:
+            # 持仓单号和手数立即落盘，停机重启后据此结算这笔交易
+            self._save_state(position_info.ticket)
+            self.state_journal.sync()
+            
             # 等待平仓并处理结果
             result, pnl = self.trade_executor.wait_for_close(self.trading_config.symbol, position_info)
             self.current_lot_size = self.martingale_manager.calculate_next_lot_size(
                 self.current_lot_size, result, pnl
             )
+            self._save_state()
+        
+        # 在下一根K线开盘后决策
+        self.scheduler.plan_next_bar()
+
+
+class _StrategyLogFilter(logging.Filter):
+    """多品种运行时在日志前加上策略线程名（品种#魔术号）"""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.threadName != "MainThread" and not record.threadName.startswith("mt5-"):
+            record.msg = f"[{record.threadName}] {record.msg}"
+        return True
+
+
+class MultiSymbolEngine:
+    """多品种引擎 - 每个策略一个线程，共用一个MT5会话，终端调用经 MT5Gateway 串行执行
+    
+    策略在 config.json 的 "strategies" 列表中配置，每项覆盖 "trading" 的部分字段（至少 symbol，
+    同一品种多个策略时还需要不同的 magic_number）。一个策略等待平仓时其他策略照常决策。
+    """
+    
+    def __init__(self, config_file: str = "config.json", clock: Optional[Clock] = None, data_dir: str = ".",
+                 journal_file: Optional[str] = "trades.db"):
+        self.config_manager = ConfigManager(config_file)
+        # 各策略共用的交易记录库，在 run 中打开，None 时不记录
+        self.journal_file = os.path.join(data_dir, journal_file) if journal_file else None
+        self.trade_journal: Optional['TradeJournal'] = None
+        self.bots = [TradingBot(config_file, clock, self.config_manager, strategy, data_dir=data_dir, journal_file=None)
+                     for strategy in range(self.config_manager.strategy_count)]
+        self.threads: List[threading.Thread] = []
+    
+    def run(self):
+        """连接MT5并运行所有策略，直到全部退出或被用户中断"""
+        logger.info(f"多品种引擎启动 | 策略数: {len(self.bots)}")
+        serialize_mt5_calls()
+        strategy_filter = _StrategyLogFilter()
+        for name in TRADING_LOGGERS:
+            logging.getLogger(name).addFilter(strategy_filter)
         
-        # 等待下一个周期
-        time.sleep(60)
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: [bot.metrics.dump() for bot in self.bots])
+        
+        try:
+            if self.journal_file:
+                from trade_journal import TradeJournal
+                self.trade_journal = TradeJournal(self.journal_file)
+            with MT5Connector(self.config_manager.get_mt5_config()) as connector:
+                for bot in self.bots:
+                    bot.attach_journal(self.trade_journal)
+                    name = f"{bot.trading_config.symbol}#{bot.trading_config.magic_number}"
+                    thread = threading.Thread(target=bot.serve, name=name, daemon=True)
+                    thread.start()
+                    self.threads.append(thread)
+                
+                while any(thread.is_alive() for thread in self.threads):
+                    for thread in self.threads:
+                        thread.join(timeout=1.0)
+        except KeyboardInterrupt:
+            logger.info("程序被用户中断，等待各策略退出")
+            self.stop()
+        except Exception as e:
+            logger.error(f"程序运行出错: {e}")
+            self.stop()
+        finally:
+            if self.trade_journal is not None:
+                self.trade_journal.close()
+                self.trade_journal = None
+    
+    def stop(self, timeout: float = 10.0):
+        """通知所有策略在当前步骤结束后退出"""
+        for bot in self.bots:
+            bot.stopping.set()
+        for thread in self.threads:
+            thread.join(timeout=timeout)
+
+
+# 子命令：名称 -> 模块，模块需提供 main(argv)
+SUBCOMMANDS = {
+    "backtest": "backtest",
+    "sweep": "sweep",
+    "logs": "log_analysis",
+    "ruin": "ruin",
+    "journal": "trade_journal",
+}
 
 
 def main():
     """主函数入口"""
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        # 子命令与单独运行时一样只输出到控制台，不创建交易日志文件
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+        module = __import__(SUBCOMMANDS[sys.argv[1]])
+        module.main(sys.argv[2:])
+        return
+    
+    setup_logging()
+    # 配置了 strategies 时多品种并行运行
+    if ConfigManager().strategy_count:
+        MultiSymbolEngine().run()
+        return
+    
     bot = TradingBot()
     bot.run()
 
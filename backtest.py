@@ -0,0 +1,437 @@
+"""
+RandomMartingale 回测引擎
+用历史M1K线（可选tick）回放 XAUUSD.py 中 _trading_loop 的决策逻辑：
+K线阴阳 + 随机数序列 -> 策略表 -> 止盈/止损成交 -> 马丁格尔手数管理
+"""
+
+import argparse
+import calendar
+import csv
+import logging
+import os
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from typing import Optional, Tuple, Dict, Any, List, Sequence
+
+import numpy as np
+
+from sequence_table import SequenceTable
+from martingale_core import (
+    ConfigManager, DecisionScheduler, MartingaleManager, OrderType, StrategyCalculator,
+    TradeResult, TradingConfig
+)
+
+logger = logging.getLogger(__name__)
+
+
+# 与 mt5.copy_rates_* 返回的结构化数组一致
+RATES_DTYPE = np.dtype([
+    ('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'),
+    ('close', '<f8'), ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8'),
+])
+
+TICKS_DTYPE = np.dtype([('time_msc', '<i8'), ('bid', '<f8'), ('ask', '<f8')])
+
+# 回测成交记录
+TRADE_DTYPE = np.dtype([
+    ('entry_time', '<f8'), ('exit_time', '<f8'), ('direction', 'i1'), ('sequence', 'u1'),
+    ('tp_points', 'i1'), ('sl_points', 'i1'), ('lot_size', '<f8'), ('entry_price', '<f8'),
+    ('exit_price', '<f8'), ('pnl', '<f8'), ('balance', '<f8'),
+])
+
+
+@dataclass
+class BacktestSettings:
+    """回测参数"""
+    initial_balance: float = 100.0
+    contract_size: float = 100.0      # 每手合约数量，XAUUSD 1手=100盎司
+    point: float = 0.001              # K线 spread 字段的点值
+    cycle_delay: float = 0.0          # 平仓后至少等待的秒数，之后在下一根M1K线开盘时决策（DecisionScheduler）
+    time_offset: int = 0              # K线时间（服务器时间）减去该值得到实盘 time.time()
+    ruin_balance: float = 0.0         # 余额跌到该值及以下视为爆仓，停止回测
+    start_time: Optional[float] = None
+    end_time: Optional[float] = None
+
+
+@dataclass
+class PricePath:
+    """回放用价格路径，K线与tick统一为逐元素的 bid/ask 高低价"""
+    time: np.ndarray
+    bid_high: np.ndarray
+    bid_low: np.ndarray
+    ask_high: np.ndarray
+    ask_low: np.ndarray
+    entry_bid: np.ndarray
+    entry_ask: np.ndarray
+    candle: np.ndarray                # 在该元素处决策时读到的K线阴阳，-1 表示不可用
+    duration: float                   # 每个元素覆盖的秒数（M1为60，tick为0）
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    @classmethod
+    def from_bars(cls, bars: np.ndarray, point: float = 0.001) -> 'PricePath':
+        """从M1K线构建路径：在K线开盘处决策，阴阳取上一根已完成K线"""
+        spread = bars['spread'].astype(np.float64) * point
+        candle = np.empty(len(bars), dtype=np.int8)
+        candle[0] = -1
+        candle[1:] = bars['close'][:-1] > bars['open'][:-1]
+
+        return cls(
+            time=bars['time'].astype(np.float64),
+            bid_high=bars['high'],
+            bid_low=bars['low'],
+            ask_high=bars['high'] + spread,
+            ask_low=bars['low'] + spread,
+            entry_bid=bars['open'],
+            entry_ask=bars['open'] + spread,
+            candle=candle,
+            duration=60.0,
+        )
+
+    @classmethod
+    def from_ticks(cls, ticks: np.ndarray) -> 'PricePath':
+        """从tick构建路径：阴阳取上一根已完成的M1K线（其最后一笔与第一笔bid比较），与实盘一致"""
+        time_sec = ticks['time_msc'] / 1000.0
+        minute = ticks['time_msc'] // 60000
+        minute_start = np.searchsorted(minute, minute, side='left')
+        bid = ticks['bid']
+        ask = ticks['ask']
+
+        # 上一根K线为本分钟之前最后一笔tick所在的分钟（中间缺K线时与终端一样取前一根存在的K线）
+        previous_close = minute_start - 1
+        has_previous = previous_close >= 0
+        previous_open = np.searchsorted(minute, minute[np.maximum(previous_close, 0)], side='left')
+        candle = np.where(has_previous, bid[np.maximum(previous_close, 0)] > bid[previous_open], -1)
+
+        return cls(
+            time=time_sec,
+            bid_high=bid,
+            bid_low=bid,
+            ask_high=ask,
+            ask_low=ask,
+            entry_bid=bid,
+            entry_ask=ask,
+            candle=candle.astype(np.int8),
+            duration=0.0,
+        )
+
+
+@dataclass
+class BacktestResult:
+    """回测结果"""
+    trades: np.ndarray
+    initial_balance: float
+    ruined: bool = False
+    equity: np.ndarray = field(init=False)
+
+    def __post_init__(self):
+        self.equity = np.concatenate(([self.initial_balance], self.trades['balance']))
+
+    @property
+    def final_balance(self) -> float:
+        return float(self.equity[-1])
+
+    @property
+    def max_drawdown(self) -> Tuple[float, float]:
+        """最大回撤（金额, 比例）"""
+        return max_drawdown(self.equity)
+
+    def summary(self) -> Dict[str, Any]:
+        """汇总统计"""
+        pnl = self.trades['pnl']
+        lots = self.trades['lot_size']
+        drawdown, drawdown_pct = self.max_drawdown
+        return {
+            "trades": int(len(self.trades)),
+            "win_rate": float(np.mean(pnl > 0)) if len(pnl) else 0.0,
+            "initial_balance": self.initial_balance,
+            "final_balance": self.final_balance,
+            "max_drawdown": drawdown,
+            "max_drawdown_pct": drawdown_pct,
+            "max_lot_size": float(lots.max()) if len(lots) else 0.0,
+            "max_loss_streak": max_loss_streak(pnl),
+            "ruined": self.ruined,
+        }
+
+
+def max_drawdown(equity: np.ndarray) -> Tuple[float, float]:
+    """计算资金曲线的最大回撤（金额, 比例）"""
+    if len(equity) == 0:
+        return 0.0, 0.0
+    peak = np.maximum.accumulate(equity)
+    drawdown = peak - equity
+    index = int(np.argmax(drawdown))
+    if drawdown[index] <= 0:
+        return 0.0, 0.0
+    return float(drawdown[index]), float(drawdown[index] / peak[index])
+
+
+def max_loss_streak(pnl: np.ndarray) -> int:
+    """计算最长连续亏损次数"""
+    loss = np.concatenate(([False], pnl < 0, [False])).astype(np.int8)
+    edges = np.diff(loss)
+    starts = np.flatnonzero(edges == 1)
+    if len(starts) == 0:
+        return 0
+    ends = np.flatnonzero(edges == -1)
+    return int((ends - starts).max())
+
+
+def find_exit(path: PricePath, start: int, is_buy: bool, tp_price: float, sl_price: float,
+              chunk: int = 64) -> Tuple[int, bool]:
+    """从 start 开始分块向量化查找首次触及止盈/止损的位置
+
+    返回 (位置, 是否止盈)，数据结束仍未平仓时位置为 -1。
+    同一根K线内同时触及止盈和止损时按止损处理（保守估计）。
+    """
+    n = len(path)
+    i = start
+    while i < n:
+        j = min(n, i + chunk)
+        if is_buy:
+            # 多单按 bid 平仓
+            tp_hit = path.bid_high[i:j] >= tp_price
+            sl_hit = path.bid_low[i:j] <= sl_price
+        else:
+            # 空单按 ask 平仓
+            tp_hit = path.ask_low[i:j] <= tp_price
+            sl_hit = path.ask_high[i:j] >= sl_price
+        hit = tp_hit | sl_hit
+        if hit.any():
+            k = int(np.argmax(hit))
+            return i + k, not sl_hit[k]
+        i = j
+        chunk *= 2
+    return -1, False
+
+
+def run_backtest(path: PricePath, config: TradingConfig, settings: Optional[BacktestSettings] = None,
+                 sequence_table: Optional[SequenceTable] = None, hit_index: Optional['HitIndex'] = None) -> BacktestResult:
+    """按 _trading_loop 的顺序回放：决策 -> 开仓 -> 等待平仓 -> 马丁格尔 -> 等待下一周期
+
+    传入覆盖回测时间范围的 sequence_table 时随机数序列直接查表；
+    传入同一行情生成的 hit_index（hit_index.py）时平仓结果直接查表，不再扫描价格路径。
+    """
+    settings = settings or BacktestSettings()
+    if hit_index is not None and not hit_index.matches(path, config.strategy_point):
+        raise ValueError("首达索引与行情数据或策略点值不匹配")
+    sequence_at = sequence_table.sequence_at if sequence_table is not None else StrategyCalculator.random_sequence_at
+    manager = MartingaleManager(config.base_lot_size, config.max_martingale_multiplier)
+    lot_size = config.base_lot_size
+    balance = settings.initial_balance
+    ruined = False
+
+    n = len(path)
+    end = n if settings.end_time is None else int(np.searchsorted(path.time, settings.end_time, side='left'))
+    i = 0 if settings.start_time is None else int(np.searchsorted(path.time, settings.start_time, side='left'))
+    chunk = 64 if path.duration else 4096
+    records: List[tuple] = []
+
+    while i < end:
+        candle = int(path.candle[i])
+        if candle < 0:
+            i += 1
+            continue
+
+        entry_time = path.time[i]
+        # 实盘在K线开盘后 decision_offset 秒决策并按该时刻的整数秒取随机数；tick路径的元素已是决策后的第一笔tick
+        decision_time = entry_time + config.decision_offset if path.duration else entry_time
+        r1, r2, r3 = sequence_at(config.seed, int(decision_time) - settings.time_offset)
+        order_type, strategy = StrategyCalculator.get_trade_strategy(candle, r1, r2, r3)
+        is_buy = order_type == OrderType.BUY
+
+        if is_buy:
+            price = path.entry_ask[i]
+            tp_price = price + strategy.tp_points * config.strategy_point
+            sl_price = price - strategy.sl_points * config.strategy_point
+        else:
+            price = path.entry_bid[i]
+            tp_price = price - strategy.tp_points * config.strategy_point
+            sl_price = price + strategy.sl_points * config.strategy_point
+
+        if hit_index is not None:
+            exit_index, hit_tp = hit_index.find_exit(i, is_buy, strategy.tp_points, strategy.sl_points)
+        else:
+            exit_index, hit_tp = find_exit(path, i, is_buy, tp_price, sl_price, chunk)
+        if exit_index < 0 or exit_index >= end:
+            break
+
+        exit_price = tp_price if hit_tp else sl_price
+        direction = 1 if is_buy else -1
+        pnl = (exit_price - price) * direction * settings.contract_size * lot_size
+        balance += pnl
+        exit_time = path.time[exit_index] + path.duration
+        sequence = (candle << 3) | (r1 << 2) | (r2 << 1) | r3
+        records.append((entry_time, exit_time, direction, sequence, strategy.tp_points,
+                        strategy.sl_points, lot_size, price, exit_price, pnl, balance))
+
+        if balance <= settings.ruin_balance:
+            ruined = True
+            break
+
+        lot_size = manager.next_lot_size(lot_size, TradeResult.from_pnl(pnl), pnl)
+
+        # 等待下一根K线的决策时刻（K线数据以整根K线为单位，不需要开盘后偏移）
+        next_time = DecisionScheduler.next_bar_time(exit_time + settings.cycle_delay,
+                                                    offset=0.0 if path.duration else config.decision_offset)
+        i = int(np.searchsorted(path.time, next_time, side='left'))
+
+    trades = np.array(records, dtype=TRADE_DTYPE)
+    return BacktestResult(trades=trades, initial_balance=settings.initial_balance, ruined=ruined)
+
+
+def _parse_time(date_text: str, time_text: str) -> float:
+    """解析MT5导出的日期时间（视为UTC）为秒"""
+    time_format = '%H:%M:%S.%f' if '.' in time_text else '%H:%M:%S'
+    parsed = datetime.strptime(f"{date_text} {time_text}", f'%Y.%m.%d {time_format}')
+    return calendar.timegm(parsed.timetuple()) + parsed.microsecond / 1e6
+
+
+def _read_csv(file_path: str) -> Tuple[List[str], List[List[str]]]:
+    """读取CSV，兼容MT5终端导出（制表符、<DATE>表头）和 pandas 导出"""
+    with open(file_path, 'r', encoding='utf-8-sig', newline='') as f:
+        sample = f.readline()
+        delimiter = '\t' if '\t' in sample else ','
+        f.seek(0)
+        reader = csv.reader(f, delimiter=delimiter)
+        header = [name.strip().strip('<>').lower() for name in next(reader)]
+        rows = [row for row in reader if row]
+    return header, rows
+
+
+def load_bars(file_path: str, start: Optional[float] = None, end: Optional[float] = None) -> np.ndarray:
+    """加载M1K线（.npy 结构化数组、.csv 或 bar_archive 目录），归档目录只读取 [start, end) 涉及的月份"""
+    if os.path.isdir(file_path):
+        from bar_archive import BarArchive
+        return BarArchive(file_path).load(start, end)
+    if file_path.endswith('.npy'):
+        return np.load(file_path)
+
+    header, rows = _read_csv(file_path)
+    bars = np.zeros(len(rows), dtype=RATES_DTYPE)
+    column = {name: index for index, name in enumerate(header)}
+    if 'date' in column:
+        bars['time'] = [_parse_time(row[column['date']], row[column['time']]) for row in rows]
+    else:
+        bars['time'] = [int(float(row[column['time']])) for row in rows]
+
+    aliases = {'tick_volume': 'tickvol', 'real_volume': 'vol'}
+    for name in ('open', 'high', 'low', 'close', 'tick_volume', 'spread', 'real_volume'):
+        source = name if name in column else aliases.get(name)
+        if source in column:
+            bars[name] = [float(row[column[source]]) for row in rows]
+    return bars
+
+
+def load_ticks(file_path: str, start: Optional[float] = None, end: Optional[float] = None) -> np.ndarray:
+    """加载tick（.npy 结构化数组、.csv 或 tick_store 目录），只保留 time_msc/bid/ask"""
+    if os.path.isdir(file_path):
+        # tick存储直接返回 [start, end) 的内存映射视图，不复制
+        from tick_store import TickStore
+        return TickStore(file_path).ticks(None if start is None else int(start * 1000),
+                                          None if end is None else int(end * 1000))
+    if file_path.endswith('.npy'):
+        raw = np.load(file_path)
+    else:
+        header, rows = _read_csv(file_path)
+        column = {name: index for index, name in enumerate(header)}
+        raw = np.zeros(len(rows), dtype=TICKS_DTYPE)
+        if 'date' in column:
+            raw['time_msc'] = [round(_parse_time(row[column['date']], row[column['time']]) * 1000) for row in rows]
+        else:
+            raw['time_msc'] = [int(float(row[column['time_msc']])) for row in rows]
+        raw['bid'] = [float(row[column['bid']] or 'nan') for row in rows]
+        raw['ask'] = [float(row[column['ask']] or 'nan') for row in rows]
+
+    ticks = np.zeros(len(raw), dtype=TICKS_DTYPE)
+    for name in TICKS_DTYPE.names:
+        ticks[name] = raw[name]
+    # MT5导出中只变动一边报价的tick另一边为空，向前填充
+    for name in ('bid', 'ask'):
+        values = ticks[name]
+        valid = ~np.isnan(values)
+        if not valid.all():
+            index = np.where(valid, np.arange(len(values)), 0)
+            np.maximum.accumulate(index, out=index)
+            ticks[name] = values[index]
+    return ticks
+
+
+def _parse_date(text: str) -> int:
+    time_format = '%Y-%m-%d %H:%M' if ' ' in text else '%Y-%m-%d'
+    return calendar.timegm(datetime.strptime(text, time_format).timetuple())
+
+
+def save_trades(trades: np.ndarray, file_path: str):
+    """保存成交记录为CSV"""
+    with open(file_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(('entry_time', 'exit_time', 'direction', 'sequence', 'tp_points', 'sl_points',
+                         'lot_size', 'entry_price', 'exit_price', 'pnl', 'balance'))
+        for trade in trades:
+            sequence = ''.join('阳' if (trade['sequence'] >> bit) & 1 else '阴' for bit in (3, 2, 1, 0))
+            writer.writerow((
+                datetime.fromtimestamp(trade['entry_time'], timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+                datetime.fromtimestamp(trade['exit_time'], timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+                'BUY' if trade['direction'] > 0 else 'SELL', sequence,
+                int(trade['tp_points']), int(trade['sl_points']), f"{trade['lot_size']:.2f}",
+                f"{trade['entry_price']:.3f}", f"{trade['exit_price']:.3f}",
+                f"{trade['pnl']:.2f}", f"{trade['balance']:.2f}",
+            ))
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """回测命令行入口"""
+    parser = argparse.ArgumentParser(prog="backtest", description="RandomMartingale 历史回测")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--bars", help="M1K线文件（.npy、.csv 或 bar_archive 目录）")
+    source.add_argument("--ticks", help="tick文件（.npy、.csv 或 tick_store 目录）")
+    parser.add_argument("--config", default="config.json", help="配置文件")
+    parser.add_argument("--seed", type=int, help="覆盖配置中的随机数种子")
+    parser.add_argument("--start", help="开始时间 YYYY-MM-DD[ HH:MM]（K线时间）")
+    parser.add_argument("--end", help="结束时间 YYYY-MM-DD[ HH:MM]")
+    parser.add_argument("--balance", type=float, default=100.0, help="初始余额")
+    parser.add_argument("--point", type=float, default=0.001, help="K线 spread 的点值")
+    parser.add_argument("--time-offset", type=int, default=0, help="服务器时间与UTC的秒差")
+    parser.add_argument("--sequence-table", help="sequence_table.py 生成的预计算表（.npy）")
+    parser.add_argument("--hit-index", help="hit_index.py 生成的首达索引（.npy）")
+    parser.add_argument("--trades-out", help="成交记录CSV输出路径")
+    args = parser.parse_args(argv)
+
+    config = ConfigManager(args.config).get_trading_config()
+    if args.seed is not None:
+        config = replace(config, seed=args.seed)
+    settings = BacktestSettings(initial_balance=args.balance, point=args.point, time_offset=args.time_offset,
+                                start_time=_parse_date(args.start) if args.start else None,
+                                end_time=_parse_date(args.end) if args.end else None)
+
+    # 向前多读一周（跨过周末休市），第一根K线的阴阳与完整数据回测一致
+    load_from = settings.start_time - 7 * 86400 if settings.start_time is not None else None
+    if args.bars:
+        path = PricePath.from_bars(load_bars(args.bars, load_from, settings.end_time), settings.point)
+    else:
+        path = PricePath.from_ticks(load_ticks(args.ticks, load_from, settings.end_time))
+
+    sequence_table = SequenceTable.load(args.sequence_table) if args.sequence_table else None
+    hit_index = None
+    if args.hit_index:
+        from hit_index import HitIndex
+        hit_index = HitIndex.load(args.hit_index)
+    result = run_backtest(path, config, settings, sequence_table, hit_index)
+    summary = result.summary()
+    logger.info(f"回测完成 | 种子: {config.seed} | 交易次数: {summary['trades']} | 胜率: {summary['win_rate']:.1%} | "
+                f"余额: ${summary['initial_balance']:.2f} -> ${summary['final_balance']:.2f} | "
+                f"最大回撤: ${summary['max_drawdown']:.2f} ({summary['max_drawdown_pct']:.1%}) | "
+                f"最长连亏: {summary['max_loss_streak']} | 最大手数: {summary['max_lot_size']:.2f}"
+                f"{' | 已爆仓' if summary['ruined'] else ''}")
+
+    if args.trades_out:
+        save_trades(result.trades, args.trades_out)
+        logger.info(f"成交记录已保存: {args.trades_out}")
+    return result
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,216 @@
+"""
+K线本地归档
+按 品种/周期 分目录，每月一个 .npy（copy_rates_range 原样的结构化数组）加一个 manifest.json。
+下载器分块调用 copy_rates_range，已完成的月份直接跳过，未完成的月份从已保存的最后一根K线之后续传，
+中断后重新运行即可接着下载。回测、首达索引等离线工具按时间范围只内存映射需要的月份，不需要MT5终端。
+
+用法：
+    python bar_archive.py download --symbol XAUUSDm --timeframes M1,M5 --start 2024-01-01 --root bars
+    python bar_archive.py info --root bars --symbol XAUUSDm
+    python XAUUSD.py backtest --bars bars/XAUUSDm/M1 --start 2025-01-01 --end 2025-03-01
+"""
+
+import argparse
+import calendar
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, Sequence, Tuple, Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TIMEFRAME_SECONDS = {"M1": 60, "M5": 300, "M15": 900, "M30": 1800, "H1": 3600, "H4": 14400, "D1": 86400}
+
+
+def month_key(timestamp: float) -> str:
+    """时间戳所在月份，如 2025-01"""
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m')
+
+
+def month_range(key: str) -> Tuple[int, int]:
+    """月份的 [开始, 结束) 时间戳"""
+    year, month = (int(part) for part in key.split('-'))
+    following = (year + 1, 1) if month == 12 else (year, month + 1)
+    return calendar.timegm((year, month, 1, 0, 0, 0)), calendar.timegm((*following, 1, 0, 0, 0))
+
+
+def months_between(start: float, end: float) -> List[str]:
+    """覆盖 [start, end) 的所有月份"""
+    keys = []
+    key = month_key(start)
+    while month_range(key)[0] < end:
+        keys.append(key)
+        key = month_key(month_range(key)[1])
+    return keys
+
+
+class BarArchive:
+    """单品种单周期的按月K线归档"""
+
+    MANIFEST_FILE = "manifest.json"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.manifest_file = os.path.join(directory, self.MANIFEST_FILE)
+        self.months: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                self.months = json.load(f)["months"]
+
+    @classmethod
+    def at(cls, root: str, symbol: str, timeframe: str) -> 'BarArchive':
+        return cls(os.path.join(root, symbol, timeframe))
+
+    def month_file(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npy")
+
+    def _save_manifest(self):
+        """原子替换清单"""
+        temporary = self.manifest_file + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump({"months": dict(sorted(self.months.items()))}, f, indent=2)
+        os.replace(temporary, self.manifest_file)
+
+    def save_month(self, key: str, bars: np.ndarray, covered_from: int, complete: bool):
+        """先写月份文件再更新清单，中断时清单只会落后于数据，不会指向不完整的文件
+
+        covered_from 为本月已下载范围的起点，complete 表示已下载到月末。
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = self.month_file(key) + '.tmp.npy'
+        np.save(temporary, bars)
+        os.replace(temporary, self.month_file(key))
+        self.months[key] = {
+            "rows": int(len(bars)),
+            "first": int(bars['time'][0]) if len(bars) else None,
+            "last": int(bars['time'][-1]) if len(bars) else None,
+            "from": covered_from,
+            "complete": complete,
+        }
+        self._save_manifest()
+
+    def load_month(self, key: str, mmap: bool = True) -> Optional[np.ndarray]:
+        if key not in self.months or not os.path.exists(self.month_file(key)):
+            return None
+        return np.load(self.month_file(key), mmap_mode='r' if mmap else None)
+
+    def load(self, start: Optional[float] = None, end: Optional[float] = None) -> np.ndarray:
+        """读取 [start, end) 内的K线，只映射涉及的月份；只涉及一个月时返回内存映射视图"""
+        keys = sorted(self.months)
+        if start is not None:
+            keys = [key for key in keys if month_range(key)[1] > start]
+        if end is not None:
+            keys = [key for key in keys if month_range(key)[0] < end]
+        parts = [bars for bars in (self.load_month(key) for key in keys) if bars is not None and len(bars)]
+        if not parts:
+            raise FileNotFoundError(f"K线归档中没有所需月份: {self.directory}")
+
+        bars = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        first = 0 if start is None else int(np.searchsorted(bars['time'], start, side='left'))
+        last = len(bars) if end is None else int(np.searchsorted(bars['time'], end, side='left'))
+        return bars[first:last]
+
+
+def download(archive: BarArchive, symbol: str, timeframe: str, start: float, end: Optional[float] = None,
+             chunk_days: float = 7.0, api=None, clock=None) -> int:
+    """分块下载 [start, end) 的K线到归档，跳过已完成的月份，返回新增K线数
+
+    只下载到最后一根已收盘的K线，正在形成的K线高低收不完整，留到下次续传。
+    """
+    if api is None:
+        import MetaTrader5 as api
+    timeframe_code = getattr(api, f"TIMEFRAME_{timeframe}")
+    seconds = TIMEFRAME_SECONDS[timeframe]
+    now = clock.time() if clock is not None else time.time()
+    end = min(end or now, now // seconds * seconds)
+    chunk = int(chunk_days * 86400)
+    added = 0
+
+    for key in months_between(start, end):
+        month_start, month_end = month_range(key)
+        covered_from = max(month_start, int(start))
+        record = archive.months.get(key)
+        parts = []
+        if record and record["from"] <= covered_from:
+            if record["complete"]:
+                continue
+            # 续传：重新下载已保存的最后一根K线（旧版本可能保存了当时尚未收盘的K线）
+            covered_from = record["from"]
+            existing = archive.load_month(key, mmap=False)
+            if existing is not None and len(existing):
+                parts.append(existing[:-1])
+        cursor = covered_from
+        if parts:
+            cursor = max(cursor, int(existing['time'][-1]))
+        stop = min(month_end, end)
+
+        while cursor < stop:
+            chunk_end = min(cursor + chunk, stop)
+            # copy_rates_range 的结束时间包含在内
+            rates = api.copy_rates_range(symbol, timeframe_code, datetime.fromtimestamp(cursor, timezone.utc),
+                                         datetime.fromtimestamp(chunk_end - 1, timezone.utc))
+            if rates is None:
+                raise RuntimeError(f"copy_rates_range 失败 {symbol} {timeframe} {key}，错误代码: {api.last_error()}")
+            if len(rates):
+                parts.append(rates)
+                added += len(rates)
+            cursor = chunk_end
+            # 每块都落盘，中断后从这里续传
+            bars = np.concatenate(parts) if parts else np.zeros(0, dtype=rates.dtype)
+            archive.save_month(key, bars, covered_from, complete=cursor >= month_end)
+        logger.info(f"{symbol} {timeframe} {key} | K线: {archive.months.get(key, {}).get('rows', 0)}"
+                    f"{'' if archive.months.get(key, {}).get('complete') else ' | 未完成'}")
+    return added
+
+
+def _parse_date(text: str) -> int:
+    time_format = '%Y-%m-%d %H:%M' if ' ' in text else '%Y-%m-%d'
+    return calendar.timegm(datetime.strptime(text, time_format).timetuple())
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """K线归档命令行入口"""
+    parser = argparse.ArgumentParser(prog="bar_archive", description="K线批量下载与本地归档")
+    commands = parser.add_subparsers(dest="command", required=True)
+    downloader = commands.add_parser("download", help="从MT5终端下载K线")
+    downloader.add_argument("--config", default="config.json", help="配置文件（MT5账户）")
+    downloader.add_argument("--symbol", help="品种，默认取配置")
+    downloader.add_argument("--timeframes", default="M1,M5", help="逗号分隔的周期")
+    downloader.add_argument("--start", required=True, help="开始日期 YYYY-MM-DD[ HH:MM]（UTC）")
+    downloader.add_argument("--end", help="结束日期，默认到当前")
+    downloader.add_argument("--chunk-days", type=float, default=7.0, help="每次请求的天数")
+    downloader.add_argument("--root", default="bars", help="归档根目录")
+    info = commands.add_parser("info", help="查看归档内容")
+    info.add_argument("--root", default="bars", help="归档根目录")
+    info.add_argument("--symbol", required=True, help="品种")
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        for timeframe in sorted(os.listdir(os.path.join(args.root, args.symbol))):
+            archive = BarArchive.at(args.root, args.symbol, timeframe)
+            for key, record in sorted(archive.months.items()):
+                logger.info(f"{args.symbol} {timeframe} {key} | K线: {record['rows']}"
+                            f"{'' if record['complete'] else ' | 未完成'}")
+        return None
+
+    from XAUUSD import ConfigManager, MT5Connector
+    config_manager = ConfigManager(args.config)
+    symbol = args.symbol or config_manager.get_trading_config().symbol
+    start = _parse_date(args.start)
+    end = _parse_date(args.end) if args.end else None
+    added = {}
+    with MT5Connector(config_manager.get_mt5_config()):
+        for timeframe in (name.strip().upper() for name in args.timeframes.split(',') if name.strip()):
+            archive = BarArchive.at(args.root, symbol, timeframe)
+            added[timeframe] = download(archive, symbol, timeframe, start, end, args.chunk_days)
+            logger.info(f"下载完成 | {symbol} {timeframe} | 新增: {added[timeframe]} 根")
+    return added
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,279 @@
+"""
+交易循环热路径基准测试
+在进程内模拟终端（mt5_sim）上按 _trading_loop 的顺序重复运行决策周期，
+逐阶段统计耗时与内存分配，可为每次API调用注入固定延迟，并保存/对比基线。
+
+用法：
+    python bench.py --bars XAUUSDm_M1.npy --cycles 500 --save-baseline bench_baseline.json
+    python bench.py --bars XAUUSDm_M1.npy --cycles 500 --baseline bench_baseline.json
+"""
+
+import argparse
+import calendar
+import json
+import logging
+import time
+import tracemalloc
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Optional, Dict, List, Sequence, Callable
+
+import numpy as np
+
+import mt5_sim
+
+logger = logging.getLogger(__name__)
+
+# 每个决策周期依次执行的阶段
+STAGES = (
+    "check_for_updates", "get_seed", "get_candle_pattern", "generate_random_sequence",
+    "get_trade_strategy", "execute_trade", "calculate_pnl", "calculate_next_lot_size",
+)
+
+
+@dataclass
+class BenchSettings:
+    """基准测试参数"""
+    cycles: int = 200                 # 计入统计的决策周期数
+    warmup: int = 20                  # 预热周期数（建立K线缓存、成交历史游标等）
+    latency_ms: float = 0.0           # 每次MT5 API调用注入的延迟（毫秒）
+    start_time: Optional[float] = None
+    balance: float = 1e9              # 足够大，避免资金不足中断测试
+    point: float = 0.001
+    with_logging: bool = False        # 是否计入日志输出的耗时
+
+
+class HotPathBench:
+    """在模拟终端上逐阶段运行决策周期"""
+
+    def __init__(self, bars: np.ndarray, config_file: str, settings: BenchSettings):
+        import XAUUSD
+
+        self.xau = XAUUSD
+        self.settings = settings
+        self.config_manager = XAUUSD.ConfigManager(config_file)
+        self.config = self.config_manager.get_trading_config()
+        self.seed_manager = XAUUSD.SeedManager(self.config_manager)
+        self.clock = mt5_sim.SimulatedClock()
+        self.terminal = mt5_sim.SimulatedTerminal.from_bars(self.config.symbol, bars, self.clock,
+                                                            point=settings.point, balance=settings.balance)
+        mt5_sim.attach(self.terminal)
+        self.bar_cache = XAUUSD.BarCache(self.config.symbol)
+        self.martingale_manager = XAUUSD.MartingaleManager(self.config.base_lot_size,
+                                                           self.config.max_martingale_multiplier)
+        self.trade_executor = XAUUSD.TradeExecutor(self.config.magic_number, self.config.deviation, self.clock,
+                                                   base_lot_size=self.config.base_lot_size,
+                                                   strategy_point=self.config.strategy_point)
+        self.lot_size = self.config.base_lot_size
+
+    def reset(self):
+        """回到起始时间，保证计时和内存两轮运行相同的周期"""
+        # K线缓存需要一天的历史
+        start = self.settings.start_time or self.terminal.first_time + 86400
+        self.clock.reset(start, self.terminal.last_time)
+        self.terminal.positions.clear()
+        self.terminal.orders.clear()
+        self.terminal.deals.clear()
+        self.terminal.balance = self.settings.balance
+        self.bar_cache = self.xau.BarCache(self.config.symbol)
+        self.trade_executor.deal_history = self.xau.DealHistory(self.config.magic_number, self.clock)
+        self.martingale_manager = self.xau.MartingaleManager(self.config.base_lot_size,
+                                                             self.config.max_martingale_multiplier)
+        self.lot_size = self.config.base_lot_size
+
+    def cycle(self, measure: Callable) -> bool:
+        """运行一个决策周期，每个阶段经 measure(stage, function, *args) 调用；数据用尽时返回 False"""
+        xau = self.xau
+        symbol = self.config.symbol
+        self.clock.reset(xau.DecisionScheduler.next_bar_time(self.clock.time(), offset=self.config.decision_offset),
+                         self.terminal.last_time)
+
+        measure("check_for_updates", self.config_manager.check_for_updates)
+        seed = measure("get_seed", self.seed_manager.get_seed)
+        candle_pattern = measure("get_candle_pattern", xau.StrategyCalculator.get_candle_pattern,
+                                 symbol, self.bar_cache)
+        if candle_pattern is None:
+            return False
+        r1, r2, r3 = measure("generate_random_sequence", xau.StrategyCalculator.random_sequence_at,
+                             seed, int(self.clock.time()))
+        order_type, strategy = measure("get_trade_strategy", xau.StrategyCalculator.get_trade_strategy,
+                                       candle_pattern, r1, r2, r3)
+        position_info = measure("execute_trade", self.trade_executor.execute_trade, symbol, order_type,
+                                strategy, self.lot_size, (candle_pattern, r1, r2, r3))
+        if position_info is None:
+            return False
+
+        # 模拟终端已知平仓时刻，直接跳过持仓等待
+        exit_time = self.terminal.positions[position_info.ticket]['exit_time']
+        if exit_time >= self.terminal.last_time:
+            return False
+        self.clock.reset(exit_time, self.terminal.last_time)
+
+        result, pnl = measure("calculate_pnl", self.trade_executor._calculate_pnl, position_info, symbol)
+        self.lot_size = measure("calculate_next_lot_size", self.martingale_manager.calculate_next_lot_size,
+                                self.lot_size, result, pnl)
+        return True
+
+    def _run(self, measure: Callable) -> int:
+        self.reset()
+        skip = lambda stage, function, *args: function(*args)
+        for _ in range(self.settings.warmup):
+            if not self.cycle(skip):
+                return 0
+        completed = 0
+        while completed < self.settings.cycles and self.cycle(measure):
+            completed += 1
+        return completed
+
+    def time_stages(self) -> Dict[str, List[float]]:
+        """计时轮：每阶段每次调用的耗时（微秒），cycle 为整个周期"""
+        samples: Dict[str, List[float]] = {stage: [] for stage in STAGES + ("cycle",)}
+        cycle_time = [0.0]
+
+        def measure(stage, function, *args):
+            start = time.perf_counter()
+            result = function(*args)
+            elapsed = (time.perf_counter() - start) * 1e6
+            samples[stage].append(elapsed)
+            cycle_time[0] += elapsed
+            if stage == STAGES[-1]:
+                samples["cycle"].append(cycle_time[0])
+                cycle_time[0] = 0.0
+            return result
+
+        self._run(measure)
+        return samples
+
+    def trace_allocations(self) -> Dict[str, List[float]]:
+        """内存轮：每阶段每次调用的峰值分配字节数（tracemalloc）"""
+        samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+
+        def measure(stage, function, *args):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            result = function(*args)
+            samples[stage].append(tracemalloc.get_traced_memory()[1] - before)
+            return result
+
+        tracemalloc.start()
+        try:
+            self._run(measure)
+        finally:
+            tracemalloc.stop()
+        return samples
+
+
+def summarize(timings: Dict[str, List[float]], allocations: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    """汇总每阶段的耗时分位数和平均分配量"""
+    report = {}
+    for stage, values in timings.items():
+        if not values:
+            continue
+        values = np.asarray(values)
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        report[stage] = {
+            "count": int(len(values)),
+            "mean_us": float(values.mean()),
+            "p50_us": float(p50),
+            "p95_us": float(p95),
+            "p99_us": float(p99),
+        }
+        if allocations.get(stage):
+            report[stage]["alloc_bytes"] = float(np.mean(allocations[stage]))
+    return report
+
+
+def compare(report: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float) -> List[str]:
+    """与基线对比 p50 耗时和平均分配量，返回超出容差的阶段"""
+    regressions = []
+    for stage, current in report.items():
+        previous = baseline.get(stage)
+        if previous is None:
+            continue
+        for key in ("p50_us", "alloc_bytes"):
+            if key in current and previous.get(key):
+                ratio = current[key] / previous[key]
+                if ratio > 1 + tolerance:
+                    regressions.append(f"{stage}.{key}: {previous[key]:.1f} -> {current[key]:.1f} ({ratio:.2f}x)")
+    return regressions
+
+
+def run_bench(bars: np.ndarray, config_file: str, settings: BenchSettings) -> Dict[str, Dict[str, float]]:
+    """运行计时轮和内存轮并汇总"""
+    bench = HotPathBench(bars, config_file, settings)
+    trading_loggers = [logging.getLogger(name) for name in bench.xau.TRADING_LOGGERS]
+    levels = [trading_logger.level for trading_logger in trading_loggers]
+    if not settings.with_logging:
+        for trading_logger in trading_loggers:
+            trading_logger.setLevel(logging.CRITICAL)
+    mt5_sim.set_latency(settings.latency_ms / 1000)
+    try:
+        timings = bench.time_stages()
+        allocations = bench.trace_allocations()
+    finally:
+        mt5_sim.set_latency(0.0)
+        for trading_logger, level in zip(trading_loggers, levels):
+            trading_logger.setLevel(level)
+    return summarize(timings, allocations)
+
+
+def _parse_date(text: str) -> float:
+    time_format = '%Y-%m-%d %H:%M' if ' ' in text else '%Y-%m-%d'
+    return calendar.timegm(datetime.strptime(text, time_format).timetuple())
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """基准测试命令行入口"""
+    mt5_sim.install()
+    from backtest import load_bars
+
+    parser = argparse.ArgumentParser(prog="bench", description="交易循环热路径基准测试")
+    parser.add_argument("--bars", required=True, help="M1K线文件（.npy、.csv 或 bar_archive 目录）")
+    parser.add_argument("--config", default="config.json", help="配置文件")
+    parser.add_argument("--cycles", type=int, default=200, help="计入统计的决策周期数")
+    parser.add_argument("--warmup", type=int, default=20, help="预热周期数")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="每次MT5 API调用注入的延迟（毫秒）")
+    parser.add_argument("--start", help="开始时间 YYYY-MM-DD[ HH:MM]，默认数据开头后一天")
+    parser.add_argument("--with-logging", action="store_true", help="计入交易日志输出的耗时")
+    parser.add_argument("--log-pipeline", action="store_true",
+                        help="交易日志经异步日志管线写入 bench_trading.log / bench_events.jsonl（配合 --with-logging）")
+    parser.add_argument("--save-baseline", help="把结果保存为基线JSON")
+    parser.add_argument("--baseline", help="与基线JSON对比")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="相对基线允许的变慢比例")
+    args = parser.parse_args(argv)
+
+    if args.log_pipeline:
+        import log_pipeline
+        log_pipeline.setup('bench_trading.log', 'bench_events.jsonl')
+
+    settings = BenchSettings(cycles=args.cycles, warmup=args.warmup, latency_ms=args.latency_ms,
+                             start_time=_parse_date(args.start) if args.start else None,
+                             with_logging=args.with_logging)
+    report = run_bench(load_bars(args.bars), args.config, settings)
+
+    logger.info(f"{'阶段':<26} {'次数':>6} {'平均us':>10} {'p50us':>10} {'p95us':>10} {'p99us':>10} {'分配B':>10}")
+    for stage, row in report.items():
+        logger.info(f"{stage:<26} {row['count']:>6} {row['mean_us']:>10.1f} {row['p50_us']:>10.1f} "
+                    f"{row['p95_us']:>10.1f} {row['p99_us']:>10.1f} {row.get('alloc_bytes', 0):>10.0f}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({"settings": asdict(settings), "stages": report}, f, indent=2, ensure_ascii=False)
+        logger.info(f"基线已保存: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline["stages"], args.tolerance)
+        for line in regressions:
+            logger.warning(f"性能回退 | {line}")
+        if regressions:
+            raise SystemExit(1)
+        logger.info(f"与基线对比通过（容差 {args.tolerance:.0%}）")
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
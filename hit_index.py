@@ -0,0 +1,226 @@
+"""
+首达索引：预计算每个入场点、每种 (方向, 止盈, 止损) 先触及哪一边以及多久平仓
+止盈/止损都是 STRATEGY_MAP 中的 1~4 个策略点，对整段行情做几轮向量化扫描即可求出所有组合。
+结果打包为 uint32（平仓位置偏移 << 1 | 是否止盈）存成 .npy，按内存映射加载后回测、扫描和
+策略表优化都可以 O(1) 查到任意一笔交易的结果，不再逐笔回放价格路径。
+
+判定规则与 backtest.find_exit 完全相同：多单按 bid、空单按 ask 平仓，同一元素内同时触及按止损处理。
+"""
+
+import argparse
+import json
+import logging
+from typing import Optional, Dict, Tuple, Sequence
+
+import numpy as np
+
+from backtest import PricePath, load_bars, load_ticks
+from martingale_core import ConfigManager, StrategyCalculator
+
+logger = logging.getLogger(__name__)
+
+# 数据结束仍未平仓
+NO_EXIT = np.uint32(0xFFFFFFFF)
+
+
+def first_reach(values: np.ndarray, levels: np.ndarray, above: bool = True, block: int = 16) -> np.ndarray:
+    """对每个 i 返回最小的 j >= i 使 values[j] >= levels[i]（above=False 时为 <=），不存在时为 len(values)
+
+    先在 i 所在的块内逐个偏移扫描（大多数入场点几根K线内就会平仓），剩下的用块最大值的稀疏表倍增定位到块，
+    再在块内扫描，总开销 O(n log n)，全部为向量化操作。
+    """
+    if not above:
+        values, levels = -values, -levels
+    n = len(values)
+    result = np.full(n, n, dtype=np.int64)
+    block_count = (n + block - 1) // block
+    padded = np.full(block_count * block, -np.inf)
+    padded[:n] = values
+
+    # 1. 扫描到各自所在块的末尾
+    pending = np.arange(n)
+    overflow = []
+    for k in range(block):
+        if not len(pending):
+            break
+        position = pending + k
+        hit = padded[position] >= levels[pending]
+        result[pending[hit]] = position[hit]
+        pending = pending[~hit]
+        at_end = (pending + k + 1) % block == 0
+        overflow.append(pending[at_end])
+        pending = pending[~at_end]
+    pending = np.concatenate(overflow) if overflow else pending
+    if not len(pending):
+        return result
+
+    # 2. 块最大值的稀疏表：table[k][b] = max(块 b .. b + 2^k - 1)，越界位置为 +inf 使倍增停在末尾
+    block_max = padded.reshape(block_count, block).max(axis=1)
+    table = [np.append(block_max, np.inf)]
+    while (1 << len(table)) <= block_count:
+        previous, step = table[-1], 1 << (len(table) - 1)
+        current = previous.copy()
+        current[:block_count - step] = np.maximum(previous[:block_count - step], previous[step:block_count])
+        table.append(current)
+
+    target = levels[pending]
+    position = np.minimum(pending // block + 1, block_count)
+    for k in range(len(table) - 1, -1, -1):
+        below = table[k][position] < target
+        position = np.minimum(position + (below << k), block_count)
+
+    # 3. 在定位到的块内扫描
+    found = position < block_count
+    pending, target, start = pending[found], target[found], position[found] * block
+    for k in range(block):
+        if not len(pending):
+            break
+        hit = padded[start + k] >= target
+        result[pending[hit]] = start[hit] + k
+        pending, target, start = pending[~hit], target[~hit], start[~hit]
+    return result
+
+
+class HitIndex:
+    """按 (入场位置, 方向, 止盈点数-1, 止损点数-1) 索引的首达结果，方向 0 为多、1 为空"""
+
+    def __init__(self, codes: np.ndarray, meta: Dict):
+        self.codes = codes
+        self.meta = meta
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @classmethod
+    def build(cls, path: PricePath, strategy_point: float, max_tp: Optional[int] = None,
+              max_sl: Optional[int] = None, file_path: Optional[str] = None,
+              chunk_size: int = 1 << 18) -> 'HitIndex':
+        """扫描价格路径，计算所有入场点在每种方向和止盈/止损距离下的平仓位置与结果
+
+        传入 file_path 时结果按 chunk_size 个入场点一块直接写入 .npy 内存映射（元数据同时写入 .json），
+        内存中只保留一个方向的首达位置和一块编码，不再分配完整的索引数组。
+        """
+        strategies = StrategyCalculator.STRATEGY_MAP.values()
+        max_tp = max_tp or max(s.tp_points for s in strategies)
+        max_sl = max_sl or max(s.sl_points for s in strategies)
+        n = len(path)
+        meta = {
+            "length": n,
+            "strategy_point": strategy_point,
+            "first_time": float(path.time[0]) if n else 0.0,
+            "last_time": float(path.time[-1]) if n else 0.0,
+            "max_tp": max_tp,
+            "max_sl": max_sl,
+        }
+        shape = (n, 2, max_tp, max_sl)
+        if file_path is None:
+            codes = np.empty(shape, dtype=np.uint32)
+        else:
+            codes = np.lib.format.open_memmap(file_path, mode='w+', dtype=np.uint32, shape=shape)
+
+        for direction, is_buy in enumerate((True, False)):
+            # 与 run_backtest 相同的止盈/止损价格计算，保证浮点比较结果一致
+            if is_buy:
+                price = path.entry_ask
+                tp_exits = np.stack([first_reach(path.bid_high, price + tp * strategy_point, above=True)
+                                     for tp in range(1, max_tp + 1)], axis=1)
+                sl_exits = np.stack([first_reach(path.bid_low, price - sl * strategy_point, above=False)
+                                     for sl in range(1, max_sl + 1)], axis=1)
+            else:
+                price = path.entry_bid
+                tp_exits = np.stack([first_reach(path.ask_low, price - tp * strategy_point, above=False)
+                                     for tp in range(1, max_tp + 1)], axis=1)
+                sl_exits = np.stack([first_reach(path.ask_high, price + sl * strategy_point, above=True)
+                                     for sl in range(1, max_sl + 1)], axis=1)
+
+            for start in range(0, n, chunk_size):
+                stop = min(start + chunk_size, n)
+                tp_exit = tp_exits[start:stop, :, None]
+                sl_exit = sl_exits[start:stop, None, :]
+                exit_index = np.minimum(tp_exit, sl_exit)
+                offsets = np.arange(start, stop)[:, None, None]
+                code = ((exit_index - offsets) << 1 | (tp_exit < sl_exit)).astype(np.uint32)
+                code[exit_index >= n] = NO_EXIT
+                codes[start:stop, direction] = code
+            del tp_exits, sl_exits
+
+        if file_path is not None:
+            codes.flush()
+            cls._save_meta(file_path, meta)
+        return cls(codes, meta)
+
+    def matches(self, path: PricePath, strategy_point: float) -> bool:
+        """索引是否由同一段行情、同一策略点值生成"""
+        return (self.meta["length"] == len(path) and self.meta["strategy_point"] == strategy_point
+                and (not len(path) or (self.meta["first_time"] == float(path.time[0])
+                                       and self.meta["last_time"] == float(path.time[-1]))))
+
+    def find_exit(self, start: int, is_buy: bool, tp_points: int, sl_points: int) -> Tuple[int, bool]:
+        """O(1) 查询，返回值与 backtest.find_exit 相同：(平仓位置, 是否止盈)，未平仓时位置为 -1"""
+        code = int(self.codes[start, 0 if is_buy else 1, tp_points - 1, sl_points - 1])
+        if code == NO_EXIT:
+            return -1, False
+        return start + (code >> 1), bool(code & 1)
+
+    def outcomes(self, starts: np.ndarray, is_buy: np.ndarray, tp_points: np.ndarray,
+                 sl_points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """批量查询，返回 (平仓位置, 是否止盈)，未平仓时位置为 -1"""
+        starts = np.asarray(starts, dtype=np.int64)
+        codes = self.codes[starts, np.where(is_buy, 0, 1), np.asarray(tp_points) - 1, np.asarray(sl_points) - 1]
+        closed = codes != NO_EXIT
+        exit_index = np.where(closed, starts + (codes >> 1).astype(np.int64), -1)
+        return exit_index, closed & (codes & 1).astype(bool)
+
+    def hit_probabilities(self) -> Dict[Tuple[int, int], float]:
+        """各止盈/止损距离在全部入场点、两个方向上先到止盈的比例（供 ruin.py 使用）"""
+        probabilities = {}
+        for tp in range(1, self.meta["max_tp"] + 1):
+            for sl in range(1, self.meta["max_sl"] + 1):
+                codes = self.codes[:, :, tp - 1, sl - 1]
+                closed = codes != NO_EXIT
+                probabilities[(tp, sl)] = float(np.count_nonzero(codes[closed] & 1) / max(np.count_nonzero(closed), 1))
+        return probabilities
+
+    def save(self, file_path: str):
+        """保存为 .npy，元数据写入同名 .json"""
+        np.save(file_path, self.codes)
+        self._save_meta(file_path, self.meta)
+
+    @staticmethod
+    def _save_meta(file_path: str, meta: Dict):
+        with open(file_path + '.json', 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, file_path: str, mmap: bool = True) -> 'HitIndex':
+        """加载首达索引，默认内存映射不读入内存"""
+        with open(file_path + '.json', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        return cls(np.load(file_path, mmap_mode='r' if mmap else None), meta)
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """首达索引命令行入口"""
+    parser = argparse.ArgumentParser(prog="hit_index", description="预计算止盈/止损首达索引")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--bars", help="M1K线文件（.npy、.csv 或 bar_archive 目录）")
+    source.add_argument("--ticks", help="tick文件（.npy、.csv 或 tick_store 目录）")
+    parser.add_argument("--config", default="config.json", help="配置文件（策略点值）")
+    parser.add_argument("--point", type=float, default=0.001, help="K线 spread 的点值")
+    parser.add_argument("--out", required=True, help="输出 .npy 路径")
+    args = parser.parse_args(argv)
+
+    if args.bars:
+        path = PricePath.from_bars(load_bars(args.bars), args.point)
+    else:
+        path = PricePath.from_ticks(load_ticks(args.ticks))
+    strategy_point = ConfigManager(args.config).get_trading_config().strategy_point
+    index = HitIndex.build(path, strategy_point, file_path=args.out)
+    logger.info(f"首达索引完成 | 入场点: {len(index)} | 组合: {index.codes[0].size if len(index) else 0} | "
+                f"大小: {index.codes.nbytes / 1e6:.1f} MB | 文件: {args.out}")
+    return index
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,118 @@
+"""
+启动耗时基准测试
+每次在全新的解释器进程中导入一个模块，统计导入耗时和整个进程耗时（取中位数），
+并检查策略核心和实盘入口在导入时没有加载 MetaTrader5 / NumPy 等重依赖。可保存/对比基线。
+
+用法：
+    python import_bench.py --save-baseline import_baseline.json
+    python import_bench.py --baseline import_baseline.json
+    python import_bench.py --modules martingale_core,backtest --repeat 10
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Optional, Dict, List, Sequence, Any
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODULES = ("martingale_core", "XAUUSD", "backtest", "sweep", "ruin")
+
+# 导入时加载就算作重依赖
+HEAVY_MODULES = ("MetaTrader5", "numpy", "pandas", "scipy")
+
+# 这些模块导入时不允许加载重依赖
+LIGHT_MODULES = ("martingale_core", "XAUUSD")
+
+_PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+print((time.perf_counter() - start) * 1000)
+print(','.join(name for name in {heavy!r} if name in sys.modules))
+"""
+
+
+def measure(module: str, repeat: int = 5) -> Dict[str, Any]:
+    """在 repeat 个新进程中导入 module，返回导入耗时、进程耗时的中位数（毫秒）和加载的重依赖"""
+    import_ms, process_ms = [], []
+    heavy: List[str] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                                   cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True,
+                                   text=True)
+        process_ms.append((time.perf_counter() - start) * 1000)
+        if completed.returncode != 0:
+            raise RuntimeError(f"导入 {module} 失败: {completed.stderr.strip().splitlines()[-1:]}")
+        elapsed, loaded = completed.stdout.splitlines()[-2:]
+        import_ms.append(float(elapsed))
+        heavy = [name for name in loaded.split(',') if name]
+    return {"import_ms": statistics.median(import_ms), "process_ms": statistics.median(process_ms), "heavy": heavy}
+
+
+def compare(report: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    """与基线对比导入耗时，返回超出容差的模块"""
+    regressions = []
+    for module, current in report.items():
+        previous = baseline.get(module)
+        if previous and previous.get("import_ms"):
+            ratio = current["import_ms"] / previous["import_ms"]
+            if ratio > 1 + tolerance:
+                regressions.append(f"{module}: {previous['import_ms']:.1f}ms -> {current['import_ms']:.1f}ms "
+                                   f"({ratio:.2f}x)")
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """启动耗时基准测试命令行入口"""
+    parser = argparse.ArgumentParser(prog="import_bench", description="模块导入 / 进程启动耗时基准测试")
+    parser.add_argument("--modules", default=",".join(DEFAULT_MODULES), help="逗号分隔的模块名")
+    parser.add_argument("--repeat", type=int, default=5, help="每个模块的进程数")
+    parser.add_argument("--save-baseline", help="把结果保存为基线JSON")
+    parser.add_argument("--baseline", help="与基线JSON对比")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="相对基线允许的变慢比例")
+    args = parser.parse_args(argv)
+
+    modules = [name.strip() for name in args.modules.split(',') if name.strip()]
+    report = {module: measure(module, args.repeat) for module in modules}
+
+    logger.info(f"{'模块':<18} {'导入ms':>8} {'进程ms':>8}  重依赖")
+    for module, row in report.items():
+        logger.info(f"{module:<18} {row['import_ms']:>8.1f} {row['process_ms']:>8.1f}  {','.join(row['heavy']) or '-'}")
+
+    failed = False
+    for module, row in report.items():
+        if module in LIGHT_MODULES and row['heavy']:
+            logger.warning(f"{module} 导入时加载了 {','.join(row['heavy'])}")
+            failed = True
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        logger.info(f"基线已保存: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            logger.warning(f"启动耗时回退 | {line}")
+        if regressions:
+            failed = True
+        else:
+            logger.info(f"与基线对比通过（容差 {args.tolerance:.0%}）")
+
+    if failed:
+        raise SystemExit(1)
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
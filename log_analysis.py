@@ -0,0 +1,290 @@
+"""
+交易日志转换与分析
+流式解析 实盘日志.txt / trading_bot.log 中的开仓与平仓记录，按列写入 .npz（或安装 pyarrow 时写 Parquet），
+内存占用与日志长度无关；在列式数据上向量化统计各卦象胜率、持仓时间分布、连胜连亏长度和资金/回撤曲线。
+
+支持两种日志格式：
+    [2025-08-26 20:32:54,833] [SUCCESS] RandomMartingale | BUY | 开仓: 3376.214 | 止损: 2 | 止盈: 3 | 马丁倍数: 1x --( 阴阳阳阳 )--
+    2025-08-26 20:56:17,883 - INFO - 实际平仓价格: 3374.214 | 实际盈亏: -2.00 USD | 余额: $102.85
+行尾带 "| 品种: XAUUSDm | 持仓: 1000001" 时（多品种同时运行，开仓与平仓交错）按品种和持仓单号配对，
+否则开仓与其后的第一条平仓配对。
+"""
+
+import argparse
+import calendar
+import csv
+import logging
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from datetime import datetime, timezone
+from typing import Optional, Tuple, Dict, Any, Sequence, Iterable, Iterator
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 日志成交记录（sequence 与 backtest.TRADE_DTYPE 相同：K线<<3 | r1<<2 | r2<<1 | r3）
+LOG_TRADE_DTYPE = np.dtype([
+    ('open_time', '<f8'), ('close_time', '<f8'), ('direction', 'i1'), ('sequence', 'u1'),
+    ('tp_points', 'i1'), ('sl_points', 'i1'), ('multiplier', '<u2'), ('open_price', '<f8'),
+    ('close_price', '<f8'), ('pnl', '<f8'), ('balance', '<f8'),
+])
+
+_TIME_RE = re.compile(r'^\[?(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),(\d{3})')
+_POSITION = r'(?: \| 品种: (\S+) \| 持仓: (\d+))?'
+_OPEN_RE = re.compile(r'RandomMartingale \| (BUY|SELL) \| 开仓: ([\d.]+) \| 止损: (\d+) \| 止盈: (\d+) \| '
+                      r'马丁倍数: (\d+)x --\( ([阴阳]{4}) \)--' + _POSITION)
+_CLOSE_RE = re.compile(r'实际平仓价格: ([\d.]+) \| 实际盈亏: ([-+]?[\d.]+) USD \| 余额: \$([-+]?[\d.]+)' + _POSITION)
+
+
+def _parse_time(line: str) -> Optional[float]:
+    """解析行首时间（日志本地时间，按UTC换算为秒）"""
+    match = _TIME_RE.match(line)
+    if match is None:
+        return None
+    moment = datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S')
+    return calendar.timegm(moment.timetuple()) + int(match.group(2)) / 1000
+
+
+def _pack_sequence(text: str) -> int:
+    """把 阴阳阳阳 打包为 0b0111"""
+    value = 0
+    for char in text:
+        value = (value << 1) | (char == '阳')
+    return value
+
+
+def _position_key(symbol: Optional[str], ticket: Optional[str]) -> Optional[Tuple[str, int]]:
+    """开仓/平仓行的配对键：(品种, 持仓单号)，旧格式日志没有时为 None"""
+    return (symbol, int(ticket)) if symbol else None
+
+
+def parse_lines(lines: Iterable[str], chunk_size: int = 65536) -> Iterator[np.ndarray]:
+    """逐行解析，把开仓行与同一持仓的平仓行配对为一条成交记录（按平仓顺序），每满 chunk_size 条输出一块"""
+    chunk = np.zeros(chunk_size, dtype=LOG_TRADE_DTYPE)
+    count = 0
+    pending: Dict[Optional[Tuple[str, int]], tuple] = {}
+
+    for line in lines:
+        if 'RandomMartingale |' in line:
+            match = _OPEN_RE.search(line)
+            if match is None:
+                continue
+            # 未配对的开仓（如程序重启）被同一键的新开仓取代
+            direction, price, sl_points, tp_points, multiplier, sequence, symbol, ticket = match.groups()
+            pending[_position_key(symbol, ticket)] = (
+                _parse_time(line), 1 if direction == 'BUY' else -1, _pack_sequence(sequence),
+                int(tp_points), int(sl_points), int(multiplier), float(price))
+        elif '实际平仓价格' in line and pending:
+            match = _CLOSE_RE.search(line)
+            if match is None:
+                continue
+            close_price, pnl, balance, symbol, ticket = match.groups()
+            opened = pending.pop(_position_key(symbol, ticket), None)
+            if opened is None:
+                continue
+            open_time, direction, sequence, tp_points, sl_points, multiplier, open_price = opened
+            chunk[count] = (open_time, _parse_time(line), direction, sequence, tp_points, sl_points, multiplier,
+                            open_price, float(close_price), float(pnl), float(balance))
+            count += 1
+            if count == chunk_size:
+                yield chunk.copy()
+                count = 0
+
+    if count:
+        yield chunk[:count].copy()
+
+
+def read_lines(paths: Sequence[str], encoding: str = 'utf-8') -> Iterator[str]:
+    """按顺序逐行读取多个日志文件"""
+    for path in paths:
+        with open(path, 'r', encoding=encoding, errors='replace') as f:
+            yield from f
+
+
+def _write_npz(chunks: Iterable[np.ndarray], file_path: str) -> int:
+    """流式写 .npz：每列先追加到临时文件，结束后写入 npy 头并拷贝数据，内存只占一块"""
+    names = LOG_TRADE_DTYPE.names
+    rows = 0
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(file_path))) as tmp:
+        columns = {name: open(os.path.join(tmp, name), 'wb') for name in names}
+        try:
+            for chunk in chunks:
+                for name in names:
+                    columns[name].write(np.ascontiguousarray(chunk[name]).tobytes())
+                rows += len(chunk)
+        finally:
+            for f in columns.values():
+                f.close()
+
+        with zipfile.ZipFile(file_path, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for name in names:
+                header = {'descr': np.lib.format.dtype_to_descr(LOG_TRADE_DTYPE[name]),
+                          'fortran_order': False, 'shape': (rows,)}
+                with archive.open(name + '.npy', 'w', force_zip64=True) as out, \
+                        open(os.path.join(tmp, name), 'rb') as data:
+                    np.lib.format.write_array_header_1_0(out, header)
+                    shutil.copyfileobj(data, out, 1 << 20)
+    return rows
+
+
+def _write_parquet(chunks: Iterable[np.ndarray], file_path: str) -> int:
+    """流式写 Parquet，每块一个 row group（需要 pyarrow）"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("写 Parquet 需要安装 pyarrow：pip install pyarrow")
+
+    rows = 0
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.table({name: chunk[name] for name in LOG_TRADE_DTYPE.names})
+            if writer is None:
+                writer = pq.ParquetWriter(file_path, table.schema)
+            writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def convert(paths: Sequence[str], file_path: str, chunk_size: int = 65536, encoding: str = 'utf-8') -> int:
+    """把日志文件转换为列式文件（按扩展名选择 .npz 或 .parquet），返回成交记录数"""
+    chunks = parse_lines(read_lines(paths, encoding), chunk_size)
+    if file_path.endswith('.parquet'):
+        return _write_parquet(chunks, file_path)
+    return _write_npz(chunks, file_path)
+
+
+def load_trades(file_path: str) -> np.ndarray:
+    """读取列式文件为 LOG_TRADE_DTYPE 结构化数组"""
+    if file_path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        table = pq.read_table(file_path)
+        columns = {name: table.column(name).to_numpy() for name in LOG_TRADE_DTYPE.names}
+    else:
+        with np.load(file_path) as data:
+            columns = {name: data[name] for name in LOG_TRADE_DTYPE.names}
+    trades = np.zeros(len(columns['pnl']), dtype=LOG_TRADE_DTYPE)
+    for name, values in columns.items():
+        trades[name] = values
+    return trades
+
+
+def win_rate_by_sequence(trades: np.ndarray) -> np.ndarray:
+    """各卦象（16种阴阳组合）的交易次数、胜率与总盈亏，形状 (16, 3)"""
+    sequence = trades['sequence'].astype(np.intp)
+    counts = np.bincount(sequence, minlength=16)
+    wins = np.bincount(sequence, weights=trades['pnl'] > 0, minlength=16)
+    pnl = np.bincount(sequence, weights=trades['pnl'], minlength=16)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rate = np.where(counts > 0, wins / counts, np.nan)
+    return np.column_stack((counts, rate, pnl))
+
+
+def streak_lengths(pnl: np.ndarray, losing: bool = True) -> np.ndarray:
+    """所有连续亏损（或盈利）段的长度"""
+    flags = pnl < 0 if losing else pnl > 0
+    edges = np.diff(np.concatenate(([False], flags, [False])).astype(np.int8))
+    return np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+
+
+def equity_curve(trades: np.ndarray) -> np.ndarray:
+    """资金曲线与回撤：列为 (平仓时间, 余额, 回撤金额, 回撤比例)"""
+    balance = trades['balance']
+    peak = np.maximum.accumulate(balance) if len(balance) else balance
+    drawdown = peak - balance
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = np.where(peak > 0, drawdown / peak, 0.0)
+    return np.column_stack((trades['close_time'], balance, drawdown, ratio))
+
+
+def analyze(trades: np.ndarray) -> Dict[str, Any]:
+    """汇总统计"""
+    pnl = trades['pnl']
+    hold_minutes = (trades['close_time'] - trades['open_time']) / 60
+    losses = streak_lengths(pnl, losing=True)
+    wins = streak_lengths(pnl, losing=False)
+    curve = equity_curve(trades)
+    worst = int(np.argmax(curve[:, 2])) if len(curve) else 0
+    return {
+        "trades": int(len(trades)),
+        "win_rate": float(np.mean(pnl > 0)) if len(pnl) else 0.0,
+        "total_pnl": float(pnl.sum()),
+        "final_balance": float(trades['balance'][-1]) if len(trades) else 0.0,
+        "max_drawdown": float(curve[worst, 2]) if len(curve) else 0.0,
+        "max_drawdown_pct": float(curve[worst, 3]) if len(curve) else 0.0,
+        "hold_minutes_percentiles": dict(zip(("p50", "p90", "p99", "max"),
+                                             (np.percentile(hold_minutes, [50, 90, 99, 100]).tolist()
+                                              if len(hold_minutes) else [0.0] * 4))),
+        "loss_streaks": np.bincount(losses).tolist() if len(losses) else [],
+        "win_streaks": np.bincount(wins).tolist() if len(wins) else [],
+        "max_multiplier": int(trades['multiplier'].max()) if len(trades) else 0,
+    }
+
+
+def _sequence_name(value: int) -> str:
+    return ''.join('阳' if (value >> shift) & 1 else '阴' for shift in (3, 2, 1, 0))
+
+
+def save_curve(trades: np.ndarray, file_path: str):
+    """保存资金/回撤曲线为CSV"""
+    with open(file_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(('close_time', 'balance', 'drawdown', 'drawdown_pct'))
+        for close_time, balance, drawdown, ratio in equity_curve(trades):
+            moment = datetime.fromtimestamp(close_time, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+            writer.writerow((moment, f"{balance:.2f}", f"{drawdown:.2f}", f"{ratio:.4f}"))
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """日志转换与分析命令行入口"""
+    parser = argparse.ArgumentParser(prog="log_analysis", description="交易日志转换为列式文件并统计")
+    parser.add_argument("logs", nargs="*", help="日志文件，按时间顺序（如 实盘日志.txt trading_bot.log）")
+    parser.add_argument("--out", help="列式输出路径（.npz 或 .parquet）")
+    parser.add_argument("--trades", help="直接分析已转换的列式文件")
+    parser.add_argument("--encoding", default="utf-8", help="日志编码")
+    parser.add_argument("--curve-out", help="资金/回撤曲线CSV输出路径")
+    args = parser.parse_args(argv)
+
+    if args.logs:
+        out = args.out or "trades_log.npz"
+        rows = convert(args.logs, out, encoding=args.encoding)
+        logger.info(f"日志转换完成 | 文件数: {len(args.logs)} | 成交记录: {rows} | 输出: {out}")
+        trades = load_trades(out)
+    elif args.trades:
+        trades = load_trades(args.trades)
+    else:
+        parser.error("需要日志文件或 --trades")
+
+    summary = analyze(trades)
+    logger.info(f"交易次数: {summary['trades']} | 胜率: {summary['win_rate']:.1%} | "
+                f"总盈亏: {summary['total_pnl']:.2f} USD | 最终余额: ${summary['final_balance']:.2f} | "
+                f"最大回撤: ${summary['max_drawdown']:.2f} ({summary['max_drawdown_pct']:.1%}) | "
+                f"最大马丁倍数: {summary['max_multiplier']}x")
+    hold = summary['hold_minutes_percentiles']
+    logger.info(f"持仓分钟 | p50: {hold['p50']:.1f} | p90: {hold['p90']:.1f} | p99: {hold['p99']:.1f} | "
+                f"最大: {hold['max']:.1f}")
+    logger.info(f"连亏长度分布(长度:次数): "
+                f"{', '.join(f'{n}:{c}' for n, c in enumerate(summary['loss_streaks']) if c)}")
+    logger.info(f"连胜长度分布(长度:次数): "
+                f"{', '.join(f'{n}:{c}' for n, c in enumerate(summary['win_streaks']) if c)}")
+    for value, (count, rate, pnl) in enumerate(win_rate_by_sequence(trades)):
+        if count:
+            logger.info(f"{_sequence_name(value)} | 次数: {int(count):>4} | 胜率: {rate:>6.1%} | 盈亏: {pnl:>9.2f}")
+
+    if args.curve_out:
+        save_curve(trades, args.curve_out)
+        logger.info(f"资金曲线已保存: {args.curve_out}")
+    return summary
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,197 @@
+"""
+异步日志管线
+交易线程里的 logger 调用只把 LogRecord 放进内存队列（不格式化、不写文件），后台线程批量取出后
+格式化为原有的文本格式写入 trading_bot.log 和控制台，带交易事件的记录另写一份 JSON lines
+（trading_events.jsonl），按大小轮转，每批写完或按间隔统一 flush，错误日志立即落盘。
+
+结构化交易事件通过 extra={"event": {...}} 附带在日志记录上，字段如：
+    type(open/close) symbol ticket direction price sl tp lot multiplier sequence pnl balance
+JSON 行为 {"time", "level", "thread", "message", **event}，没有 event 的普通日志只写文本日志。
+
+用法：
+    pipeline = log_pipeline.setup('trading_bot.log', 'trading_events.jsonl')
+    logger.info("开仓 %.3f", price, extra={"event": {"type": "open", "price": price}})
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler
+from typing import Optional, TextIO
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# 停止日志线程的哨兵
+_STOP = object()
+
+
+class RotatingLogFile:
+    """按大小轮转的文本文件，写入时不 flush，由日志线程按批调用 flush"""
+
+    def __init__(self, file_path: str, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5):
+        self.file_path = file_path
+        self.max_bytes = max_bytes      # 0 表示不轮转
+        self.backup_count = backup_count
+        self._file: Optional[TextIO] = None
+        self._size = 0
+
+    def _open(self):
+        self._file = open(self.file_path, 'a', encoding='utf-8')
+        self._size = self._file.tell()
+
+    def write(self, text: str):
+        if self._file is None:
+            self._open()
+        size = len(text.encode('utf-8'))
+        if self.max_bytes and self._size and self._size + size > self.max_bytes:
+            self.rotate()
+        self._file.write(text)
+        self._size += size
+
+    def rotate(self):
+        """file -> file.1 -> file.2 ...，超过 backup_count 的最旧文件被删除"""
+        self.close()
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = f"{self.file_path}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.file_path}.{index + 1}")
+            if os.path.exists(self.file_path):
+                os.replace(self.file_path, f"{self.file_path}.1")
+        else:
+            os.remove(self.file_path)
+        self._open()
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class _EnqueueHandler(QueueHandler):
+    """只入队不格式化：队列在进程内，记录不需要序列化，格式化留给日志线程"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class LogPipeline:
+    """后台日志线程：批量格式化并写入文本日志、JSON lines 和控制台"""
+
+    def __init__(self, log_file: Optional[str] = 'trading_bot.log',
+                 events_file: Optional[str] = 'trading_events.jsonl', console: Optional[TextIO] = sys.stderr,
+                 max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5, flush_interval: float = 1.0,
+                 batch_size: int = 256):
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.formatter = logging.Formatter(LOG_FORMAT)
+        self.log_file = RotatingLogFile(log_file, max_bytes, backup_count) if log_file else None
+        self.events_file = RotatingLogFile(events_file, max_bytes, backup_count) if events_file else None
+        self.console = console
+        self.flush_interval = flush_interval   # 最长多久 flush 一次
+        self.batch_size = batch_size           # 每批最多处理的记录数
+        self.written = 0
+        self._thread = threading.Thread(target=self._serve, name="log-writer", daemon=True)
+        self._stopped = threading.Event()
+
+    def handler(self) -> logging.Handler:
+        """挂到 logger 上的入队处理器"""
+        return _EnqueueHandler(self.queue)
+
+    def start(self) -> 'LogPipeline':
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        """写完队列中剩余的记录后关闭文件"""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        if self._thread.is_alive():
+            self.queue.put(_STOP)
+            self._thread.join(timeout)
+        self._close()
+
+    def _serve(self):
+        last_flush = time.monotonic()
+        dirty = False
+        while True:
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if dirty:
+                    self._flush()
+                    dirty = False
+                last_flush = time.monotonic()
+                continue
+
+            batch = [record]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            urgent = False
+            for record in batch:
+                if record is _STOP:
+                    self._flush()
+                    return
+                try:
+                    self._write(record)
+                except Exception as e:
+                    # 单条记录格式化或写入失败不影响日志线程
+                    sys.stderr.write(f"日志写入失败: {e} | {record.msg!r}\n")
+                urgent = urgent or record.levelno >= logging.ERROR
+            dirty = True
+
+            # 错误日志立即落盘，其余按间隔批量 flush
+            if urgent or (self.queue.empty() and time.monotonic() - last_flush >= self.flush_interval):
+                self._flush()
+                dirty = False
+                last_flush = time.monotonic()
+
+    def _write(self, record: logging.LogRecord):
+        line = self.formatter.format(record) + '\n'
+        if self.log_file is not None:
+            self.log_file.write(line)
+        if self.console is not None:
+            self.console.write(line)
+        event = getattr(record, 'event', None)
+        if self.events_file is not None and event is not None:
+            entry = {"time": round(record.created, 3), "level": record.levelname, "thread": record.threadName,
+                     "message": record.message, **event}
+            self.events_file.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+        self.written += 1
+
+    def _flush(self):
+        for target in (self.log_file, self.events_file, self.console):
+            if target is not None:
+                target.flush()
+
+    def _close(self):
+        self._flush()
+        for target in (self.log_file, self.events_file):
+            if target is not None:
+                target.close()
+
+
+def setup(log_file: Optional[str] = 'trading_bot.log', events_file: Optional[str] = 'trading_events.jsonl',
+          level: int = logging.INFO, **options) -> LogPipeline:
+    """启动日志线程并替换根 logger 的处理器，进程退出时写完剩余日志"""
+    pipeline = LogPipeline(log_file, events_file, **options).start()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(pipeline.handler())
+    root.setLevel(level)
+    atexit.register(pipeline.stop)
+    return pipeline
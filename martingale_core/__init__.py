@@ -0,0 +1,9 @@
+"""
+RandomMartingale 策略核心
+配置、种子、随机数序列与策略映射、马丁格尔手数和决策调度，只依赖标准库。
+导入时不连接终端、不配置日志、不创建文件，实盘机器人（XAUUSD.py）和回测、扫描等离线工具共用。
+"""
+
+from martingale_core.config import TradingConfig, MT5Config, ConfigSnapshot, ConfigManager, SeedManager
+from martingale_core.scheduler import Clock, DecisionScheduler
+from martingale_core.strategy import OrderType, TradeResult, TradeStrategy, StrategyCalculator, MartingaleManager
@@ -0,0 +1,265 @@
+"""
+交易配置
+config.json 的加载、补全、热更新检测与不可变配置快照，以及从配置读取的随机数种子。
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, asdict, fields
+from typing import Optional, Tuple, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class TradingConfig:
+    """交易配置（不可变快照，配置更新时整体替换）"""
+    symbol: str = "XAUUSDm"
+    base_lot_size: float = 0.01
+    max_martingale_multiplier: int = 8
+    cooling_time: int = 64
+    check_interval: int = 5
+    magic_number: int = 234000
+    deviation: int = 20
+    seed: int = 1006111951111
+    decision_offset: float = 1.0  # 在M1K线开盘后多少秒决策（读取阴阳）
+    strategy_point: float = 1.0  # 策略止损/止盈1个点对应的价格距离
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TradingConfig':
+        """按字段类型转换并校验，配置无效时抛出 ValueError"""
+        types = {f.name: f.type for f in fields(cls)}
+        unknown = set(data) - set(types)
+        if unknown:
+            raise ValueError(f"未知的交易配置字段: {', '.join(sorted(unknown))}")
+        try:
+            config = cls(**{name: types[name](value) for name, value in data.items()})
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"交易配置类型错误: {e}") from e
+        if config.base_lot_size <= 0 or config.max_martingale_multiplier < 1:
+            raise ValueError("base_lot_size 必须大于0，max_martingale_multiplier 至少为1")
+        if config.cooling_time < 0 or config.check_interval <= 0 or config.strategy_point <= 0:
+            raise ValueError("cooling_time 不能为负，check_interval 和 strategy_point 必须大于0")
+        return config
+
+
+@dataclass
+class MT5Config:
+    """MT5连接配置"""
+    login: int
+    server: str
+    password: str
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'MT5Config':
+        return cls(**data)
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """一次发布的全部配置，发布新配置时整体替换，读者拿到的各部分总是同一版本"""
+    config: Dict[str, Any]
+    trading: TradingConfig
+    strategies: Tuple[TradingConfig, ...]
+    mt5: MT5Config
+    version: int
+    
+    def trading_config(self, strategy: Optional[int] = None) -> TradingConfig:
+        """交易配置，指定 strategy 时返回 strategies 中对应策略的配置"""
+        return self.trading if strategy is None else self.strategies[strategy]
+
+
+class ConfigManager:
+    """配置管理器 - 按 (mtime_ns, size, inode) 检测变化，只在文件真正改变时解析并发布新的配置快照"""
+    
+    DEFAULT_CONFIG = {
+        "mt5": {
+            "login": 0,
+            "server": "",
+            "password": ""
+        },
+        "trading": {
+            "symbol": "XAUUSDm",
+            "base_lot_size": 0.01,
+            "max_martingale_multiplier": 8,
+            "cooling_time": 64,
+            "magic_number": 234000,
+            "deviation": 20,
+            "seed": 1006111951111
+        }
+    }
+    
+    def __init__(self, config_file: str = "config.json", min_check_interval: float = 1.0):
+        self.config_file = config_file
+        self.min_check_interval = min_check_interval
+        self.snapshot: Optional[ConfigSnapshot] = None  # 当前配置快照，只整体替换
+        self._lock = threading.Lock()  # 多品种引擎中各策略线程共用同一个配置管理器
+        self._last_check = time.monotonic()
+        self._file_key = None
+        self._publish(self._load_config())
+        self._file_key = self._stat_key()
+    
+    def _stat_key(self) -> Optional[Tuple[int, int, int]]:
+        """文件身份与版本：修改时间(纳秒)、大小、inode，文件不存在时为 None"""
+        try:
+            stat = os.stat(self.config_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+    
+    def _merge_defaults(self, config: Dict[str, Any]) -> bool:
+        """在内存中补全缺失字段，返回是否有补全"""
+        updated = False
+        for section, default_values in self.DEFAULT_CONFIG.items():
+            if section not in config:
+                config[section] = dict(default_values)
+                updated = True
+            else:
+                for key, value in default_values.items():
+                    if key not in config[section]:
+                        config[section][key] = value
+                        updated = True
+        return updated
+    
+    def _load_config(self) -> Dict[str, Any]:
+        """启动时加载配置文件，缺失时创建、字段不全时补全写回"""
+        default_config = json.loads(json.dumps(self.DEFAULT_CONFIG))
+        
+        if not os.path.exists(self.config_file):
+            with open(self.config_file, 'w', encoding='utf-8') as f:
+                json.dump(default_config, f, indent=2, ensure_ascii=False)
+            logger.info(f"创建默认配置文件: {self.config_file}")
+            return default_config
+        
+        try:
+            with open(self.config_file, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+                
+            # 确保配置完整性，添加缺失的字段
+            if self._merge_defaults(config):
+                with open(self.config_file, 'w', encoding='utf-8') as f:
+                    json.dump(config, f, indent=2, ensure_ascii=False)
+                logger.info("配置文件已更新，添加了缺失的字段")
+                
+            return config
+        except Exception as e:
+            logger.error(f"加载配置文件失败: {e}")
+            return default_config
+    
+    @property
+    def config(self) -> Dict[str, Any]:
+        """当前配置字典（只读）"""
+        return self.snapshot.config
+    
+    @property
+    def version(self) -> int:
+        """每发布一次新配置加1，供各组件判断是否需要刷新"""
+        return self.snapshot.version if self.snapshot is not None else 0
+    
+    def _publish(self, config: Dict[str, Any]):
+        """校验后构建新快照并一次赋值发布，校验失败时抛出 ValueError
+        
+        可选的 "strategies" 列表中每一项覆盖 "trading" 的部分字段，构成多品种引擎的一个策略。
+        """
+        current = self.snapshot
+        trading = config.get("trading", {})
+        trading_config = TradingConfig.from_dict(trading)
+        strategy_configs = tuple(TradingConfig.from_dict({**trading, **overrides})
+                                 for overrides in config.get("strategies", []))
+        if current is not None and len(strategy_configs) != len(current.strategies):
+            raise ValueError("运行中不能增减 strategies，请重启程序")
+        mt5_config = MT5Config.from_dict(config.get("mt5", {}))
+        self.snapshot = ConfigSnapshot(config, trading_config, strategy_configs, mt5_config,
+                                       current.version + 1 if current is not None else 1)
+    
+    def check_for_updates(self) -> bool:
+        """检查配置文件是否有更新：间隔内直接返回，文件未变不解析，运行中不回写文件"""
+        with self._lock:
+            return self._check_for_updates()
+    
+    def _check_for_updates(self) -> bool:
+        now = time.monotonic()
+        if now - self._last_check < self.min_check_interval:
+            return False
+        self._last_check = now
+        
+        file_key = self._stat_key()
+        if file_key is None or file_key == self._file_key:
+            return False
+        self._file_key = file_key
+        
+        try:
+            with open(self.config_file, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+            self._merge_defaults(config)
+            if config == self.config:
+                return False
+            self._publish(config)
+        except Exception as e:
+            logger.error(f"配置文件无效，继续使用当前配置: {e}")
+            return False
+        return True
+    
+    def get_mt5_config(self) -> MT5Config:
+        """获取MT5配置"""
+        return self.snapshot.mt5
+    
+    def get_trading_config(self, strategy: Optional[int] = None) -> TradingConfig:
+        """获取交易配置快照，指定 strategy 时返回 strategies 中对应策略的配置"""
+        return self.snapshot.trading_config(strategy)
+    
+    @property
+    def strategy_count(self) -> int:
+        """strategies 中配置的策略数量"""
+        return len(self.snapshot.strategies)
+    
+    def update_trading_config(self, updates: Dict[str, Any]) -> bool:
+        """更新交易配置"""
+        try:
+            with self._lock:
+                config = json.loads(json.dumps(self.config))
+                config["trading"].update(updates)
+                self._publish(config)
+                
+                with open(self.config_file, 'w', encoding='utf-8') as f:
+                    json.dump(self.config, f, indent=2, ensure_ascii=False)
+                    
+                self._file_key = self._stat_key()
+            logger.info("交易配置已更新")
+            return True
+        except Exception as e:
+            logger.error(f"更新交易配置失败: {e}")
+            return False
+
+
+class SeedManager:
+    """种子管理器 - 简化版本，从配置管理器获取种子"""
+    
+    def __init__(self, config_manager: ConfigManager, strategy: Optional[int] = None):
+        self.config_manager = config_manager
+        self.strategy = strategy
+        snapshot = self.config_manager.snapshot
+        self.current_seed = snapshot.trading_config(strategy).seed
+        self._version = snapshot.version
+    
+    def get_seed(self) -> int:
+        """获取当前种子，如果配置有更新则重新加载"""
+        self.config_manager.check_for_updates()
+        snapshot = self.config_manager.snapshot  # 版本号和种子取自同一快照
+        if self._version != snapshot.version:
+            self._version = snapshot.version
+            new_seed = snapshot.trading_config(self.strategy).seed
+            if new_seed != self.current_seed:
+                self.current_seed = new_seed
+                logger.info(f"种子配置已更新: {self.current_seed}")
+        
+        return self.current_seed
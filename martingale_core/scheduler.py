@@ -0,0 +1,69 @@
+"""
+决策调度
+系统时钟与按K线边界计划决策时刻的调度器。
+"""
+
+import time
+from datetime import datetime
+from typing import Optional
+
+
+class Clock:
+    """系统时钟，模拟运行时可替换为模拟时钟"""
+    
+    def time(self) -> float:
+        return time.time()
+    
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+    
+    def now(self) -> datetime:
+        return datetime.now()
+
+
+class DecisionScheduler:
+    """决策调度器 - 把下一次决策计划在K线开盘后的固定时刻或冷却截止时刻，醒来时统计偏差
+    
+    K线边界按本地时钟取整计算（服务器时区为整小时偏移，不影响分钟边界），本地时钟需保持校时。
+    metrics 为提供 record(name, value) 的统计对象（如 XAUUSD.TradeMetrics），不提供时不统计偏差。
+    """
+    
+    def __init__(self, clock: Optional[Clock] = None, metrics=None,
+                 bar_seconds: int = 60, offset: float = 1.0):
+        self.clock = clock or Clock()
+        self.metrics = metrics
+        self.bar_seconds = bar_seconds
+        self.offset = offset  # 在K线开盘后多少秒读取阴阳
+        self.target: Optional[float] = None
+    
+    @staticmethod
+    def next_bar_time(after: float, bar_seconds: int = 60, offset: float = 0.0) -> float:
+        """不早于 after 的第一个 K线开盘+offset 时刻"""
+        bars = -((offset - after) // bar_seconds)
+        return bars * bar_seconds + offset
+    
+    def plan_next_bar(self) -> float:
+        """计划在下一根K线的决策时刻醒来（严格晚于当前时刻）"""
+        now = self.clock.time()
+        target = self.next_bar_time(now, self.bar_seconds, self.offset)
+        if target <= now:
+            target += self.bar_seconds
+        self.target = target
+        return self.target
+    
+    def plan(self, deadline: float) -> float:
+        """计划在指定时刻（如冷却截止）醒来"""
+        self.target = deadline
+        return self.target
+    
+    def wait(self):
+        """睡到计划时刻（未计划时等到下一根K线），记录醒来偏差（毫秒）"""
+        target = self.target if self.target is not None else self.plan_next_bar()
+        self.target = None
+        remaining = target - self.clock.time()
+        # 被信号打断等提前醒来时补足剩余时间（忽略1毫秒以内的误差）
+        while remaining > 0.001:
+            self.clock.sleep(remaining)
+            remaining = target - self.clock.time()
+        if self.metrics is not None:
+            self.metrics.record("scheduler_drift", (self.clock.time() - target) * 1000)
@@ -0,0 +1,159 @@
+"""
+策略计算
+随机数序列、K线形态与4位序列到止盈/止损的映射、马丁格尔手数管理。
+"""
+
+import logging
+import random
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class OrderType(Enum):
+    """订单类型枚举（取值与 mt5.ORDER_TYPE_BUY / mt5.ORDER_TYPE_SELL 相同）"""
+    BUY = 0
+    SELL = 1
+
+
+class TradeResult(Enum):
+    """交易结果枚举"""
+    PROFIT = "profit"
+    LOSS = "loss"
+    BREAK_EVEN = "break_even"
+
+    @classmethod
+    def from_pnl(cls, pnl: float) -> 'TradeResult':
+        """根据盈亏金额判断交易结果"""
+        if pnl > 0:
+            return cls.PROFIT
+        elif pnl < 0:
+            return cls.LOSS
+        return cls.BREAK_EVEN
+
+
+@dataclass
+class TradeStrategy:
+    """交易策略"""
+    tp_points: int
+    sl_points: int
+
+
+class StrategyCalculator:
+    """策略计算器"""
+    
+    # 策略映射表：(K线形态, 随机数1, 随机数2, 随机数3) -> (TP点数, SL点数)
+    STRATEGY_MAP = {
+        (1, 1, 1, 1): TradeStrategy(4, 1),  # 阳阳阳阳
+        (1, 1, 1, 0): TradeStrategy(3, 2),  # 阳阳阳阴
+        (1, 1, 0, 1): TradeStrategy(2, 3),  # 阳阳阴阳
+        (1, 1, 0, 0): TradeStrategy(3, 2),  # 阳阳阴阴
+        (1, 0, 1, 1): TradeStrategy(2, 3),  # 阳阴阳阳
+        (1, 0, 1, 0): TradeStrategy(1, 4),  # 阳阴阳阴
+        (1, 0, 0, 1): TradeStrategy(2, 3),  # 阳阴阴阳
+        (1, 0, 0, 0): TradeStrategy(3, 2),  # 阳阴阴阴
+        (0, 1, 1, 1): TradeStrategy(3, 2),  # 阴阳阳阳
+        (0, 1, 1, 0): TradeStrategy(2, 3),  # 阴阳阳阴
+        (0, 1, 0, 1): TradeStrategy(1, 4),  # 阴阳阴阳
+        (0, 1, 0, 0): TradeStrategy(2, 3),  # 阴阳阴阴
+        (0, 0, 1, 1): TradeStrategy(3, 2),  # 阴阴阳阳
+        (0, 0, 1, 0): TradeStrategy(2, 3),  # 阴阴阳阴
+        (0, 0, 0, 1): TradeStrategy(3, 2),  # 阴阴阴阳
+        (0, 0, 0, 0): TradeStrategy(4, 1),  # 阴阴阴阴
+    }
+    
+    @staticmethod
+    def candle_pattern(rates) -> Optional[int]:
+        """K线的阴阳形态（rates 为 copy_rates_* 格式，取第一根），没有K线时返回 None"""
+        if rates is None or len(rates) == 0:
+            return None
+        
+        latest_candle = rates[0]
+        open_price = latest_candle['open']
+        close_price = latest_candle['close']
+        
+        return 1 if close_price > open_price else 0
+    
+    @staticmethod
+    def generate_random_sequence(seed: int) -> Tuple[int, int, int]:
+        """基于种子和当前时间戳生成3个随机数"""
+        return StrategyCalculator.random_sequence_at(seed, int(time.time()))
+    
+    @staticmethod
+    def random_sequence_at(seed: int, timestamp: int) -> Tuple[int, int, int]:
+        """基于种子和指定时间戳（秒）生成3个随机数，与实盘结果一致"""
+        rng = random.Random(seed + timestamp)
+        
+        return (
+            rng.randint(0, 1),
+            rng.randint(0, 1),
+            rng.randint(0, 1)
+        )
+    
+    @classmethod
+    def get_trade_strategy(cls, candle_pattern: int, r1: int, r2: int, r3: int) -> Tuple[OrderType, TradeStrategy]:
+        """根据4位序列获取交易策略"""
+        sequence = (candle_pattern, r1, r2, r3)
+        strategy = cls.STRATEGY_MAP.get(sequence, TradeStrategy(2, 2))
+        
+        # 判断开仓方向：随机数中阳的数量大于阴就开多，否则开空
+        yang_count = sum([r1, r2, r3])
+        order_type = OrderType.BUY if yang_count > 1 else OrderType.SELL
+        
+        return order_type, strategy
+
+
+class MartingaleManager:
+    """马丁格尔管理器"""
+    
+    def __init__(self, base_lot_size: float, max_multiplier: int = 8):
+        self.base_lot_size = base_lot_size
+        self.max_multiplier = max_multiplier
+        self.cumulative_loss = 0.0
+    
+    def next_lot_size(self, current_lot_size: float, result: TradeResult, pnl: float) -> float:
+        """更新累计亏损并返回下一次交易的手数（不输出日志，供回测复用）"""
+        max_lot_size = self.base_lot_size * self.max_multiplier
+        
+        if result == TradeResult.PROFIT:
+            # 更新累计亏损：减去本次盈利
+            self.cumulative_loss = max(0, self.cumulative_loss - abs(pnl))
+            
+            if self.cumulative_loss > 0:
+                # 还有未回本的亏损，马丁倍数减半
+                return max(self.base_lot_size, current_lot_size / 2)
+            # 已回本，重置为基础手数
+            return self.base_lot_size
+        
+        if result == TradeResult.LOSS:
+            # 累计亏损增加
+            self.cumulative_loss += abs(pnl)
+            # 亏损后倍增手数，但不超过最大手数
+            return min(max_lot_size, current_lot_size * 2)
+        
+        # 平手时保持当前手数
+        return current_lot_size
+    
+    def calculate_next_lot_size(self, current_lot_size: float, result: TradeResult, pnl: float) -> float:
+        """计算下一次交易的手数"""
+        new_lot_size = self.next_lot_size(current_lot_size, result, pnl)
+        multiplier = new_lot_size / self.base_lot_size
+        
+        # 参数延迟格式化，使用异步日志管线时交易线程只入队
+        if result == TradeResult.PROFIT:
+            if self.cumulative_loss > 0:
+                logger.info("盈利 +%.2f USD | 累计亏损: -%.2f USD | 未回本，马丁减半: %.0fx",
+                            abs(pnl), self.cumulative_loss, multiplier)
+            else:
+                logger.info("盈利 +%.2f USD | 已回本 | 马丁重置: 1x", abs(pnl))
+        elif result == TradeResult.LOSS:
+            logger.error("亏损 %.2f USD | 累计亏损: -%.2f USD | 下一次马丁倍数: %.0fx",
+                         pnl, self.cumulative_loss, multiplier)
+        else:  # BREAK_EVEN
+            logger.info("平手 %.2f USD | 累计亏损: -%.2f USD | 下一次马丁倍数: %.0fx",
+                        pnl, self.cumulative_loss, multiplier)
+        
+        return new_lot_size
@@ -0,0 +1,691 @@
+"""
+MetaTrader5 本地模拟终端
+提供与 MetaTrader5 模块同名的常量和函数，行情来自录制的tick或M1K线，
+按止损/止盈撮合持仓，时间由可注入的模拟时钟驱动，可在Linux上加速运行 TradingBot。
+
+用法：
+    import mt5_sim
+    mt5_sim.install(terminal)      # 必须在 import XAUUSD 之前
+    import XAUUSD
+"""
+
+import argparse
+import calendar
+import itertools
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+from typing import Optional, Tuple, Dict, Any, List, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# ---- 常量（取值与 MetaTrader5 一致） ----
+TIMEFRAME_M1 = 1
+TIMEFRAME_M5 = 5
+TIMEFRAME_M15 = 15
+TIMEFRAME_M30 = 30
+TIMEFRAME_H1 = 16385
+TIMEFRAME_H4 = 16388
+TIMEFRAME_D1 = 16408
+
+ORDER_TYPE_BUY = 0
+ORDER_TYPE_SELL = 1
+ORDER_TIME_GTC = 0
+ORDER_FILLING_FOK = 0
+ORDER_FILLING_IOC = 1
+ORDER_FILLING_RETURN = 2
+ORDER_STATE_FILLED = 4
+
+POSITION_TYPE_BUY = 0
+POSITION_TYPE_SELL = 1
+
+TRADE_ACTION_DEAL = 1
+
+DEAL_TYPE_BUY = 0
+DEAL_TYPE_SELL = 1
+DEAL_ENTRY_IN = 0
+DEAL_ENTRY_OUT = 1
+DEAL_REASON_CLIENT = 0
+DEAL_REASON_EXPERT = 3
+DEAL_REASON_SL = 4
+DEAL_REASON_TP = 5
+
+SYMBOL_FILLING_FOK = 1
+SYMBOL_FILLING_IOC = 2
+
+COPY_TICKS_ALL = -1
+COPY_TICKS_INFO = 1
+COPY_TICKS_TRADE = 2
+
+TRADE_RETCODE_REQUOTE = 10004
+TRADE_RETCODE_REJECT = 10006
+TRADE_RETCODE_DONE = 10009
+TRADE_RETCODE_TIMEOUT = 10012
+TRADE_RETCODE_INVALID = 10013
+TRADE_RETCODE_INVALID_VOLUME = 10014
+TRADE_RETCODE_INVALID_PRICE = 10015
+TRADE_RETCODE_INVALID_STOPS = 10016
+TRADE_RETCODE_MARKET_CLOSED = 10018
+TRADE_RETCODE_NO_MONEY = 10019
+TRADE_RETCODE_PRICE_CHANGED = 10020
+TRADE_RETCODE_PRICE_OFF = 10021
+TRADE_RETCODE_INVALID_FILL = 10030
+
+RES_S_OK = 1
+RES_E_FAIL = -1
+RES_E_NOT_FOUND = -4
+
+_TIMEFRAME_SECONDS = {
+    TIMEFRAME_M1: 60, TIMEFRAME_M5: 300, TIMEFRAME_M15: 900, TIMEFRAME_M30: 1800,
+    TIMEFRAME_H1: 3600, TIMEFRAME_H4: 14400, TIMEFRAME_D1: 86400,
+}
+
+# ---- 返回结构（字段为 MetaTrader5 同名结构的常用子集） ----
+Tick = namedtuple('Tick', 'time bid ask last volume time_msc flags volume_real')
+AccountInfo = namedtuple('AccountInfo', 'login server name company currency leverage balance equity profit margin margin_free')
+SymbolInfo = namedtuple('SymbolInfo', 'name point digits spread bid ask trade_contract_size trade_tick_value '
+                                      'trade_tick_size volume_min volume_max volume_step trade_stops_level filling_mode')
+TradePosition = namedtuple('TradePosition', 'ticket time time_msc type magic identifier volume price_open sl tp '
+                                            'price_current profit symbol comment')
+TradeOrder = namedtuple('TradeOrder', 'ticket time_setup time_setup_msc time_done time_done_msc type type_filling '
+                                      'state magic position_id volume_initial volume_current price_open sl tp '
+                                      'price_current symbol comment')
+TradeDeal = namedtuple('TradeDeal', 'ticket order time time_msc type entry magic position_id reason volume price '
+                                    'commission swap profit fee symbol comment')
+OrderSendResult = namedtuple('OrderSendResult', 'retcode deal order volume price bid ask comment request_id '
+                                                'retcode_external request')
+
+RATES_DTYPE = np.dtype([
+    ('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'),
+    ('close', '<f8'), ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8'),
+])
+
+TICKS_DTYPE = np.dtype([
+    ('time', '<i8'), ('bid', '<f8'), ('ask', '<f8'), ('last', '<f8'), ('volume', '<u8'),
+    ('time_msc', '<i8'), ('flags', '<u4'), ('volume_real', '<f8'),
+])
+
+
+class SimulationFinished(BaseException):
+    """模拟时间超过行情数据范围
+
+    继承 BaseException，使其穿过交易循环中的 except Exception 直接结束运行。
+    """
+
+
+class SimulatedClock:
+    """模拟时钟：sleep 立即推进时间，接口与 XAUUSD.Clock 一致"""
+
+    def __init__(self, start: float = 0.0, end: Optional[float] = None):
+        self.reset(start, end)
+
+    def reset(self, start: float, end: Optional[float] = None):
+        """设置模拟起止时间"""
+        self._now = float(start)
+        self.end = end
+
+    def time(self) -> float:
+        return self._now
+
+    def sleep(self, seconds: float):
+        self.advance(seconds)
+
+    def now(self) -> datetime:
+        return _to_datetime(self._now)
+
+    def advance(self, seconds: float):
+        """推进模拟时间，超过结束时间时抛出 SimulationFinished"""
+        self._now += max(0.0, seconds)
+        if self.end is not None and self._now > self.end:
+            raise SimulationFinished(f"模拟结束: {_to_datetime(self.end)}")
+
+
+class SimulatedTerminal:
+    """基于录制tick的模拟交易终端，单品种、对冲账户"""
+
+    def __init__(self, symbol: str, ticks: np.ndarray, clock: SimulatedClock, balance: float = 100.0,
+                 point: float = 0.001, digits: int = 3, contract_size: float = 100.0,
+                 volume_min: float = 0.01, volume_max: float = 200.0, volume_step: float = 0.01,
+                 stops_level: int = 0, fill_at_level: bool = False,
+                 login: int = 1, server: str = "Simulator"):
+        from backtest import PricePath
+
+        self.symbol = symbol
+        self.clock = clock
+        self.balance = balance
+        self.point = point
+        self.digits = digits
+        self.contract_size = contract_size
+        self.volume_min = volume_min
+        self.volume_max = volume_max
+        self.volume_step = volume_step
+        self.stops_level = stops_level
+        self.fill_at_level = fill_at_level
+        self.login = login
+        self.server = server
+
+        self.time_msc = np.ascontiguousarray(ticks['time_msc'], dtype=np.int64)
+        self.bid = np.ascontiguousarray(ticks['bid'], dtype=np.float64)
+        self.ask = np.ascontiguousarray(ticks['ask'], dtype=np.float64)
+        self.path = PricePath.from_ticks(ticks)
+
+        self.positions: Dict[int, Dict[str, Any]] = {}
+        self.orders: List[TradeOrder] = []
+        self.deals: List[TradeDeal] = []
+        self._tickets = itertools.count(1000001)
+        self._bars: Dict[int, Dict[str, np.ndarray]] = {}
+        self._error = (RES_S_OK, "Success")
+
+    @classmethod
+    def from_bars(cls, symbol: str, bars: np.ndarray, clock: SimulatedClock, point: float = 0.001,
+                  **kwargs) -> 'SimulatedTerminal':
+        """从M1K线构建：每根K线展开为 开-低-高-收（阴线为 开-高-低-收）四个tick，止损止盈按价位成交"""
+        kwargs.setdefault('fill_at_level', True)
+        return cls(symbol, ticks_from_bars(bars, point), clock, point=point, **kwargs)
+
+    @property
+    def first_time(self) -> float:
+        return self.time_msc[0] / 1000.0
+
+    @property
+    def last_time(self) -> float:
+        return self.time_msc[-1] / 1000.0
+
+    # ---- 行情 ----
+    def _current_index(self) -> int:
+        now_msc = int(self.clock.time() * 1000)
+        return int(np.searchsorted(self.time_msc, now_msc, side='right')) - 1
+
+    def _timeframe_bars(self, timeframe: int) -> Dict[str, np.ndarray]:
+        """按周期聚合全部tick为K线（首次使用时计算并缓存）"""
+        if timeframe not in self._bars:
+            seconds = _TIMEFRAME_SECONDS[timeframe]
+            key = self.time_msc // (seconds * 1000)
+            starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+            self._bars[timeframe] = {
+                'time': key[starts] * seconds,
+                'start': starts,
+                'open': self.bid[starts],
+                'high': np.maximum.reduceat(self.bid, starts),
+                'low': np.minimum.reduceat(self.bid, starts),
+                'close': self.bid[np.r_[starts[1:] - 1, len(self.bid) - 1]],
+                'tick_volume': np.diff(np.r_[starts, len(self.bid)]),
+                'spread': np.round((self.ask[starts] - self.bid[starts]) / self.point),
+            }
+        return self._bars[timeframe]
+
+    def rates_from_pos(self, timeframe: int, start_pos: int, count: int) -> Optional[np.ndarray]:
+        index = self._current_index()
+        if index < 0:
+            return None
+        bars = self._timeframe_bars(timeframe)
+        current = int(np.searchsorted(bars['start'], index, side='right')) - 1
+        first = max(0, current - start_pos - count + 1)
+        last = current - start_pos
+        if last < first:
+            return np.zeros(0, dtype=RATES_DTYPE)
+
+        rates = np.zeros(last - first + 1, dtype=RATES_DTYPE)
+        for name in ('time', 'open', 'high', 'low', 'close', 'tick_volume', 'spread'):
+            rates[name] = bars[name][first:last + 1]
+        if last == current:
+            # 当前K线尚未走完，只使用到当前时刻为止的tick
+            forming = self.bid[bars['start'][current]:index + 1]
+            rates[-1]['high'] = forming.max()
+            rates[-1]['low'] = forming.min()
+            rates[-1]['close'] = forming[-1]
+            rates[-1]['tick_volume'] = len(forming)
+        return rates
+
+    def rates_range(self, timeframe: int, date_from, date_to) -> Optional[np.ndarray]:
+        index = self._current_index()
+        if index < 0:
+            return None
+        bars = self._timeframe_bars(timeframe)
+        current = int(np.searchsorted(bars['start'], index, side='right')) - 1
+        first = int(np.searchsorted(bars['time'], _to_timestamp(date_from), side='left'))
+        last = min(current, int(np.searchsorted(bars['time'], _to_timestamp(date_to), side='right')) - 1)
+        if last < first:
+            return np.zeros(0, dtype=RATES_DTYPE)
+        return self.rates_from_pos(timeframe, current - last, last - first + 1)
+
+    def ticks_range(self, date_from, date_to) -> Optional[np.ndarray]:
+        index = self._current_index()
+        first = int(np.searchsorted(self.time_msc, int(_to_timestamp(date_from) * 1000), side='left'))
+        last = min(index, int(np.searchsorted(self.time_msc, int(_to_timestamp(date_to) * 1000), side='right')) - 1)
+        ticks = np.zeros(max(0, last - first + 1), dtype=TICKS_DTYPE)
+        if len(ticks):
+            ticks['time_msc'] = self.time_msc[first:last + 1]
+            ticks['time'] = ticks['time_msc'] // 1000
+            ticks['bid'] = self.bid[first:last + 1]
+            ticks['ask'] = self.ask[first:last + 1]
+        return ticks
+
+    def tick(self) -> Optional[Tick]:
+        index = self._current_index()
+        if index < 0:
+            return None
+        time_msc = int(self.time_msc[index])
+        return Tick(time_msc // 1000, float(self.bid[index]), float(self.ask[index]), 0.0, 0, time_msc, 6, 0.0)
+
+    def symbol_info(self) -> Optional[SymbolInfo]:
+        tick = self.tick()
+        if tick is None:
+            return None
+        tick_value = self.contract_size * self.point
+        return SymbolInfo(self.symbol, self.point, self.digits, round((tick.ask - tick.bid) / self.point),
+                          tick.bid, tick.ask, self.contract_size, tick_value, self.point,
+                          self.volume_min, self.volume_max, self.volume_step, self.stops_level,
+                          SYMBOL_FILLING_FOK | SYMBOL_FILLING_IOC)
+
+    # ---- 撮合 ----
+    def update(self):
+        """处理截至当前模拟时间已触发止损/止盈的持仓"""
+        now = self.clock.time()
+        for ticket in [t for t, p in self.positions.items() if p['exit_time'] <= now]:
+            position = self.positions[ticket]
+            exit_index = position['exit_index']
+            if position['type'] == POSITION_TYPE_BUY:
+                price = float(self.bid[exit_index])
+            else:
+                price = float(self.ask[exit_index])
+            if self.fill_at_level:
+                price = position['tp'] if position['exit_reason'] == DEAL_REASON_TP else position['sl']
+            self._close(ticket, price, int(self.time_msc[exit_index]), position['exit_reason'])
+
+    def _schedule_exit(self, position: Dict[str, Any], start: int):
+        """开仓时预先计算首次触及止损/止盈的tick（回放数据已知未来走势）"""
+        from backtest import find_exit
+
+        position['exit_time'] = float('inf')
+        position['exit_index'] = -1
+        if not position['sl'] and not position['tp']:
+            return
+        is_buy = position['type'] == POSITION_TYPE_BUY
+        tp = position['tp'] or (float('inf') if is_buy else -float('inf'))
+        sl = position['sl'] or (-float('inf') if is_buy else float('inf'))
+        index, hit_tp = find_exit(self.path, start + 1, is_buy, tp, sl, chunk=4096)
+        if index >= 0:
+            position['exit_time'] = self.time_msc[index] / 1000.0
+            position['exit_index'] = index
+            position['exit_reason'] = DEAL_REASON_TP if hit_tp else DEAL_REASON_SL
+
+    def _profit(self, position: Dict[str, Any], price: float) -> float:
+        direction = 1 if position['type'] == POSITION_TYPE_BUY else -1
+        return round((price - position['price_open']) * direction * self.contract_size * position['volume'], 2)
+
+    def _close(self, ticket: int, price: float, time_msc: int, reason: int) -> TradeDeal:
+        position = self.positions.pop(ticket)
+        price = round(price, self.digits)
+        profit = self._profit(position, price)
+        self.balance += profit
+        close_type = ORDER_TYPE_SELL if position['type'] == POSITION_TYPE_BUY else ORDER_TYPE_BUY
+        order_ticket = next(self._tickets)
+        self.orders.append(TradeOrder(order_ticket, time_msc // 1000, time_msc, time_msc // 1000, time_msc,
+                                      close_type, ORDER_FILLING_IOC, ORDER_STATE_FILLED, position['magic'],
+                                      ticket, position['volume'], 0.0, price, 0.0, 0.0, price,
+                                      self.symbol, position['comment']))
+        deal = TradeDeal(next(self._tickets), order_ticket, time_msc // 1000, time_msc, close_type, DEAL_ENTRY_OUT,
+                         position['magic'], ticket, reason, position['volume'], price, 0.0, 0.0, profit, 0.0,
+                         self.symbol, _reason_comment(reason, price))
+        self.deals.append(deal)
+        return deal
+
+    def order_send(self, request: Dict[str, Any]) -> OrderSendResult:
+        self.update()
+        tick = self.tick()
+
+        def result(retcode, comment, deal=0, order=0, volume=0.0, price=0.0):
+            bid, ask = (tick.bid, tick.ask) if tick else (0.0, 0.0)
+            return OrderSendResult(retcode, deal, order, volume, price, bid, ask, comment, 0, 0, request)
+
+        if request.get("action") != TRADE_ACTION_DEAL:
+            return result(TRADE_RETCODE_INVALID, "Invalid request")
+        if request.get("symbol") != self.symbol:
+            return result(TRADE_RETCODE_INVALID, "Invalid symbol")
+        if tick is None:
+            return result(TRADE_RETCODE_MARKET_CLOSED, "Market closed")
+
+        order_type = request.get("type")
+        volume = float(request.get("volume", 0))
+        market_price = tick.ask if order_type == ORDER_TYPE_BUY else tick.bid
+        steps = volume / self.volume_step
+        if not (self.volume_min <= volume <= self.volume_max) or abs(steps - round(steps)) > 1e-6:
+            return result(TRADE_RETCODE_INVALID_VOLUME, "Invalid volume")
+        if request.get("type_filling", ORDER_FILLING_FOK) == ORDER_FILLING_RETURN:
+            return result(TRADE_RETCODE_INVALID_FILL, "Unsupported filling mode")
+
+        requested = request.get("price") or market_price
+        if abs(requested - market_price) > request.get("deviation", 0) * self.point + 1e-9:
+            return result(TRADE_RETCODE_REQUOTE, "Requote")
+
+        ticket = request.get("position")
+        index = self._current_index()
+        if ticket:
+            # 按持仓单号平仓
+            if ticket not in self.positions:
+                return result(TRADE_RETCODE_INVALID, "Position not found")
+            deal = self._close(ticket, market_price, int(self.time_msc[index]), DEAL_REASON_EXPERT)
+            return result(TRADE_RETCODE_DONE, "Request executed", deal.ticket, deal.order, volume, market_price)
+
+        sl = float(request.get("sl", 0.0))
+        tp = float(request.get("tp", 0.0))
+        min_distance = self.stops_level * self.point
+        if order_type == ORDER_TYPE_BUY:
+            invalid = (sl and sl > tick.bid - min_distance) or (tp and tp < tick.bid + min_distance)
+        else:
+            invalid = (sl and sl < tick.ask + min_distance) or (tp and tp > tick.ask - min_distance)
+        if invalid:
+            return result(TRADE_RETCODE_INVALID_STOPS, "Invalid stops")
+        if self.balance <= 0:
+            return result(TRADE_RETCODE_NO_MONEY, "No money")
+
+        time_msc = int(self.time_msc[index])
+        ticket = next(self._tickets)
+        position = {
+            'ticket': ticket, 'time_msc': time_msc, 'type': order_type, 'magic': request.get("magic", 0),
+            'volume': volume, 'price_open': market_price, 'sl': sl, 'tp': tp,
+            'comment': request.get("comment", ""),
+        }
+        self._schedule_exit(position, index)
+        self.positions[ticket] = position
+        self.orders.append(TradeOrder(ticket, time_msc // 1000, time_msc, time_msc // 1000, time_msc, order_type,
+                                      request.get("type_filling", ORDER_FILLING_FOK), ORDER_STATE_FILLED,
+                                      position['magic'], ticket, volume, 0.0, market_price, sl, tp, market_price,
+                                      self.symbol, position['comment']))
+        deal = TradeDeal(next(self._tickets), ticket, time_msc // 1000, time_msc, order_type, DEAL_ENTRY_IN,
+                         position['magic'], ticket, DEAL_REASON_EXPERT, volume, market_price, 0.0, 0.0, 0.0, 0.0,
+                         self.symbol, position['comment'])
+        self.deals.append(deal)
+        return result(TRADE_RETCODE_DONE, "Request executed", deal.ticket, ticket, volume, market_price)
+
+    # ---- 持仓与历史 ----
+    def position_tuples(self, symbol: Optional[str] = None, ticket: Optional[int] = None) -> Tuple[TradePosition, ...]:
+        self.update()
+        tick = self.tick()
+        positions = []
+        for position in self.positions.values():
+            if symbol is not None and symbol != self.symbol:
+                continue
+            if ticket is not None and ticket != position['ticket']:
+                continue
+            current = tick.bid if position['type'] == POSITION_TYPE_BUY else tick.ask
+            positions.append(TradePosition(
+                position['ticket'], position['time_msc'] // 1000, position['time_msc'], position['type'],
+                position['magic'], position['ticket'], position['volume'], position['price_open'],
+                position['sl'], position['tp'], current, self._profit(position, current),
+                self.symbol, position['comment']))
+        return tuple(positions)
+
+    def account(self) -> AccountInfo:
+        self.update()
+        floating = sum(position.profit for position in self.position_tuples())
+        equity = self.balance + floating
+        return AccountInfo(self.login, self.server, "Simulator", "Simulator", "USD", 1000,
+                           round(self.balance, 2), round(equity, 2), round(floating, 2), 0.0, round(equity, 2))
+
+    def history(self, records: list, time_field: str, date_from=None, date_to=None, ticket=None,
+                position=None, group=None) -> Tuple:
+        self.update()
+        if ticket is not None:
+            return tuple(r for r in records if r.ticket == ticket)
+        if position is not None:
+            return tuple(r for r in records if r.position_id == position)
+        start = _to_timestamp(date_from) if date_from is not None else 0
+        end = _to_timestamp(date_to) if date_to is not None else float('inf')
+        return tuple(r for r in records if start <= getattr(r, time_field) <= end)
+
+
+def ticks_from_bars(bars: np.ndarray, point: float = 0.001) -> np.ndarray:
+    """把M1K线展开为合成tick（开-低-高-收，阴线为开-高-低-收）"""
+    n = len(bars)
+    bullish = bars['close'] >= bars['open']
+    prices = np.empty((n, 4), dtype=np.float64)
+    prices[:, 0] = bars['open']
+    prices[:, 1] = np.where(bullish, bars['low'], bars['high'])
+    prices[:, 2] = np.where(bullish, bars['high'], bars['low'])
+    prices[:, 3] = bars['close']
+    offsets = np.array([0, 15000, 30000, 59000], dtype=np.int64)
+
+    ticks = np.zeros(n * 4, dtype=[('time_msc', '<i8'), ('bid', '<f8'), ('ask', '<f8')])
+    ticks['time_msc'] = (bars['time'].astype(np.int64)[:, None] * 1000 + offsets).ravel()
+    ticks['bid'] = prices.ravel()
+    ticks['ask'] = (prices + bars['spread'].astype(np.float64)[:, None] * point).ravel()
+    return ticks
+
+
+def _to_timestamp(value) -> float:
+    """把 datetime（视为UTC）或秒数转换为时间戳"""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            return value.timestamp()
+        return calendar.timegm(value.timetuple()) + value.microsecond / 1e6
+    return float(value)
+
+
+def _to_datetime(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+def _reason_comment(reason: int, price: float) -> str:
+    if reason == DEAL_REASON_SL:
+        return f"[sl {price:.3f}]"
+    if reason == DEAL_REASON_TP:
+        return f"[tp {price:.3f}]"
+    return ""
+
+
+# ---- 模块级API（与 MetaTrader5 同名） ----
+_terminal: Optional[SimulatedTerminal] = None
+
+
+def attach(terminal: SimulatedTerminal):
+    """设置当前模块使用的模拟终端"""
+    global _terminal
+    _terminal = terminal
+
+
+def install(terminal: Optional[SimulatedTerminal] = None):
+    """把本模块注册为 MetaTrader5，之后 import MetaTrader5 得到的就是模拟终端"""
+    if terminal is not None:
+        attach(terminal)
+    module = sys.modules[__name__]
+    sys.modules['MetaTrader5'] = module
+    sys.modules.setdefault('mt5_sim', module)
+
+
+def _symbol_ok(symbol: str) -> bool:
+    return _terminal is not None and symbol == _terminal.symbol
+
+
+def initialize(path: Optional[str] = None, **kwargs) -> bool:
+    if _terminal is None:
+        return False
+    if kwargs.get("login"):
+        _terminal.login = kwargs["login"]
+    if kwargs.get("server"):
+        _terminal.server = kwargs["server"]
+    return True
+
+
+def login(login, password=None, server=None, timeout=None) -> bool:
+    return initialize(login=login, server=server)
+
+
+def shutdown():
+    return None
+
+
+def last_error() -> Tuple[int, str]:
+    return _terminal._error if _terminal is not None else (RES_E_FAIL, "Terminal not attached")
+
+
+def account_info() -> Optional[AccountInfo]:
+    return _terminal.account() if _terminal is not None else None
+
+
+def symbol_info(symbol: str) -> Optional[SymbolInfo]:
+    return _terminal.symbol_info() if _symbol_ok(symbol) else None
+
+
+def symbol_info_tick(symbol: str) -> Optional[Tick]:
+    return _terminal.tick() if _symbol_ok(symbol) else None
+
+
+def symbol_select(symbol: str, enable: bool = True) -> bool:
+    return _symbol_ok(symbol)
+
+
+def copy_rates_from_pos(symbol: str, timeframe: int, start_pos: int, count: int) -> Optional[np.ndarray]:
+    return _terminal.rates_from_pos(timeframe, start_pos, count) if _symbol_ok(symbol) else None
+
+
+def copy_rates_range(symbol: str, timeframe: int, date_from, date_to) -> Optional[np.ndarray]:
+    return _terminal.rates_range(timeframe, date_from, date_to) if _symbol_ok(symbol) else None
+
+
+def copy_ticks_range(symbol: str, date_from, date_to, flags: int = COPY_TICKS_ALL) -> Optional[np.ndarray]:
+    return _terminal.ticks_range(date_from, date_to) if _symbol_ok(symbol) else None
+
+
+def order_send(request: Dict[str, Any]) -> Optional[OrderSendResult]:
+    return _terminal.order_send(request) if _terminal is not None else None
+
+
+def positions_get(symbol: Optional[str] = None, group: Optional[str] = None,
+                  ticket: Optional[int] = None) -> Optional[Tuple[TradePosition, ...]]:
+    return _terminal.position_tuples(symbol, ticket) if _terminal is not None else None
+
+
+def positions_total() -> int:
+    return len(positions_get() or ())
+
+
+def history_deals_get(date_from=None, date_to=None, group: Optional[str] = None, ticket: Optional[int] = None,
+                      position: Optional[int] = None) -> Optional[Tuple[TradeDeal, ...]]:
+    if _terminal is None:
+        return None
+    return _terminal.history(_terminal.deals, 'time', date_from, date_to, ticket, position, group)
+
+
+def history_orders_get(date_from=None, date_to=None, group: Optional[str] = None, ticket: Optional[int] = None,
+                       position: Optional[int] = None) -> Optional[Tuple[TradeOrder, ...]]:
+    if _terminal is None:
+        return None
+    return _terminal.history(_terminal.orders, 'time_setup', date_from, date_to, ticket, position, group)
+
+
+# 可注入延迟的模块级API
+_API_FUNCTIONS = (
+    'initialize', 'login', 'shutdown', 'last_error', 'account_info', 'symbol_info', 'symbol_info_tick',
+    'symbol_select', 'copy_rates_from_pos', 'copy_rates_range', 'copy_ticks_range', 'order_send',
+    'positions_get', 'positions_total', 'history_deals_get', 'history_orders_get',
+)
+_api_originals: Dict[str, Any] = {}
+
+
+def _with_latency(function, seconds: float):
+    def call(*args, **kwargs):
+        deadline = time.perf_counter() + seconds
+        result = function(*args, **kwargs)
+        while time.perf_counter() < deadline:
+            pass
+        return result
+    call.__name__ = function.__name__
+    call.__doc__ = function.__doc__
+    return call
+
+
+def set_latency(seconds: float):
+    """给每次模块级API调用加入固定的真实耗时（忙等，模拟终端进程间通信），0 表示关闭"""
+    namespace = globals()
+    if not _api_originals:
+        _api_originals.update((name, namespace[name]) for name in _API_FUNCTIONS)
+    for name, function in _api_originals.items():
+        namespace[name] = _with_latency(function, seconds) if seconds > 0 else function
+
+
+class _SimulatedTimeFilter(logging.Filter):
+    """日志时间使用模拟时钟"""
+
+    def __init__(self, clock: SimulatedClock):
+        super().__init__()
+        self.clock = clock
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.created = self.clock.time()
+        record.msecs = (record.created % 1) * 1000
+        return True
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """模拟运行命令行入口：用录制行情加速运行 TradingBot"""
+    install()
+    import XAUUSD
+    from backtest import load_bars, load_ticks
+
+    parser = argparse.ArgumentParser(prog="mt5_sim", description="在模拟终端上加速运行 TradingBot")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--bars", help="M1K线文件（.npy、.csv 或 bar_archive 目录）")
+    source.add_argument("--ticks", help="tick文件（.npy、.csv 或 tick_store 目录）")
+    parser.add_argument("--config", default="config.json", help="配置文件")
+    parser.add_argument("--symbol", help="品种名，默认取配置")
+    parser.add_argument("--start", help="开始时间 YYYY-MM-DD[ HH:MM]，默认数据开头")
+    parser.add_argument("--days", type=float, default=7.0, help="模拟天数")
+    parser.add_argument("--balance", type=float, default=100.0, help="初始余额")
+    parser.add_argument("--point", type=float, default=0.001, help="报价点值")
+    parser.add_argument("--out", help="状态日志、统计文件、交易记录库和日志的输出目录（须为空），默认新建临时目录")
+    args = parser.parse_args(argv)
+
+    # 模拟运行不能读写实盘目录中的马丁状态和交易记录，每次从空目录开始保证可复现
+    if args.out:
+        if os.path.isdir(args.out) and os.listdir(args.out):
+            parser.error(f"输出目录不为空: {args.out}")
+        os.makedirs(args.out, exist_ok=True)
+        out = args.out
+    else:
+        out = tempfile.mkdtemp(prefix="mt5_sim_")
+    if not logging.getLogger().handlers:
+        XAUUSD.setup_logging(os.path.join(out, 'trading_bot.log'), os.path.join(out, 'trading_events.jsonl'))
+
+    symbol = args.symbol or XAUUSD.ConfigManager(args.config).get_trading_config().symbol
+    clock = SimulatedClock()
+    if args.bars:
+        terminal = SimulatedTerminal.from_bars(symbol, load_bars(args.bars), clock, point=args.point,
+                                               balance=args.balance)
+    else:
+        terminal = SimulatedTerminal(symbol, load_ticks(args.ticks), clock, point=args.point, balance=args.balance)
+    attach(terminal)
+
+    start = terminal.first_time
+    if args.start:
+        time_format = '%Y-%m-%d %H:%M' if ' ' in args.start else '%Y-%m-%d'
+        start = calendar.timegm(datetime.strptime(args.start, time_format).timetuple())
+    clock.reset(start, min(terminal.last_time, start + args.days * 86400))
+
+    time_filter = _SimulatedTimeFilter(clock)
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(time_filter)
+
+    wall_start = time.perf_counter()
+    try:
+        XAUUSD.TradingBot(args.config, clock, data_dir=out).run()
+    except SimulationFinished as e:
+        logger.info(str(e))
+
+    closed = [deal for deal in terminal.deals if deal.entry == DEAL_ENTRY_OUT]
+    logger.info(f"模拟完成 | 模拟时长: {(clock.time() - start) / 86400:.1f} 天 | 实际耗时: "
+                f"{time.perf_counter() - wall_start:.1f} 秒 | 交易次数: {len(closed)} | "
+                f"余额: ${args.balance:.2f} -> ${terminal.balance:.2f} | 输出目录: {out}")
+    return terminal
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+马丁格尔阶梯爆仓概率精确计算
+每笔交易的盈亏都是 止盈/止损点数 × 马丁倍数 个基础单位（基础手数下1个策略点的盈亏），
+所以 余额 × 累计亏损 × 马丁倍数 是有限的离散状态。按 STRATEGY_MAP 的16种组合和每种止盈/止损距离的命中概率
+建立稀疏转移矩阵，解线性方程组即可得到爆仓概率、翻倍概率、期望交易次数和回撤概率，不需要蒙特卡洛模拟。
+
+累计亏损就是距上次回本时余额高点的回撤，余额 + 累计亏损 只增不减，因此状态满足 余额 + 累计亏损 < 翻倍目标。
+"""
+
+import argparse
+import logging
+import time
+from dataclasses import dataclass, asdict
+from fractions import Fraction
+from math import gcd, ceil, floor
+from typing import Optional, Dict, List, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+from scipy.linalg import lapack
+from scipy.sparse.linalg import splu
+
+from martingale_core import ConfigManager, StrategyCalculator, TradeStrategy
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LadderModel:
+    """马丁格尔阶梯参数"""
+    balance: float = 100.0            # 初始余额
+    base_lot_size: float = 0.01
+    max_multiplier: int = 8
+    contract_size: float = 100.0      # 每手合约数量，XAUUSD 1手=100盎司
+    strategy_point: float = 1.0       # 策略1个点对应的价格距离
+    target_multiple: float = 2.0      # 余额达到初始余额的该倍数视为翻倍
+    ruin_balance: float = 0.0         # 余额跌到该值及以下视为爆仓
+    candle_probability: float = 0.5   # 上一根K线为阳线的概率
+
+    @property
+    def point_value(self) -> float:
+        """基础手数下1个策略点的盈亏"""
+        return self.contract_size * self.strategy_point * self.base_lot_size
+
+
+@dataclass
+class RuinResult:
+    """从初始状态出发的吸收概率与期望交易次数"""
+    ruin_probability: float
+    double_probability: float
+    expected_trades: float            # 到爆仓或翻倍为止的期望交易次数
+    expected_trades_to_double: float  # 以翻倍为条件的期望交易次数
+    states: int
+    solve_seconds: float
+
+
+def multiplier_levels(max_multiplier: int) -> List[Fraction]:
+    """从1倍出发按 亏损翻倍（不超过最大倍数）/ 盈利减半（不低于1倍）能到达的全部倍数"""
+    cap = Fraction(max_multiplier)
+    levels = {Fraction(1)}
+    frontier = [Fraction(1)]
+    while frontier:
+        level = frontier.pop()
+        for following in (min(cap, level * 2), max(Fraction(1), level / 2)):
+            if following not in levels:
+                levels.add(following)
+                frontier.append(following)
+    return sorted(levels)
+
+
+def default_hit_probabilities(strategy_map: Dict[Tuple[int, ...], TradeStrategy]) -> Dict[Tuple[int, int], float]:
+    """无漂移随机游走下先到止盈的概率 sl / (tp + sl)"""
+    return {(s.tp_points, s.sl_points): s.sl_points / (s.tp_points + s.sl_points) for s in strategy_map.values()}
+
+
+def hit_probabilities_from_trades(trades: np.ndarray, strategy_map: Dict[Tuple[int, ...], TradeStrategy],
+                                  prior: float = 1.0) -> Dict[Tuple[int, int], float]:
+    """用成交记录（backtest.TRADE_DTYPE 或 log_analysis.LOG_TRADE_DTYPE）估计每种止盈/止损距离的命中概率，
+    以随机游走概率作 prior 笔交易的先验平滑样本少的组合"""
+    probabilities = default_hit_probabilities(strategy_map)
+    for (tp, sl), default in probabilities.items():
+        mask = (trades['tp_points'] == tp) & (trades['sl_points'] == sl)
+        wins = np.count_nonzero(trades['pnl'][mask] > 0)
+        probabilities[(tp, sl)] = (wins + prior * default) / (np.count_nonzero(mask) + prior)
+    return probabilities
+
+
+def outcome_distribution(strategy_map: Dict[Tuple[int, ...], TradeStrategy],
+                         hit_probabilities: Dict[Tuple[int, int], float],
+                         candle_probability: float = 0.5) -> Dict[int, float]:
+    """1倍手数单笔交易以策略点计的盈亏分布 {+止盈点数 / -止损点数: 概率}，3个随机数视为均匀"""
+    outcomes: Dict[int, float] = {}
+    for sequence, strategy in strategy_map.items():
+        weight = (candle_probability if sequence[0] == 1 else 1 - candle_probability) / 8
+        hit = hit_probabilities[(strategy.tp_points, strategy.sl_points)]
+        outcomes[strategy.tp_points] = outcomes.get(strategy.tp_points, 0.0) + weight * hit
+        outcomes[-strategy.sl_points] = outcomes.get(-strategy.sl_points, 0.0) + weight * (1 - hit)
+    return outcomes
+
+
+class RuinChain:
+    """马丁格尔阶梯的吸收马尔可夫链：状态为 (余额, 累计亏损, 倍数档位)，吸收态为爆仓和翻倍
+
+    余额 + 累计亏损（回本高点 H）只在回本时增加，按 H 分块后转移矩阵是块三角的，从最高的 H 往下逐块回代即可。
+    块内转移只取决于 (累计亏损, 倍数)，H 只决定亏到多少会爆仓，所以每块都是同一个矩阵的前导主子阵：
+    只做一次无主元LU分解（I - Q 是非奇异M矩阵，无需选主元），各块直接取带状因子的前 m 列求解。
+    """
+
+    def __init__(self, model: LadderModel, hit_probabilities: Optional[Dict[Tuple[int, int], float]] = None,
+                 strategy_map: Optional[Dict[Tuple[int, ...], TradeStrategy]] = None):
+        self.model = model
+        strategy_map = strategy_map or StrategyCalculator.STRATEGY_MAP
+        self.outcomes = outcome_distribution(strategy_map, hit_probabilities or default_hit_probabilities(strategy_map),
+                                             model.candle_probability)
+
+        # 最大倍数不是2的幂时减半会出现分数倍数，把基础单位细分到所有倍数都是整数
+        levels = multiplier_levels(model.max_multiplier)
+        scale = 1
+        for level in levels:
+            scale = scale * level.denominator // gcd(scale, level.denominator)
+        self.levels = np.array([int(level * scale) for level in levels], dtype=np.int64)
+        self.unit = model.point_value / scale
+
+        self.start = int(floor(model.balance / self.unit + 1e-9))
+        self.target = int(ceil(model.balance * model.target_multiple / self.unit - 1e-9))
+        self.ruin = int(floor(model.ruin_balance / self.unit + 1e-9))
+        # 可达的回本高点 H 在 [初始余额, 目标) 内，块 H 含累计亏损 0 .. H-爆仓线-1
+        self.blocks = range(self.target - 1, self.start - 1, -1)
+        self.width = max(self.target - self.ruin - 1, 1)
+        self.states = sum(H - self.ruin for H in self.blocks) * len(self.levels)
+        self._build()
+
+    def _build(self):
+        """按 累计亏损 × 倍数档位 生成块内转移矩阵，跳出块的亏损（爆仓/回撤）和回本单独保存"""
+        level_count = len(self.levels)
+        level_index = {int(level): i for i, level in enumerate(self.levels)}
+        top = int(self.levels[-1])
+        double_of = np.array([level_index[min(top, int(level) * 2)] for level in self.levels])
+        half_of = np.array([level_index[max(int(self.levels[0]), int(level) // 2)] for level in self.levels])
+
+        # 状态序号 = 累计亏损 * 档位数 + 档位
+        drawdown = np.repeat(np.arange(self.width), level_count)
+        level = np.tile(np.arange(level_count), self.width)
+        row = np.arange(len(drawdown))
+
+        inner, losses, resets = [], [], []
+        for points, probability in self.outcomes.items():
+            if probability <= 0:
+                continue
+            pnl = points * self.levels[level]
+            if points < 0:
+                # 亏损：累计亏损增加，倍数翻倍；落点超出块的部分在逐块求解时按爆仓/回撤处理
+                next_drawdown = drawdown - pnl
+                losses.append((row, next_drawdown, np.full(len(row), probability)))
+                kept = next_drawdown < self.width
+                inner.append((row[kept], next_drawdown[kept] * level_count + double_of[level[kept]], probability))
+                continue
+            # 盈利先冲减累计亏损：未回本倍数减半；恰好回本回到本块起点；超过则跳到更高的块起点
+            remaining = drawdown - pnl
+            partial = remaining > 0
+            inner.append((row[partial], remaining[partial] * level_count + half_of[level[partial]], probability))
+            even = remaining == 0
+            inner.append((row[even], np.zeros(int(np.count_nonzero(even)), dtype=np.int64), probability))
+            jump = remaining < 0
+            resets.append((row[jump], -remaining[jump], np.full(int(np.count_nonzero(jump)), probability)))
+
+        n = len(row)
+        transient = sparse.csc_matrix((np.concatenate([np.full(len(r), p) for r, _, p in inner]),
+                                       (np.concatenate([r for r, _, _ in inner]), np.concatenate([c for _, c, _ in inner]))),
+                                      shape=(n, n))
+        self._factorize(sparse.identity(n, format='csc') - transient)
+
+        # 按行排序，块 H 只用前 m 行时取前缀即可
+        self._losses = self._sorted(losses)
+        self._resets = self._sorted(resets)
+        self._max_jump = int(self._resets[1].max()) if len(self._resets[1]) else 0
+        self._fall_size = int(self._losses[1].max()) + 1
+
+    @staticmethod
+    def _sorted(parts) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        rows, targets, probabilities = (np.concatenate(column) for column in zip(*parts))
+        order = np.argsort(rows, kind='stable')
+        return rows[order], targets[order], probabilities[order]
+
+    def _factorize(self, matrix: sparse.csc_matrix):
+        """无主元LU分解并转成LAPACK带状存储，前导主子阵的因子就是带状数组的前 m 列"""
+        lu = splu(matrix, permc_spec='NATURAL', diag_pivot_thresh=0.0, options=dict(SymmetricMode=True))
+        identity = np.arange(matrix.shape[0])
+        if not (np.array_equal(lu.perm_r, identity) and np.array_equal(lu.perm_c, identity)):
+            raise RuntimeError("LU分解发生了行列置换，无法按前导主子阵求解")
+        lower, upper = lu.L.tocoo(), lu.U.tocoo()
+        lower_band = int((lower.row - lower.col).max())
+        upper_band = int((upper.col - upper.row).max())
+        self._lower = np.zeros((lower_band + 1, matrix.shape[0]), order='F')
+        self._lower[lower.row - lower.col, lower.col] = lower.data
+        self._upper = np.zeros((upper_band + 1, matrix.shape[0]), order='F')
+        self._upper[upper_band + upper.row - upper.col, upper.col] = upper.data
+
+    def _block_solve(self, rhs: np.ndarray) -> np.ndarray:
+        """解前 m 个状态的 (I - Q) x = rhs"""
+        m = len(rhs)
+        forward, _ = lapack.dtbtrs(self._lower[:, :m], rhs, uplo='L', diag='U')
+        solution, _ = lapack.dtbtrs(self._upper[:, :m], forward, uplo='U')
+        return solution
+
+    def _leaving(self, m: int, H: int, width: int, fall: np.ndarray, top: np.ndarray) -> np.ndarray:
+        """块 H（前 m 个状态）跳出本块的转移带来的常数项：亏出块按 fall[落点累计亏损]，回本按更高块起点的解 top"""
+        columns = top.shape[1]
+        rhs = np.zeros((m, columns))
+        rows, targets, probabilities = self._losses
+        count = np.searchsorted(rows, m)
+        out = targets[:count] >= width
+        weights = probabilities[:count][out, None] * fall[targets[:count][out]]
+        for column in range(columns):
+            rhs[:, column] += np.bincount(rows[:count][out], weights=weights[:, column], minlength=m)
+
+        rows, jumps, probabilities = self._resets
+        count = np.searchsorted(rows, m)
+        weights = probabilities[:count, None] * top[H + jumps[:count]]
+        for column in range(columns):
+            rhs[:, column] += np.bincount(rows[:count], weights=weights[:, column], minlength=m)
+        return rhs
+
+    def _top_values(self, double_values: Sequence[float]) -> np.ndarray:
+        """各块起点（1倍、无累计亏损）的解，H 达到目标即翻倍"""
+        top = np.zeros((self.target + self._max_jump + 1, len(double_values)))
+        top[self.target:] = double_values
+        return top
+
+    def solve(self) -> RuinResult:
+        """求解从初始余额、1倍、无累计亏损出发的爆仓/翻倍概率和期望交易次数"""
+        start_time = time.perf_counter()
+        if not self.ruin < self.start < self.target:
+            ruined = self.start <= self.ruin
+            return RuinResult(float(ruined), float(not ruined), 0.0, 0.0, self.states, 0.0)
+
+        # 列：爆仓概率、翻倍概率、期望步数；亏出块即爆仓
+        fall = np.zeros((self._fall_size, 3))
+        fall[:, 0] = 1.0
+        top = self._top_values((0.0, 1.0, 0.0))
+        # 以翻倍为条件的期望步数：E[T·1{翻倍}] 满足 (I - Q) g = h，h 为各状态的翻倍概率
+        conditional_top = self._top_values((0.0,))
+        no_fall = np.zeros((len(fall), 1))
+        for H in self.blocks:
+            width = H - self.ruin
+            m = width * len(self.levels)
+            rhs = self._leaving(m, H, width, fall, top)
+            rhs[:, 2] += 1.0
+            solution = self._block_solve(rhs)
+            top[H] = solution[0]
+            rhs = self._leaving(m, H, width, no_fall, conditional_top) + solution[:, 1:2]
+            conditional_top[H] = self._block_solve(rhs)[0]
+
+        ruin, double, steps = top[self.start]
+        return RuinResult(
+            ruin_probability=float(ruin),
+            double_probability=float(double),
+            expected_trades=float(steps),
+            expected_trades_to_double=float(conditional_top[self.start, 0] / double) if double > 0 else float('inf'),
+            states=self.states,
+            solve_seconds=time.perf_counter() - start_time,
+        )
+
+    def drawdown_probability(self, amount: float) -> float:
+        """翻倍之前累计亏损（距回本高点的回撤）达到 amount 的概率"""
+        limit = int(ceil(amount / self.unit - 1e-9))
+        if limit <= 0:
+            return 1.0
+        if not self.ruin < self.start < self.target:
+            return 0.0
+
+        # 累计亏损达到阈值的状态视为吸收态，块截断到前 min(H-爆仓线, 阈值) 个累计亏损
+        fall = np.zeros((self._fall_size, 1))
+        fall[limit:] = 1.0
+        top = self._top_values((0.0,))
+        for H in self.blocks:
+            width = min(H - self.ruin, limit)
+            top[H] = self._block_solve(self._leaving(width * len(self.levels), H, width, fall, top))[0]
+        return float(top[self.start, 0])
+
+
+def load_trade_outcomes(file_path: str, config_file: str = "config.json", point: float = 0.001) -> np.ndarray:
+    """读取成交记录：log_analysis 转换的 .npz/.parquet，或M1K线文件（按配置回测一次）"""
+    if file_path.endswith(('.npz', '.parquet')):
+        from log_analysis import load_trades
+        return load_trades(file_path)
+    from backtest import BacktestSettings, PricePath, load_bars, run_backtest
+    config = ConfigManager(config_file).get_trading_config()
+    return run_backtest(PricePath.from_bars(load_bars(file_path), point), config, BacktestSettings(point=point)).trades
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """爆仓概率命令行入口"""
+    parser = argparse.ArgumentParser(prog="ruin", description="马丁格尔阶梯爆仓/翻倍概率精确计算")
+    parser.add_argument("--config", default="config.json", help="配置文件（基础手数、最大倍数、策略点值）")
+    parser.add_argument("--balance", type=float, default=100.0, help="初始余额")
+    parser.add_argument("--contract-size", type=float, default=100.0, help="每手合约数量")
+    parser.add_argument("--target", type=float, default=2.0, help="翻倍目标（初始余额的倍数）")
+    parser.add_argument("--ruin-balance", type=float, default=0.0, help="爆仓余额")
+    parser.add_argument("--candle-prob", type=float, default=0.5, help="阳线概率")
+    parser.add_argument("--trades", help="估计命中概率的成交记录（log_analysis 的 .npz/.parquet 或M1K线文件）")
+    parser.add_argument("--hit-index", help="用 hit_index.py 生成的首达索引统计命中概率")
+    parser.add_argument("--point", type=float, default=0.001, help="K线 spread 的点值（--trades 为K线文件时）")
+    parser.add_argument("--drawdown", type=float, nargs='*', default=[], help="计算回撤达到这些金额的概率")
+    args = parser.parse_args(argv)
+
+    config = ConfigManager(args.config).get_trading_config()
+    model = LadderModel(balance=args.balance, base_lot_size=config.base_lot_size,
+                        max_multiplier=config.max_martingale_multiplier, contract_size=args.contract_size,
+                        strategy_point=config.strategy_point, target_multiple=args.target,
+                        ruin_balance=args.ruin_balance, candle_probability=args.candle_prob)
+
+    hit_probabilities = None
+    if args.hit_index:
+        from hit_index import HitIndex
+        hit_probabilities = HitIndex.load(args.hit_index).hit_probabilities()
+    elif args.trades:
+        trades = load_trade_outcomes(args.trades, args.config, args.point)
+        hit_probabilities = hit_probabilities_from_trades(trades, StrategyCalculator.STRATEGY_MAP)
+        logger.info(f"命中概率（{len(trades)} 笔成交） | " + " | ".join(
+            f"止盈{tp}/止损{sl}: {p:.1%}" for (tp, sl), p in sorted(hit_probabilities.items())))
+
+    chain = RuinChain(model, hit_probabilities)
+    result = chain.solve()
+    logger.info(f"余额: ${model.balance:.2f} | 基础手数: {model.base_lot_size} | 最大倍数: {model.max_multiplier}x | "
+                f"状态数: {result.states} | 求解: {result.solve_seconds * 1000:.1f}ms")
+    logger.info(f"爆仓概率: {result.ruin_probability:.2%} | 翻倍概率: {result.double_probability:.2%} | "
+                f"期望交易次数: {result.expected_trades:.1f} | 翻倍所需期望交易次数: {result.expected_trades_to_double:.1f}")
+    for amount in args.drawdown:
+        logger.info(f"翻倍前回撤达到 ${amount:.2f} 的概率: {chain.drawdown_probability(amount):.2%}")
+    return asdict(result)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,133 @@
+"""
+随机数序列预计算表
+实盘的3个随机数只取决于 种子+整数秒（StrategyCalculator.random_sequence_at），
+因此可以对一段连续的 种子+秒 键值一次性预计算，每秒打包成一个 uint8（r1<<2 | r2<<1 | r3）。
+同一张表对任意种子都可用：种子 s 在时间 t 的序列就是键 s+t 处的值。
+"""
+
+import argparse
+import calendar
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Optional, Tuple, Sequence, Union
+
+import numpy as np
+
+from martingale_core import ConfigManager, StrategyCalculator
+
+logger = logging.getLogger(__name__)
+
+
+def pack(r1: int, r2: int, r3: int) -> int:
+    """把3个随机数打包为一个字节"""
+    return (r1 << 2) | (r2 << 1) | r3
+
+
+def unpack(bits: Union[int, np.ndarray]) -> Tuple:
+    """把字节拆回 (r1, r2, r3)，支持标量和数组"""
+    return (bits >> 2) & 1, (bits >> 1) & 1, bits & 1
+
+
+def _build_chunk(key_start: int, length: int) -> np.ndarray:
+    """计算一段连续键值的序列（工作进程入口）"""
+    bits = np.empty(length, dtype=np.uint8)
+    for offset in range(length):
+        bits[offset] = pack(*StrategyCalculator.random_sequence_at(key_start + offset, 0))
+    return bits
+
+
+class SequenceTable:
+    """按 种子+秒 索引的随机数序列表"""
+
+    def __init__(self, key_start: int, bits: np.ndarray):
+        self.key_start = int(key_start)
+        self.bits = bits
+
+    def __len__(self) -> int:
+        return len(self.bits)
+
+    @property
+    def key_end(self) -> int:
+        return self.key_start + len(self.bits)
+
+    @classmethod
+    def build(cls, seed: int, start_time: int, end_time: int, workers: int = 1,
+              chunk_size: int = 1 << 20) -> 'SequenceTable':
+        """预计算种子在 [start_time, end_time) 秒范围内的全部序列，可用多进程加速"""
+        key_start = seed + int(start_time)
+        length = int(end_time) - int(start_time)
+        chunks = [(key, min(chunk_size, key_start + length - key))
+                  for key in range(key_start, key_start + length, chunk_size)]
+
+        if workers <= 1 or len(chunks) <= 1:
+            parts = [_build_chunk(key, size) for key, size in chunks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                parts = list(executor.map(_build_chunk, *zip(*chunks)))
+
+        bits = np.concatenate(parts) if parts else np.zeros(0, dtype=np.uint8)
+        return cls(key_start, bits)
+
+    def covers(self, seed: int, start_time: int, end_time: int) -> bool:
+        """表是否覆盖种子在 [start_time, end_time) 的全部秒"""
+        return self.key_start <= seed + start_time and seed + end_time <= self.key_end
+
+    def lookup(self, seed: int, timestamps: np.ndarray) -> np.ndarray:
+        """批量查询：返回每个时间戳（秒）对应的打包序列"""
+        index = seed + np.asarray(timestamps, dtype=np.int64) - self.key_start
+        if len(index) and (index.min() < 0 or index.max() >= len(self.bits)):
+            raise IndexError("时间范围超出预计算表")
+        return self.bits[index]
+
+    def sequence_at(self, seed: int, timestamp: int) -> Tuple[int, int, int]:
+        """O(1) 查询单个时间戳的3个随机数，超出表范围时直接计算"""
+        index = seed + int(timestamp) - self.key_start
+        if 0 <= index < len(self.bits):
+            bits = int(self.bits[index])
+            return (bits >> 2) & 1, (bits >> 1) & 1, bits & 1
+        return StrategyCalculator.random_sequence_at(seed, int(timestamp))
+
+    def save(self, file_path: str):
+        """保存为 .npy，键值起点写入同名 .json"""
+        np.save(file_path, self.bits)
+        with open(file_path + '.json', 'w', encoding='utf-8') as f:
+            json.dump({"key_start": self.key_start, "length": len(self.bits)}, f)
+
+    @classmethod
+    def load(cls, file_path: str, mmap: bool = True) -> 'SequenceTable':
+        """加载预计算表，默认内存映射不读入内存"""
+        with open(file_path + '.json', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        bits = np.load(file_path, mmap_mode='r' if mmap else None)
+        return cls(meta["key_start"], bits)
+
+
+def _parse_date(text: str) -> int:
+    time_format = '%Y-%m-%d %H:%M' if ' ' in text else '%Y-%m-%d'
+    return calendar.timegm(datetime.strptime(text, time_format).timetuple())
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """预计算表命令行入口"""
+    parser = argparse.ArgumentParser(prog="sequence_table", description="预计算随机数序列表")
+    parser.add_argument("--config", default="config.json", help="配置文件")
+    parser.add_argument("--seed", type=int, help="随机数种子，默认取配置")
+    parser.add_argument("--start", required=True, help="开始时间 YYYY-MM-DD[ HH:MM]（实盘 time.time() 对应的UTC时间）")
+    parser.add_argument("--end", required=True, help="结束时间 YYYY-MM-DD[ HH:MM]")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="工作进程数")
+    parser.add_argument("--out", required=True, help="输出 .npy 路径")
+    args = parser.parse_args(argv)
+
+    seed = args.seed if args.seed is not None else ConfigManager(args.config).get_trading_config().seed
+    table = SequenceTable.build(seed, _parse_date(args.start), _parse_date(args.end), args.workers)
+    table.save(args.out)
+    logger.info(f"预计算完成 | 种子: {seed} | 秒数: {len(table)} | 文件: {args.out}")
+    return table
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,265 @@
+"""
+RandomMartingale 种子扫描
+用进程池把大量种子（以及最大马丁倍数组合）分发到所有CPU核心，
+每个参数组合在多个历史窗口上运行回测，统计爆仓概率、翻倍时间、最长连亏和最大手数。
+行情数据放在共享内存中，所有工作进程只读共享同一份。
+冷却时间不参与扫描：实盘只在外部平仓（启动时发现已有持仓）后冷却，回测中每笔都是本机器人自己的平仓，
+平仓后直接在下一根K线决策，冷却时间对回测结果没有影响。
+"""
+
+import argparse
+import csv
+import itertools
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, fields, replace
+from multiprocessing import shared_memory
+from typing import Optional, Tuple, Dict, Any, List, Sequence
+
+import numpy as np
+
+from backtest import BacktestSettings, PricePath, load_bars, load_ticks, max_loss_streak, run_backtest
+from martingale_core import ConfigManager, TradingConfig
+
+logger = logging.getLogger(__name__)
+
+# 需要放进共享内存的 PricePath 数组字段
+_ARRAY_FIELDS = tuple(f.name for f in fields(PricePath) if f.name != 'duration')
+
+# 工作进程内的共享行情与首达索引（由进程池 initializer 设置）
+_worker_path: Optional[PricePath] = None
+_worker_memory: Optional[shared_memory.SharedMemory] = None
+_worker_hit_index = None
+
+
+@dataclass(frozen=True)
+class SweepTask:
+    """单个扫描任务：一个参数组合"""
+    seed: int
+    max_multiplier: int
+
+
+@dataclass
+class SweepSettings:
+    """扫描参数"""
+    windows: int = 16                 # 每个参数组合回测的历史窗口数量
+    horizon: Optional[float] = 2 * 86400.0  # 每个窗口的秒数，None 表示到数据结尾
+    target_multiple: float = 2.0      # 余额达到初始余额的该倍数视为翻倍
+
+
+class SharedPricePath:
+    """把 PricePath 的数组放进一块共享内存，工作进程按布局映射为只读视图"""
+
+    def __init__(self, path: PricePath):
+        layout = []
+        offset = 0
+        for name in _ARRAY_FIELDS:
+            array = np.ascontiguousarray(getattr(path, name))
+            layout.append((name, array.dtype.str, array.shape, offset))
+            offset += array.nbytes
+            offset = (offset + 63) // 64 * 64
+
+        self.memory = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for name, dtype, shape, start in layout:
+            view = np.ndarray(shape, dtype=dtype, buffer=self.memory.buf, offset=start)
+            view[...] = getattr(path, name)
+
+        self.layout = tuple(layout)
+        self.duration = path.duration
+
+    @property
+    def handle(self) -> Tuple[str, tuple, float]:
+        """传给工作进程的共享内存描述"""
+        return self.memory.name, self.layout, self.duration
+
+    @staticmethod
+    def attach(handle: Tuple[str, tuple, float]) -> Tuple[PricePath, shared_memory.SharedMemory]:
+        """在工作进程中映射共享内存，返回零拷贝的 PricePath"""
+        name, layout, duration = handle
+        memory = shared_memory.SharedMemory(name=name)
+        arrays = {}
+        for field_name, dtype, shape, start in layout:
+            view = np.ndarray(shape, dtype=dtype, buffer=memory.buf, offset=start)
+            view.flags.writeable = False
+            arrays[field_name] = view
+        return PricePath(duration=duration, **arrays), memory
+
+    def close(self):
+        """释放共享内存"""
+        self.memory.close()
+        self.memory.unlink()
+
+
+def _init_worker(handle: Tuple[str, tuple, float], hit_index_file: Optional[str] = None):
+    """进程池初始化：映射共享行情，首达索引按内存映射打开（各进程共享页缓存）"""
+    global _worker_path, _worker_memory, _worker_hit_index
+    _worker_path, _worker_memory = SharedPricePath.attach(handle)
+    if hit_index_file:
+        from hit_index import HitIndex
+        _worker_hit_index = HitIndex.load(hit_index_file)
+
+
+def window_starts(path: PricePath, settings: SweepSettings) -> np.ndarray:
+    """在数据范围内均匀选取回测窗口的起始时间"""
+    first = path.time[0]
+    last = path.time[-1] - (settings.horizon or 0)
+    if settings.windows <= 1 or last <= first:
+        return np.array([first])
+    return np.linspace(first, last, settings.windows)
+
+
+def evaluate(path: PricePath, task: SweepTask, config: TradingConfig, backtest_settings: BacktestSettings,
+             settings: SweepSettings, hit_index=None) -> Dict[str, Any]:
+    """在所有窗口上回测一个参数组合并汇总"""
+    config = replace(config, seed=task.seed, max_martingale_multiplier=task.max_multiplier)
+    initial_balance = backtest_settings.initial_balance
+    target = initial_balance * settings.target_multiple
+
+    ruined = []
+    time_to_double = []
+    worst_streak = 0
+    peak_lot = 0.0
+    final_balance = []
+
+    for start in window_starts(path, settings):
+        window = replace(
+            backtest_settings,
+            start_time=float(start),
+            end_time=None if settings.horizon is None else float(start + settings.horizon),
+        )
+        result = run_backtest(path, config, window, hit_index=hit_index)
+        trades = result.trades
+
+        ruined.append(result.ruined)
+        final_balance.append(result.final_balance)
+        if len(trades):
+            worst_streak = max(worst_streak, max_loss_streak(trades['pnl']))
+            peak_lot = max(peak_lot, float(trades['lot_size'].max()))
+            doubled = np.flatnonzero(trades['balance'] >= target)
+            time_to_double.append(trades['exit_time'][doubled[0]] - start if len(doubled) else np.nan)
+        else:
+            time_to_double.append(np.nan)
+
+    time_to_double = np.array(time_to_double)
+    reached = ~np.isnan(time_to_double)
+    return {
+        "seed": task.seed,
+        "max_multiplier": task.max_multiplier,
+        "ruin_probability": float(np.mean(ruined)),
+        "double_probability": float(np.mean(reached)),
+        "median_hours_to_double": float(np.median(time_to_double[reached]) / 3600) if reached.any() else float('nan'),
+        "worst_streak": worst_streak,
+        "peak_lot": peak_lot,
+        "mean_final_balance": float(np.mean(final_balance)),
+    }
+
+
+def _run_task(arguments: Tuple[SweepTask, TradingConfig, BacktestSettings, SweepSettings]) -> Dict[str, Any]:
+    """工作进程执行入口"""
+    task, config, backtest_settings, settings = arguments
+    return evaluate(_worker_path, task, config, backtest_settings, settings, _worker_hit_index)
+
+
+def rank(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """按爆仓概率升序、翻倍概率降序、翻倍时间升序排名"""
+    def key(row):
+        hours = row["median_hours_to_double"]
+        return row["ruin_probability"], -row["double_probability"], hours if hours == hours else float('inf')
+    return sorted(rows, key=key)
+
+
+def run_sweep(path: PricePath, tasks: Sequence[SweepTask], config: TradingConfig,
+              backtest_settings: BacktestSettings, settings: SweepSettings,
+              workers: Optional[int] = None, hit_index_file: Optional[str] = None) -> List[Dict[str, Any]]:
+    """用进程池并行扫描所有参数组合，返回排名后的结果"""
+    workers = workers or os.cpu_count() or 1
+    shared = SharedPricePath(path)
+    try:
+        arguments = [(task, config, backtest_settings, settings) for task in tasks]
+        chunksize = max(1, len(arguments) // (workers * 8))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shared.handle, hit_index_file)) as executor:
+            rows = list(executor.map(_run_task, arguments, chunksize=chunksize))
+    finally:
+        shared.close()
+    return rank(rows)
+
+
+def build_tasks(seeds: Sequence[int], max_multipliers: Sequence[int]) -> List[SweepTask]:
+    """生成所有参数组合"""
+    return [SweepTask(seed, max_multiplier) for seed, max_multiplier in itertools.product(seeds, max_multipliers)]
+
+
+def save_report(rows: List[Dict[str, Any]], file_path: str):
+    """保存排名结果为CSV"""
+    with open(file_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _int_list(text: str) -> List[int]:
+    return [int(value) for value in text.split(',') if value.strip()]
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """种子扫描命令行入口"""
+    parser = argparse.ArgumentParser(prog="sweep", description="RandomMartingale 种子蒙特卡洛扫描")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--bars", help="M1K线文件（.npy、.csv 或 bar_archive 目录）")
+    source.add_argument("--ticks", help="tick文件（.npy、.csv 或 tick_store 目录）")
+    parser.add_argument("--config", default="config.json", help="配置文件")
+    parser.add_argument("--seeds", type=_int_list, help="逗号分隔的种子列表")
+    parser.add_argument("--seed-count", type=int, default=1000, help="未指定 --seeds 时随机抽取的种子数量")
+    parser.add_argument("--sweep-seed", type=int, default=0, help="抽取种子用的随机数种子，保证可复现")
+    parser.add_argument("--max-multipliers", type=_int_list, help="逗号分隔的最大马丁倍数，默认取配置")
+    parser.add_argument("--windows", type=int, default=16, help="每个组合的历史窗口数")
+    parser.add_argument("--horizon-days", type=float, default=2.0, help="每个窗口的天数，0 表示到数据结尾")
+    parser.add_argument("--balance", type=float, default=100.0, help="初始余额")
+    parser.add_argument("--ruin-balance", type=float, default=0.0, help="爆仓判定余额")
+    parser.add_argument("--point", type=float, default=0.001, help="K线 spread 的点值")
+    parser.add_argument("--time-offset", type=int, default=0, help="服务器时间与UTC的秒差")
+    parser.add_argument("--hit-index", help="hit_index.py 生成的首达索引（.npy），与行情文件对应")
+    parser.add_argument("--workers", type=int, help="工作进程数，默认为CPU核心数")
+    parser.add_argument("--top", type=int, default=20, help="输出前N名")
+    parser.add_argument("--out", help="完整排名CSV输出路径")
+    args = parser.parse_args(argv)
+
+    config = ConfigManager(args.config).get_trading_config()
+    if args.seeds:
+        seeds = args.seeds
+    else:
+        # 相邻种子只是时间平移后的同一序列，因此随机抽取而不是连续取值
+        rng = np.random.default_rng(args.sweep_seed)
+        seeds = [int(seed) for seed in rng.integers(10 ** 11, 10 ** 13, size=args.seed_count)]
+    tasks = build_tasks(seeds, args.max_multipliers or [config.max_martingale_multiplier])
+
+    backtest_settings = BacktestSettings(initial_balance=args.balance, point=args.point,
+                                         time_offset=args.time_offset, ruin_balance=args.ruin_balance)
+    settings = SweepSettings(windows=args.windows, horizon=args.horizon_days * 86400 or None)
+
+    if args.bars:
+        path = PricePath.from_bars(load_bars(args.bars), backtest_settings.point)
+    else:
+        path = PricePath.from_ticks(load_ticks(args.ticks))
+
+    logger.info(f"开始扫描 | 参数组合: {len(tasks)} | 每组窗口: {settings.windows} | 进程数: {args.workers or os.cpu_count()}")
+    rows = run_sweep(path, tasks, config, backtest_settings, settings, args.workers, args.hit_index)
+
+    logger.info(f"{'排名':>4} {'种子':>14} {'倍数':>4} {'爆仓率':>7} {'翻倍率':>7} "
+                f"{'翻倍小时':>8} {'连亏':>4} {'最大手数':>8}")
+    for index, row in enumerate(rows[:args.top], 1):
+        logger.info(f"{index:>4} {row['seed']:>14} {row['max_multiplier']:>4} "
+                    f"{row['ruin_probability']:>7.1%} {row['double_probability']:>7.1%} "
+                    f"{row['median_hours_to_double']:>8.1f} {row['worst_streak']:>4} {row['peak_lot']:>8.2f}")
+
+    if args.out:
+        save_report(rows, args.out)
+        logger.info(f"扫描结果已保存: {args.out}")
+    return rows
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,38 @@
+"""
+测试公共设置：把项目根目录加入 sys.path，并在导入 XAUUSD 之前把模拟终端注册为 MetaTrader5
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mt5_sim  # noqa: E402
+
+mt5_sim.install()
+
+
+def random_walk_bars(days: float = 2.0, start: int = 1700000000, price: float = 3300.0,
+                     minute_std: float = 0.6, seed: int = 7) -> np.ndarray:
+    """合成M1K线：收盘价按随机游走（每分钟标准差 minute_std），开盘价为上一根收盘价"""
+    rng = np.random.default_rng(seed)
+    n = int(days * 1440)
+    close = price + np.cumsum(rng.normal(0.0, minute_std, n))
+    open_ = np.r_[price, close[:-1]]
+    wick = np.abs(rng.normal(0.0, minute_std / 2, (2, n)))
+    bars = np.zeros(n, dtype=mt5_sim.RATES_DTYPE)
+    bars['time'] = start - start % 60 + np.arange(n) * 60
+    bars['open'] = open_
+    bars['close'] = close
+    bars['high'] = np.maximum(open_, close) + wick[0]
+    bars['low'] = np.minimum(open_, close) - wick[1]
+    bars['spread'] = 20
+    return bars
+
+
+@pytest.fixture
+def bars() -> np.ndarray:
+    return random_walk_bars()
@@ -0,0 +1,39 @@
+import json
+
+import numpy as np
+import pytest
+
+import mt5_sim
+import XAUUSD
+from backtest import BacktestSettings, PricePath, run_backtest
+
+
+def test_backtest_replays_live_trades(bars, tmp_path):
+    # 报价精度与模拟终端一致（3位小数），止损/止盈价位不受取整影响
+    for name in ('open', 'high', 'low', 'close'):
+        bars[name] = np.round(bars[name], 3)
+    # 平仓检测延迟不超过 check_interval，决策偏移大于它时平仓后总在下一根K线决策，与回测相同
+    config_file = tmp_path / "config.json"
+    config_file.write_text(json.dumps({"trading": {"decision_offset": 10.0}}), encoding='utf-8')
+
+    clock = mt5_sim.SimulatedClock()
+    terminal = mt5_sim.SimulatedTerminal.from_bars("XAUUSDm", bars, clock, balance=1e6)
+    mt5_sim.attach(terminal)
+    clock.reset(terminal.first_time, terminal.last_time)
+    bot = XAUUSD.TradingBot(str(config_file), clock, data_dir=str(tmp_path))
+    with pytest.raises(mt5_sim.SimulationFinished):
+        bot.serve()
+
+    profit = {deal.position_id: deal.profit for deal in terminal.deals if deal.entry == mt5_sim.DEAL_ENTRY_OUT}
+    live = [(deal.time, 1 if deal.type == mt5_sim.DEAL_TYPE_BUY else -1, deal.volume, profit[deal.position_id])
+            for deal in terminal.deals if deal.entry == mt5_sim.DEAL_ENTRY_IN and deal.position_id in profit]
+
+    settings = BacktestSettings(initial_balance=1e6, start_time=terminal.first_time, end_time=terminal.last_time)
+    result = run_backtest(PricePath.from_bars(bars), bot.trading_config, settings)
+    replayed = [(int(trade['entry_time']), int(trade['direction']), round(float(trade['lot_size']), 2),
+                 round(float(trade['pnl']), 2)) for trade in result.trades]
+
+    assert len(live) >= 20
+    # 模拟结束时最后一笔可能已平仓但尚未被检测到
+    assert len(replayed) - len(live) in (0, 1)
+    assert replayed[:len(live)] == live
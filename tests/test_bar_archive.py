@@ -0,0 +1,30 @@
+import numpy as np
+
+import mt5_sim
+from bar_archive import BarArchive, download
+
+
+def test_resume_never_keeps_a_forming_bar(bars, tmp_path):
+    clock = mt5_sim.SimulatedClock()
+    terminal = mt5_sim.SimulatedTerminal.from_bars("XAUUSDm", bars, clock)
+    mt5_sim.attach(terminal)
+    archive = BarArchive(str(tmp_path / "XAUUSDm" / "M1"))
+    start = int(bars['time'][0])
+
+    # 第一次下载时第100根K线刚走了30秒
+    clock.reset(float(bars['time'][100]) + 30)
+    download(archive, "XAUUSDm", "M1", start, chunk_days=0.05, api=mt5_sim, clock=clock)
+    saved = archive.load()
+    assert np.array_equal(saved['time'], bars['time'][:100])
+
+    # 旧版本会把正在形成的K线存下来：手工写入一根不完整的K线，续传后应被重新下载
+    forming = terminal.rates_from_pos(mt5_sim.TIMEFRAME_M1, 0, 1)
+    (key, record), = archive.months.items()
+    archive.save_month(key, np.concatenate([saved, forming]), record["from"], complete=False)
+
+    clock.reset(float(bars['time'][1500]) + 59)
+    download(archive, "XAUUSDm", "M1", start, chunk_days=0.05, api=mt5_sim, clock=clock)
+    resumed = archive.load()
+    assert np.array_equal(resumed['time'], bars['time'][:1500])
+    for name in ('open', 'high', 'low', 'close'):
+        assert np.array_equal(resumed[name], bars[name][:1500])
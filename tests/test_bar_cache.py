@@ -0,0 +1,53 @@
+import numpy as np
+
+import mt5_sim
+import XAUUSD
+
+
+def test_ring_view_is_contiguous_across_wraparound():
+    ring = XAUUSD.BarRing(5, mt5_sim.RATES_DTYPE)
+    bars = np.zeros(13, dtype=mt5_sim.RATES_DTYPE)
+    bars['time'] = np.arange(13) * 60
+    bars['close'] = np.arange(13, dtype=float)
+
+    for count, bar in enumerate(bars, 1):
+        ring.append(bar)
+        assert len(ring) == min(count, 5)
+        assert ring.last_time == bar['time']
+        for n in range(1, 6):
+            view = ring.view(n)
+            # 最近 n 根按时间顺序排列，且是环形缓冲区上不复制的一段连续内存
+            assert view['time'].tolist() == bars['time'][max(0, count - n):count].tolist()
+            assert np.shares_memory(view, ring._data)
+            assert view.flags['C_CONTIGUOUS']
+
+    ring.replace_last(bars[0])
+    assert ring.view(1)['close'].tolist() == [0.0]
+    ring.update_last(20.0)
+    assert ring.view(2)['close'].tolist() == [11.0, 20.0]
+    assert ring.view()['high'][-1] == 20.0
+    ring.append(bars[12])
+    assert ring.view()['close'].tolist() == [9.0, 10.0, 11.0, 20.0, 12.0]
+
+
+def test_cache_matches_terminal_bars(bars):
+    clock = mt5_sim.SimulatedClock()
+    terminal = mt5_sim.SimulatedTerminal.from_bars("XAUUSDm", bars, clock)
+    mt5_sim.attach(terminal)
+    start = terminal.first_time + 600
+    clock.reset(start, terminal.last_time)
+    cache = XAUUSD.BarCache("XAUUSDm", capacity=64)
+
+    # 同一根K线内、跨一根、跨多根以及跨越超过缓存容量的时间跳跃
+    for step in [1, 7, 30, 59, 61, 125, 600, 3, 64 * 60 + 17, 45, 15] * 3:
+        clock.advance(step)
+        now = clock.time()
+        cached = cache.bars(mt5_sim.TIMEFRAME_M1)
+        closed = bars[(bars['time'] + 60 <= now) & (bars['time'] >= terminal.first_time)][-(len(cached) - 1):]
+
+        assert cached['time'][-1] == now // 60 * 60
+        assert np.all(np.diff(cached['time']) == 60)
+        assert np.array_equal(cached[:-1][['time', 'open', 'high', 'low', 'close']],
+                              closed[['time', 'open', 'high', 'low', 'close']])
+        assert cached['close'][-1] == mt5_sim.symbol_info_tick("XAUUSDm").bid
+        assert XAUUSD.StrategyCalculator.get_candle_pattern("XAUUSDm", cache) == int(closed['close'][-1] > closed['open'][-1])
@@ -0,0 +1,27 @@
+import numpy as np
+
+import mt5_sim
+import XAUUSD
+from backtest import PricePath
+
+
+def test_live_and_backtest_read_the_same_candle(bars):
+    clock = mt5_sim.SimulatedClock()
+    terminal = mt5_sim.SimulatedTerminal.from_bars("XAUUSDm", bars, clock)
+    mt5_sim.attach(terminal)
+    offset = XAUUSD.TradingConfig().decision_offset
+
+    bar_path = PricePath.from_bars(bars)
+    tick_path = PricePath.from_ticks(mt5_sim.ticks_from_bars(bars))
+    bar_cache = XAUUSD.BarCache("XAUUSDm")
+
+    for i in range(1, 600):
+        # 实盘在K线开盘后 offset 秒决策；tick回测在该时刻之后的第一笔tick决策
+        decision_time = float(bars['time'][i]) + offset
+        clock.reset(decision_time)
+        live = XAUUSD.StrategyCalculator.get_candle_pattern("XAUUSDm")
+        cached = XAUUSD.StrategyCalculator.get_candle_pattern("XAUUSDm", bar_cache)
+        tick_index = int(np.searchsorted(tick_path.time, decision_time, side='left'))
+
+        expected = int(bars['close'][i - 1] > bars['open'][i - 1])
+        assert live == cached == bar_path.candle[i] == tick_path.candle[tick_index] == expected
@@ -0,0 +1,59 @@
+import collections
+
+import numpy as np
+import pytest
+
+import mt5_sim
+import XAUUSD
+
+
+def test_interval_scales_with_strategy_points():
+    watcher = XAUUSD.CloseWatcher()
+    assert watcher._interval(None) == watcher.max_interval
+    assert watcher._interval(0.0) == watcher.min_interval
+    # 1个策略点以外已经退到最长间隔（原固定轮询周期）
+    assert watcher._interval(1.0) == watcher.max_interval == 5.0
+    assert watcher.min_interval < watcher._interval(2 * watcher.near_distance) < watcher.max_interval
+
+
+def test_close_detection_latency_and_calls(bars, tmp_path, monkeypatch):
+    counts = collections.Counter()
+    for name in mt5_sim._API_FUNCTIONS:
+        function = getattr(mt5_sim, name)
+
+        def counted(*args, _function=function, _name=name, **kwargs):
+            counts[_name] += 1
+            return _function(*args, **kwargs)
+        monkeypatch.setattr(mt5_sim, name, counted)
+
+    detected = {}
+    wait = XAUUSD.CloseWatcher.wait
+
+    def recording_wait(self, symbol, position_info, point=1.0):
+        wait(self, symbol, position_info, point)
+        detected[position_info.ticket] = self.clock.time()
+    monkeypatch.setattr(XAUUSD.CloseWatcher, "wait", recording_wait)
+
+    clock = mt5_sim.SimulatedClock()
+    terminal = mt5_sim.SimulatedTerminal.from_bars("XAUUSDm", bars, clock, balance=1e6)
+    mt5_sim.attach(terminal)
+    clock.reset(terminal.first_time, terminal.last_time)
+    bot = XAUUSD.TradingBot(str(tmp_path / "config.json"), clock, data_dir=str(tmp_path))
+    with pytest.raises(mt5_sim.SimulationFinished):
+        bot.serve()
+
+    opened = {deal.position_id: deal.time for deal in terminal.deals if deal.entry == mt5_sim.DEAL_ENTRY_IN}
+    closed = [deal for deal in terminal.deals
+              if deal.entry == mt5_sim.DEAL_ENTRY_OUT and deal.position_id in detected]
+    assert len(closed) >= 20
+
+    # 止损/止盈成交到机器人发现平仓的延迟不超过原来的固定轮询周期
+    latency = np.array([detected[deal.position_id] - deal.time_msc / 1000.0 for deal in closed])
+    assert latency.min() >= 0
+    assert latency.max() <= bot.trading_config.check_interval
+    assert latency.mean() < bot.trading_config.check_interval / 2
+
+    # 原来每 check_interval 秒 positions_get 一次；贴近价位时加密轮询，总调用数不超过其 1.25 倍
+    duration = sum(deal.time - opened[deal.position_id] for deal in closed) / len(closed)
+    calls_per_trade = sum(counts.values()) / len(closed)
+    assert calls_per_trade < 1.25 * duration / bot.trading_config.check_interval
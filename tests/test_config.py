@@ -0,0 +1,101 @@
+import json
+import logging
+import os
+
+import pytest
+
+from martingale_core import config as config_module
+from martingale_core import ConfigManager, SeedManager, TradingConfig
+
+
+def write_config(path, trading, strategies=None):
+    config = {"mt5": {"login": 0, "server": "", "password": ""}, "trading": trading}
+    if strategies is not None:
+        config["strategies"] = strategies
+    path.write_text(json.dumps(config), encoding="utf-8")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(config_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    path = tmp_path / "config.json"
+    write_config(path, {"seed": 1, "base_lot_size": 0.01},
+                 [{"symbol": "XAUUSDm"}, {"symbol": "EURUSDm", "seed": 2}])
+    return path
+
+
+def test_edit_publishes_new_snapshot(config_file, clock):
+    manager = ConfigManager(str(config_file))
+    seed_manager = SeedManager(manager, strategy=1)
+    before = manager.snapshot
+
+    write_config(config_file, {"seed": 3, "base_lot_size": 0.02},
+                 [{"symbol": "XAUUSDm"}, {"symbol": "EURUSDm", "seed": 4}])
+    clock[0] += manager.min_check_interval
+
+    assert manager.check_for_updates()
+    after = manager.snapshot
+    assert after.version == before.version + 1
+    assert after.trading == TradingConfig.from_dict({"seed": 3, "base_lot_size": 0.02})
+    assert [strategy.seed for strategy in after.strategies] == [3, 4]
+    # 旧快照保持原样，读者不会看到新旧混合的配置
+    assert before.trading.seed == 1 and before.config["trading"]["seed"] == 1
+    assert seed_manager.get_seed() == 4
+
+
+def test_size_only_change_is_detected(config_file, clock):
+    manager = ConfigManager(str(config_file))
+    mtime_ns = os.stat(config_file).st_mtime_ns
+
+    write_config(config_file, {"seed": 12345, "base_lot_size": 0.01},
+                 [{"symbol": "XAUUSDm"}, {"symbol": "EURUSDm", "seed": 2}])
+    os.utime(config_file, ns=(mtime_ns, mtime_ns))
+    clock[0] += manager.min_check_interval
+
+    assert manager.check_for_updates()
+    assert manager.get_trading_config().seed == 12345
+
+
+def test_rapid_recheck_skips_stat(config_file, clock):
+    manager = ConfigManager(str(config_file))
+    write_config(config_file, {"seed": 5, "base_lot_size": 0.01},
+                 [{"symbol": "XAUUSDm"}, {"symbol": "EURUSDm"}])
+
+    clock[0] += manager.min_check_interval / 2
+    assert not manager.check_for_updates()
+    assert manager.version == 1
+
+    clock[0] += manager.min_check_interval / 2
+    assert manager.check_for_updates()
+    assert manager.version == 2
+    # 文件未再改变：过了间隔也不重新解析
+    clock[0] += manager.min_check_interval
+    assert not manager.check_for_updates()
+    assert manager.version == 2
+
+
+def test_rejected_strategies_change_keeps_snapshot(config_file, clock, caplog):
+    manager = ConfigManager(str(config_file))
+    before = manager.snapshot
+
+    write_config(config_file, {"seed": 6, "base_lot_size": 0.01},
+                 [{"symbol": "XAUUSDm"}, {"symbol": "EURUSDm"}, {"symbol": "GBPUSDm"}])
+    clock[0] += manager.min_check_interval
+    with caplog.at_level(logging.ERROR, logger=config_module.__name__):
+        assert not manager.check_for_updates()
+
+    assert manager.snapshot is before
+    assert manager.strategy_count == 2
+    assert "运行中不能增减 strategies" in caplog.text
+
+
+def test_type_error_keeps_original_cause():
+    with pytest.raises(ValueError, match="交易配置类型错误") as excinfo:
+        TradingConfig.from_dict({"base_lot_size": "abc"})
+    assert isinstance(excinfo.value.__cause__, ValueError)
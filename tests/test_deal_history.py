@@ -0,0 +1,41 @@
+import mt5_sim
+import XAUUSD
+from martingale_core import OrderType, TradeStrategy
+
+
+def foreign_deal(terminal, magic, position_id, symbol, profit):
+    """同一魔术号、其他品种或其他实例的平仓成交"""
+    time_msc = int(terminal.clock.time() * 1000)
+    return mt5_sim.TradeDeal(next(terminal._tickets), 0, time_msc // 1000, time_msc, mt5_sim.DEAL_TYPE_SELL,
+                             mt5_sim.DEAL_ENTRY_OUT, magic, position_id, mt5_sim.DEAL_REASON_SL, 0.01, 1.1,
+                             0.0, 0.0, profit, 0.0, symbol, "")
+
+
+def test_foreign_same_magic_deals_are_not_accumulated(bars):
+    clock = mt5_sim.SimulatedClock()
+    terminal = mt5_sim.SimulatedTerminal.from_bars("XAUUSDm", bars, clock, balance=1e6)
+    mt5_sim.attach(terminal)
+    clock.reset(terminal.first_time + 3600, terminal.last_time)
+    executor = XAUUSD.TradeExecutor(234000, clock=clock)
+    history = executor.deal_history
+
+    for _ in range(5):
+        position_info = executor.execute_trade("XAUUSDm", OrderType.BUY, TradeStrategy(2, 2), 0.01, (1, 1, 1, 1))
+        terminal.deals.append(foreign_deal(terminal, 234000, 900000 + len(terminal.deals), "EURUSDm", -50.0))
+        executor.wait_for_close("XAUUSDm", position_info)
+        terminal.deals.append(foreign_deal(terminal, 234000, 900000 + len(terminal.deals), "XAUUSDm", -50.0))
+        history.refresh()
+        assert history.by_position == {} and history.tracked == set()
+
+    # 启动时恢复连亏按品种和魔术号统计：其他品种的亏损不计入
+    own = sorted((deal.time_msc, deal.position_id, deal.profit) for deal in terminal.deals
+                 if deal.symbol == "XAUUSDm" and deal.entry == mt5_sim.DEAL_ENTRY_OUT)
+    streak = history.loss_streak("EURUSDm")
+    assert streak.count == 5 and streak.total_loss == 250.0
+    streak = history.loss_streak("XAUUSDm")
+    expected = 0
+    for _, _, profit in reversed(own):
+        if profit >= 0:
+            break
+        expected += 1
+    assert streak.count == expected
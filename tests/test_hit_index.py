@@ -0,0 +1,24 @@
+import numpy as np
+
+from backtest import PricePath, find_exit
+from hit_index import HitIndex
+
+
+def test_memmap_build_matches_find_exit(bars, tmp_path):
+    path = PricePath.from_bars(bars)
+    file_path = str(tmp_path / "hits.npy")
+
+    # 块大小不整除入场点数，覆盖最后一个不完整的块
+    built = HitIndex.build(path, 1.0, file_path=file_path, chunk_size=1000)
+    in_memory = HitIndex.build(path, 1.0)
+    loaded = HitIndex.load(file_path)
+
+    assert isinstance(built.codes, np.memmap)
+    assert np.array_equal(loaded.codes, in_memory.codes)
+    assert loaded.meta == in_memory.meta
+    for start in range(0, len(path), 97):
+        for is_buy in (True, False):
+            price = path.entry_ask[start] if is_buy else path.entry_bid[start]
+            sign = 1 if is_buy else -1
+            expected = find_exit(path, start, is_buy, price + sign * 3.0, price - sign * 2.0)
+            assert loaded.find_exit(start, is_buy, 3, 2) == expected
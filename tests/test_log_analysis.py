@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from log_analysis import parse_lines
+
+INTERLEAVED = """\
+2025-08-26 20:00:01,000 - INFO - [XAUUSDm#234000] RandomMartingale | BUY | 开仓: 3376.214 | 止损: 2 | 止盈: 3 | 马丁倍数: 1x --( 阴阳阳阳 )-- | 品种: XAUUSDm | 持仓: 1000001
+2025-08-26 20:00:01,200 - INFO - [EURUSDm#234001] RandomMartingale | SELL | 开仓: 1.085 | 止损: 1 | 止盈: 4 | 马丁倍数: 2x --( 阳阴阴阴 )-- | 品种: EURUSDm | 持仓: 1000002
+2025-08-26 20:03:10,000 - INFO - [EURUSDm#234001] 实际平仓价格: 1.08460 | 实际盈亏: 8.00 USD | 余额: $108.00 | 品种: EURUSDm | 持仓: 1000002
+2025-08-26 20:04:01,000 - INFO - [EURUSDm#234001] RandomMartingale | BUY | 开仓: 1.085 | 止损: 3 | 止盈: 2 | 马丁倍数: 1x --( 阴阳阳阴 )-- | 品种: EURUSDm | 持仓: 1000003
+2025-08-26 20:05:30,000 - INFO - [XAUUSDm#234000] 实际平仓价格: 3374.21400 | 实际盈亏: -2.00 USD | 余额: $106.00 | 品种: XAUUSDm | 持仓: 1000001
+2025-08-26 20:06:00,000 - INFO - [EURUSDm#234001] 实际平仓价格: 1.08470 | 实际盈亏: -3.00 USD | 余额: $103.00 | 品种: EURUSDm | 持仓: 1000003
+"""
+
+LEGACY = """\
+[2025-08-26 20:32:54,833] [SUCCESS] RandomMartingale | BUY | 开仓: 3376.214 | 止损: 2 | 止盈: 3 | 马丁倍数: 1x --( 阴阳阳阳 )--
+2025-08-26 20:56:17,883 - INFO - 实际平仓价格: 3374.214 | 实际盈亏: -2.00 USD | 余额: $102.85
+"""
+
+
+def test_interleaved_symbols_pair_by_ticket():
+    trades = np.concatenate(list(parse_lines(INTERLEAVED.splitlines(True))))
+
+    assert len(trades) == 3
+    # 按平仓顺序输出，每笔平仓配对到自己的开仓
+    assert trades['open_price'].tolist() == [1.085, 3376.214, 1.085]
+    assert trades['direction'].tolist() == [-1, 1, 1]
+    assert trades['multiplier'].tolist() == [2, 1, 1]
+    assert trades['sequence'].tolist() == [0b1000, 0b0111, 0b0110]
+    assert trades['pnl'].tolist() == [8.0, -2.0, -3.0]
+    hold_seconds = trades['close_time'] - trades['open_time']
+    assert hold_seconds.tolist() == pytest.approx([188.8, 329.0, 119.0], abs=1e-3)
+
+
+def test_legacy_lines_pair_in_order():
+    (trades,) = parse_lines(LEGACY.splitlines(True))
+
+    assert len(trades) == 1
+    assert trades[0]['open_price'] == 3376.214
+    assert trades[0]['pnl'] == -2.0
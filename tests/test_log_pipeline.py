@@ -0,0 +1,25 @@
+import json
+import logging
+
+from log_pipeline import LogPipeline
+
+
+def test_events_file_only_gets_trade_events(tmp_path):
+    log_file, events_file = tmp_path / "trading_bot.log", tmp_path / "trading_events.jsonl"
+    pipeline = LogPipeline(str(log_file), str(events_file), console=None).start()
+    logger = logging.getLogger("test_log_pipeline")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(pipeline.handler())
+    try:
+        logger.info("等待下一分钟")
+        logger.info("开仓 %.3f", 3376.214, extra={"event": {"type": "open", "price": 3376.214}})
+        logger.warning("下单失败")
+    finally:
+        pipeline.stop()
+        logger.handlers.clear()
+
+    assert len(log_file.read_text(encoding='utf-8').splitlines()) == 3
+    (line,) = events_file.read_text(encoding='utf-8').splitlines()
+    entry = json.loads(line)
+    assert entry["type"] == "open" and entry["message"] == "开仓 3376.214"
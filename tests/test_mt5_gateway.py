@@ -0,0 +1,115 @@
+import threading
+import time
+import types
+
+import mt5_sim
+import XAUUSD
+from martingale_core import OrderType, TradeStrategy
+
+
+class OverlapProbe:
+    """包装终端函数：记录同时执行的调用数和执行线程"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.threads = set()
+
+    def wrap(self, function):
+        def probed(*args, **kwargs):
+            with self._lock:
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+                self.threads.add(threading.current_thread().name)
+            try:
+                time.sleep(0.0005)  # 放大并发窗口
+                return function(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.active -= 1
+        return probed
+
+
+def run_threads(target, count):
+    errors = []
+
+    def guarded(index):
+        try:
+            target(index)
+        except BaseException as e:  # 断言失败也要传回主线程
+            errors.append(e)
+
+    threads = [threading.Thread(target=guarded, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def test_gateway_runs_calls_one_at_a_time_and_keeps_errors_per_thread():
+    probe = OverlapProbe()
+    state = {"error": None}
+
+    def work(caller, call):
+        # 奇数次调用失败，失败原因记录在"终端"的全局 last_error 里
+        if call % 2:
+            state["error"] = (caller, call)
+            return None
+        return caller * 1000 + call
+
+    module = types.SimpleNamespace(TIMEFRAME_M1=1, work=probe.wrap(work), last_error=lambda: state["error"])
+    gateway = XAUUSD.MT5Gateway(module)
+    assert gateway.TIMEFRAME_M1 == 1
+
+    def caller(index):
+        for call in range(20):
+            result = gateway.work(index, call)
+            if call % 2:
+                assert result is None
+                assert gateway.last_error() == (index, call)
+            else:
+                assert result == index * 1000 + call
+
+    run_threads(caller, 8)
+    assert probe.max_active == 1
+    assert probe.threads == {"mt5-gateway"}
+
+
+def test_strategy_threads_share_one_terminal(bars, monkeypatch):
+    clock = mt5_sim.SimulatedClock()
+    terminal = mt5_sim.SimulatedTerminal.from_bars("XAUUSDm", bars, clock, balance=1e6)
+    mt5_sim.attach(terminal)
+    clock.reset(terminal.first_time + 3600, terminal.last_time)
+
+    probe = OverlapProbe()
+    for name in mt5_sim._API_FUNCTIONS:
+        monkeypatch.setattr(mt5_sim, name, probe.wrap(getattr(mt5_sim, name)))
+    # 测试结束后恢复模块级 mt5，后续测试不经过本测试的请求队列
+    monkeypatch.setattr(XAUUSD, "mt5", XAUUSD.mt5)
+    gateway = XAUUSD.serialize_mt5_calls()
+    assert XAUUSD.serialize_mt5_calls() is gateway
+
+    tickets = {}
+
+    def strategy(index):
+        # 同一品种的多个策略以不同 magic_number 区分，见 MultiSymbolEngine
+        magic = 234000 + index
+        executor = XAUUSD.TradeExecutor(magic, clock=clock)
+        bar_cache = XAUUSD.BarCache("XAUUSDm")
+        pattern = XAUUSD.StrategyCalculator.get_candle_pattern("XAUUSDm", bar_cache)
+        assert pattern in (0, 1)
+        order_type = OrderType.BUY if index % 2 else OrderType.SELL
+        position_info = executor.execute_trade("XAUUSDm", order_type, TradeStrategy(3, 2), 0.01, (pattern, 1, 0, 1))
+        assert position_info is not None
+        tickets[magic] = position_info.ticket
+        assert [position.ticket for position in executor.own_positions("XAUUSDm")] == [position_info.ticket]
+
+    run_threads(strategy, 6)
+    assert probe.max_active == 1
+    assert probe.threads == {"mt5-gateway"}
+    assert len(set(tickets.values())) == 6
+    assert {magic: terminal.positions[ticket]['magic'] for magic, ticket in tickets.items()} == \
+        {magic: magic for magic in tickets}
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from scipy.sparse.linalg import splu
+
+from martingale_core import StrategyCalculator, TradeStrategy
+from ruin import LadderModel, RuinChain
+
+# 基础手数下1个策略点盈亏为1美元
+UNIT_MODEL = dict(base_lot_size=0.01, contract_size=100.0, strategy_point=1.0)
+
+
+def test_banded_block_solve_matches_splu(monkeypatch):
+    captured = {}
+    factorize = RuinChain._factorize
+
+    def capture(self, matrix):
+        captured['matrix'] = matrix
+        factorize(self, matrix)
+
+    monkeypatch.setattr(RuinChain, '_factorize', capture)
+    chain = RuinChain(LadderModel(balance=6, max_multiplier=4, **UNIT_MODEL))
+    matrix = captured['matrix']
+    rng = np.random.default_rng(3)
+
+    for H in chain.blocks:
+        m = (H - chain.ruin) * len(chain.levels)
+        rhs = rng.random((m, 2))
+        expected = splu(matrix[:m, :m].tocsc()).solve(rhs)
+        np.testing.assert_allclose(chain._block_solve(rhs), expected, rtol=1e-10, atol=1e-12)
+
+
+@pytest.mark.parametrize("p", [0.5, 0.45])
+def test_flat_ladder_matches_gamblers_ruin(p):
+    # 止盈=止损=1点、最大1倍：就是从 s 出发、到 0 或 2s 停止的简单随机游走
+    strategy_map = {sequence: TradeStrategy(1, 1) for sequence in StrategyCalculator.STRATEGY_MAP}
+    s, n = 10, 20
+    result = RuinChain(LadderModel(balance=s, max_multiplier=1, **UNIT_MODEL), {(1, 1): p}, strategy_map).solve()
+
+    if p == 0.5:
+        ruin, steps = 1 - s / n, s * (n - s)
+    else:
+        ratio = (1 - p) / p
+        ruin = (ratio ** s - ratio ** n) / (1 - ratio ** n)
+        steps = s / (1 - 2 * p) - n / (1 - 2 * p) * (1 - ratio ** s) / (1 - ratio ** n)
+    assert result.ruin_probability == pytest.approx(ruin, abs=1e-10)
+    assert result.double_probability == pytest.approx(1 - ruin, abs=1e-10)
+    assert result.expected_trades == pytest.approx(steps, rel=1e-9)
+
+
+def simulate_ladder(model: LadderModel, paths: int, seed: int):
+    """按实盘规则逐笔模拟：随机数和K线阴阳决定策略，先到止盈的概率 sl/(tp+sl)，亏损翻倍、未回本盈利减半、回本重置"""
+    rng = np.random.default_rng(seed)
+    strategies = [StrategyCalculator.STRATEGY_MAP[tuple((index >> bit) & 1 for bit in (3, 2, 1, 0))]
+                  for index in range(16)]  # 下标的各位依次是 K线、随机数1..3
+    table = np.array([(strategy.tp_points, strategy.sl_points) for strategy in strategies], dtype=float)
+    target = model.balance * model.target_multiple
+    balance = np.full(paths, float(model.balance))
+    drawdown = np.zeros(paths)
+    multiplier = np.ones(paths)
+    trades = np.zeros(paths)
+    active = np.ones(paths, dtype=bool)
+    while active.any():
+        index = np.flatnonzero(active)
+        tp, sl = table[rng.integers(0, 16, len(index))].T
+        win = rng.random(len(index)) < sl / (tp + sl)
+        pnl = np.where(win, tp, -sl) * multiplier[index] * model.point_value
+        balance[index] += pnl
+        trades[index] += 1
+        drawdown[index] = np.maximum(0.0, drawdown[index] - pnl)
+        multiplier[index] = np.where(win, np.where(drawdown[index] > 0, np.maximum(1, multiplier[index] / 2), 1),
+                                     np.minimum(model.max_multiplier, multiplier[index] * 2))
+        active[index] = (balance[index] > model.ruin_balance) & (balance[index] < target)
+    return balance <= model.ruin_balance, trades
+
+
+def test_martingale_ladder_matches_seeded_monte_carlo():
+    model = LadderModel(balance=20, max_multiplier=8, **UNIT_MODEL)
+    result = RuinChain(model).solve()
+    ruined, trades = simulate_ladder(model, paths=100000, seed=11)
+
+    error = np.sqrt(result.ruin_probability * (1 - result.ruin_probability) / len(ruined))
+    assert abs(ruined.mean() - result.ruin_probability) < 4 * error
+    assert trades.mean() == pytest.approx(result.expected_trades, abs=4 * trades.std() / np.sqrt(len(trades)))
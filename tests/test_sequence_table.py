@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from martingale_core import StrategyCalculator
+from sequence_table import SequenceTable, pack, unpack
+
+SEED = 1006111951111
+START = 1700000000
+END = START + 600
+
+
+@pytest.fixture(scope="module")
+def table():
+    # 小分块，覆盖分块拼接的边界
+    return SequenceTable.build(SEED, START, END, chunk_size=128)
+
+
+def test_lookup_matches_random_sequence_at(table):
+    timestamps = np.arange(START, END)
+    expected = [StrategyCalculator.random_sequence_at(SEED, int(t)) for t in timestamps]
+
+    assert len(table) == END - START
+    assert [table.sequence_at(SEED, int(t)) for t in timestamps] == expected
+    assert table.lookup(SEED, timestamps).tolist() == [pack(*sequence) for sequence in expected]
+    r1, r2, r3 = unpack(table.lookup(SEED, timestamps))
+    assert list(zip(r1.tolist(), r2.tolist(), r3.tolist())) == expected
+
+
+def test_other_seed_shares_the_table(table):
+    # 种子 s 在时间 t 的序列就是键 s+t 处的值
+    seed = SEED + 100
+    timestamps = np.arange(START - 100, END - 100)
+    assert table.covers(seed, START - 100, END - 100)
+    assert [table.sequence_at(seed, int(t)) for t in timestamps] == \
+        [StrategyCalculator.random_sequence_at(seed, int(t)) for t in timestamps]
+
+
+def test_covers_edges(table):
+    assert table.covers(SEED, START, END)
+    assert table.covers(SEED, END - 1, END)
+    assert not table.covers(SEED, START - 1, END)
+    assert not table.covers(SEED, START, END + 1)
+
+
+def test_outside_range(table):
+    with pytest.raises(IndexError):
+        table.lookup(SEED, np.array([START - 1]))
+    with pytest.raises(IndexError):
+        table.lookup(SEED, np.array([END]))
+    # 单点查询超出范围时直接计算
+    for timestamp in (START - 1, END):
+        assert table.sequence_at(SEED, timestamp) == StrategyCalculator.random_sequence_at(SEED, timestamp)
+
+
+def test_save_load_roundtrip(table, tmp_path):
+    path = str(tmp_path / "sequences.npy")
+    table.save(path)
+    loaded = SequenceTable.load(path)
+
+    assert loaded.key_start == table.key_start
+    assert np.array_equal(loaded.bits, table.bits)
@@ -0,0 +1,39 @@
+import pytest
+
+import mt5_sim
+import XAUUSD
+
+
+class Crash(BaseException):
+    """模拟进程在持仓期间退出"""
+
+
+def test_restart_settles_position_opened_before_crash(bars, tmp_path):
+    clock = mt5_sim.SimulatedClock()
+    terminal = mt5_sim.SimulatedTerminal.from_bars("XAUUSDm", bars, clock, balance=1e6)
+    mt5_sim.attach(terminal)
+    clock.reset(terminal.first_time + 3600, terminal.last_time)
+    config_file = str(tmp_path / "config.json")
+
+    bot = XAUUSD.TradingBot(config_file, clock, data_dir=str(tmp_path))
+
+    def crash(symbol, position_info):
+        raise Crash()
+    bot.trade_executor.wait_for_close = crash
+    with pytest.raises(Crash):
+        bot.serve()
+    (ticket,) = terminal.positions
+
+    restarted = XAUUSD.TradingBot(config_file, clock, data_dir=str(tmp_path))
+    lot_size = restarted._get_initial_lot_size()
+
+    assert not terminal.positions
+    deals = [deal for deal in terminal.deals if deal.position_id == ticket]
+    pnl = sum(deal.profit + deal.commission + deal.swap for deal in deals)
+    base_lot_size = restarted.trading_config.base_lot_size
+    if pnl < 0:
+        assert lot_size == pytest.approx(2 * base_lot_size)
+        assert restarted.martingale_manager.cumulative_loss == pytest.approx(-pnl)
+    else:
+        assert lot_size == pytest.approx(base_lot_size)
+        assert restarted.martingale_manager.cumulative_loss == 0
@@ -0,0 +1,93 @@
+import collections
+
+import pytest
+
+import mt5_sim
+import XAUUSD
+from XAUUSD import OrderType, SymbolSpec
+
+
+def make_spec(**overrides) -> SymbolSpec:
+    values = dict(symbol="XAUUSDm", point=0.001, digits=3, tick_value=0.1, tick_size=0.001, contract_size=100.0,
+                  volume_min=0.01, volume_max=200.0, volume_step=0.01, stops_level=0,
+                  filling_mode=mt5_sim.SYMBOL_FILLING_FOK | mt5_sim.SYMBOL_FILLING_IOC)
+    values.update(overrides)
+    return SymbolSpec(**values)
+
+
+@pytest.mark.parametrize("step, minimum, maximum, lot, expected", [
+    (0.01, 0.01, 200.0, 0.037, 0.04),
+    (0.01, 0.01, 200.0, 0.1 * 3, 0.3),          # 浮点误差不能留在手数里
+    (0.01, 0.01, 200.0, 0.004, 0.01),           # 低于最小手数
+    (0.01, 0.01, 200.0, 512.0, 200.0),          # 超过最大手数
+    (0.1, 0.1, 50.0, 0.64, 0.6),
+    (0.1, 0.1, 50.0, 0.01, 0.1),
+    (0.5, 1.0, 10.0, 2.3, 2.5),                 # 步长与最小手数不同
+    (0.5, 1.0, 10.0, 0.6, 1.0),
+    (1.0, 1.0, 100.0, 7.6, 8.0),
+])
+def test_normalize_volume(step, minimum, maximum, lot, expected):
+    spec = make_spec(volume_step=step, volume_min=minimum, volume_max=maximum)
+    assert spec.normalize_volume(lot) == expected
+
+
+def test_stop_levels_without_stops_level():
+    tick = mt5_sim.Tick(0, 100.0, 100.05, 100.0, 0, 0, 0, 0.0)
+    spec = make_spec()
+    assert spec.stop_levels(OrderType.BUY, tick, 2.0, 3.0) == (98.05, 103.05)
+    assert spec.stop_levels(OrderType.SELL, tick, 2.0, 3.0) == (102.0, 97.0)
+
+
+def test_stop_levels_clamped_to_stops_level():
+    tick = mt5_sim.Tick(0, 100.0, 100.05, 100.0, 0, 0, 0, 0.0)
+    # 最小止损距离 (300 + 1) * 0.01 = 3.01，相对触发价（多单 bid / 空单 ask）计算
+    spec = make_spec(point=0.01, digits=2, stops_level=300)
+    assert spec.stop_levels(OrderType.BUY, tick, 2.0, 3.0) == (96.99, 103.05)
+    assert spec.stop_levels(OrderType.SELL, tick, 2.0, 3.0) == (103.06, 97.0)
+    assert spec.stop_levels(OrderType.BUY, tick, 0.5, 0.5) == (96.99, 103.01)
+    assert spec.stop_levels(OrderType.SELL, tick, 0.5, 0.5) == (103.06, 97.04)
+
+
+def test_order_filling_preference():
+    assert make_spec().order_filling() == mt5_sim.ORDER_FILLING_IOC
+    assert make_spec(filling_mode=mt5_sim.SYMBOL_FILLING_FOK).order_filling() == mt5_sim.ORDER_FILLING_FOK
+    assert make_spec(filling_mode=0).order_filling() == mt5_sim.ORDER_FILLING_RETURN
+
+
+def test_cache_reloads_on_expiry_and_spec_rejections(bars, monkeypatch):
+    calls = collections.Counter()
+    symbol_info = mt5_sim.symbol_info
+
+    def counted(symbol):
+        calls[symbol] += 1
+        return symbol_info(symbol)
+    monkeypatch.setattr(mt5_sim, "symbol_info", counted)
+
+    clock = mt5_sim.SimulatedClock()
+    terminal = mt5_sim.SimulatedTerminal.from_bars("XAUUSDm", bars, clock)
+    mt5_sim.attach(terminal)
+    clock.reset(terminal.first_time + 60, terminal.last_time)
+    cache = XAUUSD.SymbolSpecCache(clock, max_age=600)
+
+    spec = cache.get("XAUUSDm")
+    assert spec.point == terminal.point and spec.volume_step == terminal.volume_step
+    clock.advance(599)
+    assert cache.get("XAUUSDm") is spec
+    assert calls["XAUUSDm"] == 1
+
+    # 报价类拒单不影响规格，规格类拒单立即失效
+    cache.invalidate("XAUUSDm", mt5_sim.TRADE_RETCODE_REQUOTE)
+    assert cache.get("XAUUSDm") is spec
+    cache.invalidate("XAUUSDm", mt5_sim.TRADE_RETCODE_INVALID_VOLUME)
+    cache.get("XAUUSDm")
+    assert calls["XAUUSDm"] == 2
+
+    clock.advance(600)
+    cache.get("XAUUSDm")
+    assert calls["XAUUSDm"] == 3
+
+    # 读取失败时沿用旧值
+    clock.advance(600)
+    monkeypatch.setattr(mt5_sim, "symbol_info", lambda symbol: None)
+    assert cache.get("XAUUSDm") is not None
+    assert cache.get("EURUSDm") is None
@@ -0,0 +1,26 @@
+import os
+
+import numpy as np
+
+import mt5_sim
+from tick_store import STORE_DTYPE, TickStore
+
+
+def test_missing_index_is_rebuilt_from_data(bars, tmp_path):
+    ticks = mt5_sim.ticks_from_bars(bars)
+    directory = str(tmp_path / "XAUUSDm")
+    store = TickStore(directory, create=True)
+    store.append(ticks[:len(ticks) // 2])
+    store.append(ticks[len(ticks) // 2:])
+    days = [list(row) for row in store.days]
+
+    os.remove(store.index_file)
+    # 末尾写了一半的记录
+    with open(store.data_file, 'ab') as f:
+        f.write(b'\0' * (STORE_DTYPE.itemsize // 2))
+    reopened = TickStore(directory, create=True)
+
+    assert reopened.days == days
+    assert len(reopened) == len(ticks)
+    assert np.array_equal(reopened.ticks()['time_msc'], ticks['time_msc'])
+    assert os.path.exists(reopened.index_file)
@@ -0,0 +1,89 @@
+import pytest
+
+import mt5_sim
+import XAUUSD
+from martingale_core import OrderType, TradeStrategy
+
+
+@pytest.fixture
+def terminal(bars):
+    clock = mt5_sim.SimulatedClock()
+    terminal = mt5_sim.SimulatedTerminal.from_bars("XAUUSDm", bars, clock, balance=1e6)
+    mt5_sim.attach(terminal)
+    clock.reset(terminal.first_time + 3600, terminal.last_time)
+    return terminal
+
+
+def script_order_send(monkeypatch, terminal, retcodes):
+    """前 len(retcodes) 次下单返回指定拒单代码，每次拒单后行情走到下一笔tick；返回 (发出的请求, 结果)"""
+    sent, results = [], []
+    order_send = mt5_sim.order_send
+
+    def scripted(request):
+        sent.append(dict(request))
+        if len(sent) <= len(retcodes):
+            tick = terminal.tick()
+            result = mt5_sim.OrderSendResult(retcodes[len(sent) - 1], 0, 0, 0.0, 0.0, tick.bid, tick.ask,
+                                             "Requote", 0, 0, request)
+            terminal.clock.advance(15.0)
+        else:
+            result = order_send(request)
+        results.append(result)
+        return result
+    monkeypatch.setattr(mt5_sim, "order_send", scripted)
+    return sent, results
+
+
+def test_requote_is_resent_at_fresh_tick(monkeypatch, terminal):
+    executor = XAUUSD.TradeExecutor(clock=terminal.clock, retry_budget=60.0)
+    sent, results = script_order_send(
+        monkeypatch, terminal, [mt5_sim.TRADE_RETCODE_REQUOTE, mt5_sim.TRADE_RETCODE_PRICE_CHANGED])
+    asks = []
+    tick = mt5_sim.symbol_info_tick
+
+    def recording_tick(symbol):
+        asks.append(tick(symbol).ask)
+        return tick(symbol)
+    monkeypatch.setattr(mt5_sim, "symbol_info_tick", recording_tick)
+
+    position_info = executor.execute_trade("XAUUSDm", OrderType.BUY, TradeStrategy(2, 2), 0.01, (1, 1, 1, 1))
+
+    assert position_info is not None
+    assert [result.retcode for result in results] == [mt5_sim.TRADE_RETCODE_REQUOTE,
+                                                      mt5_sim.TRADE_RETCODE_PRICE_CHANGED,
+                                                      mt5_sim.TRADE_RETCODE_DONE]
+    # 每次重发都按刷新后的报价重新计算价格和止损/止盈
+    assert [request["price"] for request in sent] == asks
+    assert len(set(asks)) == 3
+    assert sent[-1]["sl"] == pytest.approx(asks[-1] - 2.0)
+    assert position_info.open_price == terminal.positions[position_info.ticket]['price_open'] == asks[-1]
+    assert executor.metrics.windows["order_attempts"].summary()["max"] == 3
+
+
+def test_non_retryable_retcode_gives_up_at_once(monkeypatch, terminal):
+    executor = XAUUSD.TradeExecutor(clock=terminal.clock, retry_budget=60.0)
+    sent, results = script_order_send(monkeypatch, terminal, [mt5_sim.TRADE_RETCODE_NO_MONEY])
+
+    assert executor.execute_trade("XAUUSDm", OrderType.SELL, TradeStrategy(2, 2), 0.01, (0, 0, 0, 0)) is None
+    assert len(sent) == 1
+    assert results[-1].retcode == mt5_sim.TRADE_RETCODE_NO_MONEY
+    assert not terminal.positions
+
+
+def test_retries_stop_at_attempt_cap(monkeypatch, terminal):
+    executor = XAUUSD.TradeExecutor(clock=terminal.clock, retry_budget=600.0, max_attempts=4)
+    sent, results = script_order_send(monkeypatch, terminal, [mt5_sim.TRADE_RETCODE_REQUOTE] * 10)
+
+    assert executor.execute_trade("XAUUSDm", OrderType.BUY, TradeStrategy(2, 2), 0.01, (1, 1, 1, 1)) is None
+    assert len(sent) == 4
+    assert results[-1].retcode == mt5_sim.TRADE_RETCODE_REQUOTE
+    assert not terminal.positions
+
+
+def test_retries_stop_when_budget_is_spent(monkeypatch, terminal):
+    # 每次拒单行情走15秒，超过0.5秒的重试预算后不再重发
+    executor = XAUUSD.TradeExecutor(clock=terminal.clock)
+    sent, results = script_order_send(monkeypatch, terminal, [mt5_sim.TRADE_RETCODE_REQUOTE] * 10)
+
+    assert executor.execute_trade("XAUUSDm", OrderType.BUY, TradeStrategy(2, 2), 0.01, (1, 1, 1, 1)) is None
+    assert len(sent) == 1
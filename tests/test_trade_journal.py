@@ -0,0 +1,25 @@
+import pytest
+
+import mt5_sim
+import XAUUSD
+
+
+@pytest.mark.parametrize("journal_file", ["trades.db", "journal/sim.db", None])
+def test_journal_opened_only_when_serving(bars, tmp_path, monkeypatch, journal_file):
+    monkeypatch.chdir(tmp_path)
+    data_dir = tmp_path / "data"
+    (data_dir / "journal").mkdir(parents=True)
+    clock = mt5_sim.SimulatedClock()
+    terminal = mt5_sim.SimulatedTerminal.from_bars("XAUUSDm", bars, clock, balance=1e6)
+    mt5_sim.attach(terminal)
+    clock.reset(terminal.first_time, terminal.first_time + 6 * 3600)
+
+    bot = XAUUSD.TradingBot(str(tmp_path / "config.json"), clock, data_dir=str(data_dir),
+                            journal_file=journal_file)
+    assert not list(tmp_path.rglob("*.db"))
+
+    with pytest.raises(mt5_sim.SimulationFinished):
+        bot.serve()
+    created = sorted(path.relative_to(data_dir).as_posix() for path in tmp_path.rglob("*.db"))
+    assert created == ([journal_file] if journal_file else [])
+    assert bot.trade_journal is None and bot.trade_executor.journal is None
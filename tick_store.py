@@ -0,0 +1,288 @@
+"""
+本地tick存储
+每个品种一个目录：ticks.bin 为只追加的定长二进制记录 (time_msc, bid, ask, flags)，index.json 记录每天的起始位置和条数。
+读取时整个文件内存映射为结构化数组，按天或按块返回 NumPy 视图，不复制、不创建逐笔Python对象，
+回放几个月的tick只受磁盘速度限制。导入器批量读取MT5导出的CSV和 copy_ticks_range 保存的 .npy。
+
+用法：
+    python tick_store.py import --store ticks/XAUUSDm XAUUSDm_202501.csv XAUUSDm_202502.npy
+    python tick_store.py info --store ticks/XAUUSDm
+    python XAUUSD.py backtest --ticks ticks/XAUUSDm
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Optional, List, Sequence, Iterator, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 定长记录，28字节
+STORE_DTYPE = np.dtype([('time_msc', '<i8'), ('bid', '<f8'), ('ask', '<f8'), ('flags', '<u4')])
+
+DAY_MSC = 86400 * 1000
+
+
+class TickStore:
+    """只追加的按天索引tick存储"""
+
+    DATA_FILE = "ticks.bin"
+    INDEX_FILE = "index.json"
+
+    def __init__(self, directory: str, create: bool = False):
+        self.directory = directory
+        self.data_file = os.path.join(directory, self.DATA_FILE)
+        self.index_file = os.path.join(directory, self.INDEX_FILE)
+        if create:
+            os.makedirs(directory, exist_ok=True)
+        elif not os.path.exists(self.index_file):
+            raise FileNotFoundError(f"tick存储不存在: {directory}")
+
+        # 每行 [天序号(UTC), 起始记录, 条数]
+        self.days: List[List[int]] = []
+        if os.path.exists(self.index_file):
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                self.days = json.load(f)["days"]
+        self._mapped: Optional[np.ndarray] = None
+        self._recover()
+
+    def __len__(self) -> int:
+        return self.days[-1][1] + self.days[-1][2] if self.days else 0
+
+    def _recover(self):
+        """上次追加写完数据但未写索引就中断时，截掉索引之外的残留记录；索引文件丢失时从数据文件重建"""
+        size = os.path.getsize(self.data_file) if os.path.exists(self.data_file) else 0
+        if size and not os.path.exists(self.index_file):
+            self._rebuild_index(size)
+            return
+        expected = len(self) * STORE_DTYPE.itemsize
+        if size < expected:
+            raise ValueError(f"tick数据文件短于索引记录: {self.data_file}")
+        if size > expected:
+            logger.warning(f"tick存储截断未写入索引的 {(size - expected) // STORE_DTYPE.itemsize} 条记录")
+            with open(self.data_file, 'r+b') as f:
+                f.truncate(expected)
+
+    def _rebuild_index(self, size: int):
+        """按数据文件中的记录重新生成天索引，只丢弃末尾写了一半的记录"""
+        count, partial = divmod(size, STORE_DTYPE.itemsize)
+        if partial:
+            logger.warning(f"tick存储截断末尾不完整的记录 ({partial} 字节)")
+            with open(self.data_file, 'r+b') as f:
+                f.truncate(count * STORE_DTYPE.itemsize)
+        time_msc = np.memmap(self.data_file, dtype=STORE_DTYPE, mode='r', shape=(count,))['time_msc']
+        if np.any(np.diff(time_msc) < 0):
+            raise ValueError(f"tick数据文件不是按时间排序的，无法重建索引: {self.data_file}")
+        days, starts, counts = np.unique(time_msc // DAY_MSC, return_index=True, return_counts=True)
+        self.days = [[day, start, count] for day, start, count in zip(days.tolist(), starts.tolist(), counts.tolist())]
+        self._save_index()
+        logger.warning(f"tick存储索引文件丢失，已从数据文件重建 | 记录: {count} | 天数: {len(self.days)}")
+
+    def _save_index(self):
+        """原子替换索引文件"""
+        temporary = self.index_file + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump({"dtype": STORE_DTYPE.descr, "days": self.days}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.index_file)
+
+    @property
+    def records(self) -> np.ndarray:
+        """整个存储的只读内存映射"""
+        if self._mapped is None or len(self._mapped) != len(self):
+            if len(self) == 0:
+                return np.zeros(0, dtype=STORE_DTYPE)
+            self._mapped = np.memmap(self.data_file, dtype=STORE_DTYPE, mode='r', shape=(len(self),))
+        return self._mapped
+
+    @property
+    def last(self) -> Optional[np.void]:
+        """最后一条记录"""
+        return self.records[-1] if len(self) else None
+
+    def append(self, ticks: np.ndarray, continuation: bool = False) -> int:
+        """追加一批tick（需含 time_msc/bid/ask，可含 flags），返回写入条数
+
+        只保留晚于已存最后一条的部分，重复导入重叠的导出文件不会产生重复记录；
+        同一文件分块导入时 continuation=True，保留与上一块最后一条同一毫秒的tick。
+        """
+        order = np.argsort(ticks['time_msc'], kind='stable')
+        records = np.zeros(len(ticks), dtype=STORE_DTYPE)
+        for name in STORE_DTYPE.names:
+            if name in ticks.dtype.names:
+                records[name] = ticks[name][order]
+        if len(self):
+            last = self.last['time_msc']
+            records = records[records['time_msc'] >= last if continuation else records['time_msc'] > last]
+        if not len(records):
+            return 0
+
+        with open(self.data_file, 'ab') as f:
+            records.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        offset = len(self)
+        days, starts, counts = np.unique(records['time_msc'] // DAY_MSC, return_index=True, return_counts=True)
+        for day, start, count in zip(days.tolist(), starts.tolist(), counts.tolist()):
+            if self.days and self.days[-1][0] == day:
+                self.days[-1][2] += count
+            else:
+                self.days.append([day, offset + start, count])
+        self._save_index()
+        return len(records)
+
+    def _range(self, start_msc: Optional[int], end_msc: Optional[int]) -> Tuple[int, int]:
+        """[start_msc, end_msc) 对应的记录区间，先按天索引缩小范围再二分"""
+        if not self.days:
+            return 0, 0
+        day_numbers = [row[0] for row in self.days]
+        time_msc = self.records['time_msc']
+        first, last = 0, len(self)
+        if start_msc is not None:
+            row = self.days[max(0, int(np.searchsorted(day_numbers, start_msc // DAY_MSC, side='right')) - 1)]
+            first = row[1] + int(np.searchsorted(time_msc[row[1]:row[1] + row[2]], start_msc, side='left'))
+        if end_msc is not None:
+            row = self.days[max(0, int(np.searchsorted(day_numbers, end_msc // DAY_MSC, side='right')) - 1)]
+            last = row[1] + int(np.searchsorted(time_msc[row[1]:row[1] + row[2]], end_msc, side='left'))
+        return first, max(first, last)
+
+    def ticks(self, start_msc: Optional[int] = None, end_msc: Optional[int] = None) -> np.ndarray:
+        """[start_msc, end_msc) 内的tick视图（零拷贝）"""
+        first, last = self._range(start_msc, end_msc)
+        return self.records[first:last]
+
+    def iter_days(self, start_msc: Optional[int] = None, end_msc: Optional[int] = None) -> Iterator[Tuple[int, np.ndarray]]:
+        """按天逐个返回 (天序号, tick视图)"""
+        first, last = self._range(start_msc, end_msc)
+        records = self.records
+        for day, start, count in self.days:
+            lower, upper = max(start, first), min(start + count, last)
+            if lower < upper:
+                yield day, records[lower:upper]
+
+    def iter_chunks(self, chunk_size: int = 1 << 20, start_msc: Optional[int] = None,
+                    end_msc: Optional[int] = None) -> Iterator[np.ndarray]:
+        """按固定条数逐块返回tick视图"""
+        first, last = self._range(start_msc, end_msc)
+        records = self.records
+        for lower in range(first, last, chunk_size):
+            yield records[lower:min(lower + chunk_size, last)]
+
+
+def _fill_forward(values: np.ndarray, carry: float) -> np.ndarray:
+    """MT5导出中只变动一边报价的tick另一边为空，用上一条报价填充（跨块延续）"""
+    invalid = np.isnan(values)
+    if not invalid.any():
+        return values
+    index = np.where(invalid, 0, np.arange(1, len(values) + 1))
+    np.maximum.accumulate(index, out=index)
+    return np.concatenate(([carry], values))[index]
+
+
+def _csv_chunk(header: List[str], rows: List[List[str]]) -> np.ndarray:
+    """把一批CSV行转换为 STORE_DTYPE，日期时间按 datetime64 批量解析"""
+    column = {name: index for index, name in enumerate(header)}
+    chunk = np.zeros(len(rows), dtype=STORE_DTYPE)
+    if 'date' in column:
+        date, time_text = column['date'], column['time']
+        stamps = np.array([f"{row[date].replace('.', '-')}T{row[time_text]}" for row in rows], dtype='datetime64[ms]')
+        chunk['time_msc'] = stamps.astype(np.int64)
+    else:
+        chunk['time_msc'] = [int(float(row[column['time_msc']])) for row in rows]
+    for name in ('bid', 'ask'):
+        chunk[name] = [float(row[column[name]] or 'nan') for row in rows]
+    if 'flags' in column:
+        chunk['flags'] = [int(row[column['flags']] or 0) for row in rows]
+    return chunk
+
+
+def read_chunks(file_path: str, chunk_rows: int = 1 << 20) -> Iterator[np.ndarray]:
+    """流式读取MT5导出的tick CSV（制表符、<DATE>表头）或 copy_ticks_range 保存的 .npy"""
+    if file_path.endswith('.npy'):
+        ticks = np.load(file_path, mmap_mode='r')
+        for start in range(0, len(ticks), chunk_rows):
+            part = ticks[start:start + chunk_rows]
+            chunk = np.zeros(len(part), dtype=STORE_DTYPE)
+            for name in STORE_DTYPE.names:
+                if name in part.dtype.names:
+                    chunk[name] = part[name]
+            yield chunk
+        return
+
+    with open(file_path, 'r', encoding='utf-8-sig', newline='') as f:
+        sample = f.readline()
+        delimiter = '\t' if '\t' in sample else ','
+        f.seek(0)
+        reader = csv.reader(f, delimiter=delimiter)
+        header = [name.strip().strip('<>').lower() for name in next(reader)]
+        rows = []
+        for row in reader:
+            if row:
+                rows.append(row)
+            if len(rows) >= chunk_rows:
+                yield _csv_chunk(header, rows)
+                rows = []
+        if rows:
+            yield _csv_chunk(header, rows)
+
+
+def import_files(store: TickStore, file_paths: Sequence[str], chunk_rows: int = 1 << 20) -> int:
+    """按时间顺序批量导入多个文件，重叠部分自动跳过，返回写入条数"""
+    total = 0
+    last = store.last
+    bid, ask = (float(last['bid']), float(last['ask'])) if last is not None else (np.nan, np.nan)
+    for file_path in file_paths:
+        written = 0
+        for index, chunk in enumerate(read_chunks(file_path, chunk_rows)):
+            chunk['bid'] = _fill_forward(chunk['bid'], bid)
+            chunk['ask'] = _fill_forward(chunk['ask'], ask)
+            if len(chunk):
+                bid, ask = float(chunk['bid'][-1]), float(chunk['ask'][-1])
+            written += store.append(chunk, continuation=index > 0)
+        logger.info(f"导入 {file_path} | 写入: {written} 条")
+        total += written
+    return total
+
+
+def _format_msc(time_msc: int) -> str:
+    return datetime.fromtimestamp(time_msc / 1000, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """tick存储命令行入口"""
+    parser = argparse.ArgumentParser(prog="tick_store", description="本地tick存储")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="批量导入CSV / .npy")
+    importer.add_argument("--store", required=True, help="存储目录（每个品种一个）")
+    importer.add_argument("files", nargs='+', help="按时间顺序排列的tick文件")
+    info = commands.add_parser("info", help="查看存储概况")
+    info.add_argument("--store", required=True, help="存储目录")
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        store = TickStore(args.store, create=True)
+        written = import_files(store, args.files)
+        logger.info(f"导入完成 | 新增: {written} 条 | 合计: {len(store)} 条 | 天数: {len(store.days)}")
+        return store
+
+    store = TickStore(args.store)
+    if len(store):
+        records = store.records
+        logger.info(f"tick存储 {args.store} | 条数: {len(store)} | 天数: {len(store.days)} | "
+                    f"{_format_msc(int(records['time_msc'][0]))} ~ {_format_msc(int(records['time_msc'][-1]))} | "
+                    f"大小: {len(store) * STORE_DTYPE.itemsize / 1e6:.1f} MB")
+    else:
+        logger.info(f"tick存储 {args.store} 为空")
+    return store
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,312 @@
+"""
+交易记录库
+每笔开仓和对账后的平仓写成 SQLite 中的一行（WAL 模式），按时间、品种、卦象、马丁倍数建索引，
+常用统计（某段时间内某卦象、某倍数的交易次数/胜率/盈亏）在多年的记录上也是毫秒级。
+交易线程只把写操作放进队列，后台线程按批在一个事务内提交；查询使用独立的只读连接，不阻塞写入。
+
+用法：
+    python trade_journal.py report --db trades.db --days 7 --sequence 阳阴阳阴 --multiplier 8
+    python trade_journal.py report --db trades.db --start 2025-08-01 --group-by sequence
+    python trade_journal.py import --db trades.db --symbol XAUUSDm 实盘日志.txt trading_bot.log
+    python XAUUSD.py journal report --days 30 --group-by multiplier
+"""
+
+import argparse
+import calendar
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 时间/品种/卦象/倍数索引都带上统计用到的列（覆盖索引），summary 只读索引不回表
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY,
+    ticket INTEGER,
+    magic INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    sequence TEXT NOT NULL,
+    multiplier REAL NOT NULL,
+    lot REAL,
+    tp_points INTEGER,
+    sl_points INTEGER,
+    open_time REAL NOT NULL,
+    open_price REAL NOT NULL,
+    sl REAL,
+    tp REAL,
+    close_time REAL,
+    close_price REAL,
+    pnl REAL,
+    balance REAL,
+    estimated INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS trades_open ON trades (symbol, magic, open_time);
+CREATE INDEX IF NOT EXISTS trades_ticket ON trades (ticket);
+CREATE INDEX IF NOT EXISTS trades_time ON trades (open_time, symbol, sequence, multiplier, pnl);
+CREATE INDEX IF NOT EXISTS trades_symbol ON trades (symbol, open_time, sequence, multiplier, pnl);
+CREATE INDEX IF NOT EXISTS trades_sequence ON trades (sequence, open_time, multiplier, pnl);
+CREATE INDEX IF NOT EXISTS trades_multiplier ON trades (multiplier, open_time, sequence, pnl);
+"""
+
+_OPEN_COLUMNS = ("ticket", "magic", "symbol", "direction", "sequence", "multiplier", "lot", "tp_points",
+                 "sl_points", "open_time", "open_price", "sl", "tp")
+_INSERT_OPEN = (f"INSERT OR IGNORE INTO trades ({', '.join(_OPEN_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(_OPEN_COLUMNS))})")
+_INSERT_TRADE = (f"INSERT OR IGNORE INTO trades ({', '.join(_OPEN_COLUMNS)}, close_time, close_price, pnl, balance) "
+                 f"VALUES ({', '.join('?' * (len(_OPEN_COLUMNS) + 4))})")
+_UPDATE_CLOSE = ("UPDATE trades SET close_time = ?, close_price = ?, pnl = ?, balance = ?, estimated = ? "
+                 "WHERE ticket = ? AND magic = ?")
+
+# summary 的分组键
+GROUP_KEYS = {
+    "sequence": "sequence",
+    "multiplier": "multiplier",
+    "symbol": "symbol",
+    "direction": "direction",
+    "day": "strftime('%Y-%m-%d', open_time, 'unixepoch')",
+    "month": "strftime('%Y-%m', open_time, 'unixepoch')",
+}
+
+
+def sequence_name(sequence: Sequence[int]) -> str:
+    """(K线, r1, r2, r3) -> 阳阴阳阴"""
+    return ''.join('阳' if value == 1 else '阴' for value in sequence)
+
+
+def _connect(file_path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(file_path, timeout=30.0)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+class TradeJournal:
+    """SQLite 交易记录：写入经队列交给后台线程批量提交，查询在调用线程的只读连接上执行"""
+
+    def __init__(self, file_path: str = "trades.db", batch_size: int = 256):
+        self.file_path = file_path
+        self.batch_size = batch_size
+        with _connect(file_path) as connection:
+            connection.executescript(_SCHEMA)
+        connection.close()
+        self._requests: queue.SimpleQueue = queue.SimpleQueue()
+        self._readers = threading.local()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def record_open(self, symbol: str, magic: int, ticket: Optional[int], direction: str, sequence: str,
+                    multiplier: float, lot: float, tp_points: int, sl_points: int, open_time: float,
+                    open_price: float, sl: Optional[float] = None, tp: Optional[float] = None):
+        """记录开仓"""
+        self._submit(_INSERT_OPEN, (ticket, magic, symbol, direction, sequence, round(multiplier, 2), lot,
+                                    tp_points, sl_points, open_time, open_price, sl, tp))
+
+    def record_close(self, ticket: int, magic: int, close_time: float, close_price: float, pnl: float,
+                     balance: Optional[float] = None, estimated: bool = False):
+        """记录对账后的平仓（estimated 表示未查到成交历史、按市价估算）"""
+        self._submit(_UPDATE_CLOSE, (close_time, close_price, pnl, balance, int(estimated), ticket, magic))
+
+    def _submit(self, statement: str, parameters: Tuple):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._serve, name="trade-journal", daemon=True)
+                    self._thread.start()
+        self._requests.put((statement, parameters))
+
+    def _serve(self):
+        connection = _connect(self.file_path)
+        while True:
+            batch = [self._requests.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._requests.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            try:
+                with connection:
+                    for statement, parameters in batch:
+                        if statement is None:
+                            # flush/close 的标记：此前的写入已在本批事务中
+                            stop = stop or parameters[1]
+                            continue
+                        connection.execute(statement, parameters)
+            except sqlite3.Error as e:
+                logger.error(f"交易记录写入失败: {e}")
+            for statement, parameters in batch:
+                if statement is None:
+                    parameters[0].set()
+            if stop:
+                connection.close()
+                return
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待已入队的写入全部提交"""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._requests.put((None, (done, False)))
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 10.0):
+        """提交剩余写入并停止后台线程"""
+        if self._thread is not None:
+            done = threading.Event()
+            self._requests.put((None, (done, True)))
+            done.wait(timeout)
+            self._thread.join(timeout)
+            self._thread = None
+        reader = getattr(self._readers, "connection", None)
+        if reader is not None:
+            reader.close()
+            self._readers.connection = None
+
+    def import_trades(self, rows: Sequence[Tuple]) -> int:
+        """在调用线程内批量导入完整成交（_OPEN_COLUMNS + close_time, close_price, pnl, balance），已存在的跳过"""
+        connection = _connect(self.file_path)
+        try:
+            with connection:
+                before = connection.total_changes
+                connection.executemany(_INSERT_TRADE, rows)
+                return connection.total_changes - before
+        finally:
+            connection.close()
+
+    def _reader(self) -> sqlite3.Connection:
+        connection = getattr(self._readers, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(f"file:{os.path.abspath(self.file_path)}?mode=ro", uri=True)
+            connection.row_factory = sqlite3.Row
+            self._readers.connection = connection
+        return connection
+
+    @staticmethod
+    def _where(start: Optional[float] = None, end: Optional[float] = None, symbol: Optional[str] = None,
+               sequence: Optional[str] = None, multiplier: Optional[float] = None, magic: Optional[int] = None,
+               closed: bool = True) -> Tuple[str, List[Any]]:
+        clauses, parameters = [], []
+        for clause, value in (("open_time >= ?", start), ("open_time < ?", end), ("symbol = ?", symbol),
+                              ("sequence = ?", sequence), ("multiplier = ?", multiplier), ("magic = ?", magic)):
+            if value is not None:
+                clauses.append(clause)
+                parameters.append(value)
+        if closed:
+            clauses.append("pnl IS NOT NULL")
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", parameters
+
+    def trades(self, limit: Optional[int] = None, newest: bool = False, **filters) -> List[Dict[str, Any]]:
+        """按开仓时间排序的成交记录（newest 时从最新的开始），filters 见 _where（start/end 为开仓时间戳）"""
+        where, parameters = self._where(**filters)
+        statement = f"SELECT * FROM trades{where} ORDER BY open_time{' DESC' if newest else ''}"
+        if limit is not None:
+            statement += " LIMIT ?"
+            parameters.append(limit)
+        return [dict(row) for row in self._reader().execute(statement, parameters)]
+
+    def summary(self, group_by: Optional[str] = None, **filters) -> List[Dict[str, Any]]:
+        """交易次数、盈利次数、胜率、总盈亏、平均盈亏和最大单笔亏损，可按 GROUP_KEYS 分组"""
+        where, parameters = self._where(**filters)
+        key = GROUP_KEYS[group_by] if group_by else "NULL"
+        statement = (f"SELECT {key} AS key, COUNT(*) AS trades, SUM(pnl > 0) AS wins, "
+                     f"COALESCE(SUM(pnl), 0) AS pnl, MIN(pnl) AS worst FROM trades{where}"
+                     f"{f' GROUP BY key ORDER BY key' if group_by else ''}")
+        rows = []
+        for row in self._reader().execute(statement, parameters):
+            row = dict(row)
+            if not row["trades"]:
+                continue
+            row["win_rate"] = row["wins"] / row["trades"]
+            row["average"] = row["pnl"] / row["trades"]
+            rows.append(row)
+        return rows
+
+
+def _log_rows(paths: Sequence[str], symbol: str, magic: int, encoding: str = 'utf-8') -> List[Tuple]:
+    """用 log_analysis 解析日志中的开仓/平仓配对，转换为 import_trades 的行（日志中没有单号）"""
+    from log_analysis import parse_lines, read_lines
+
+    rows = []
+    for chunk in parse_lines(read_lines(paths, encoding)):
+        for trade in chunk.tolist():
+            (open_time, close_time, direction, sequence, tp_points, sl_points, multiplier, open_price,
+             close_price, pnl, balance) = trade
+            rows.append((None, magic, symbol, 'BUY' if direction == 1 else 'SELL',
+                         sequence_name([(sequence >> shift) & 1 for shift in (3, 2, 1, 0)]), float(multiplier),
+                         None, tp_points, sl_points, open_time, open_price, None, None,
+                         close_time, close_price, pnl, balance))
+    return rows
+
+
+def _parse_date(text: str) -> int:
+    time_format = '%Y-%m-%d %H:%M' if ' ' in text else '%Y-%m-%d'
+    return calendar.timegm(datetime.strptime(text, time_format).timetuple())
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """交易记录库命令行入口"""
+    parser = argparse.ArgumentParser(prog="trade_journal", description="SQLite 交易记录查询与导入")
+    commands = parser.add_subparsers(dest="command", required=True)
+    report = commands.add_parser("report", help="统计成交")
+    report.add_argument("--db", default="trades.db", help="交易记录库")
+    report.add_argument("--start", help="开仓时间起点 YYYY-MM-DD[ HH:MM]（UTC）")
+    report.add_argument("--end", help="开仓时间终点")
+    report.add_argument("--days", type=float, help="最近多少天（与 --start 二选一）")
+    report.add_argument("--symbol", help="品种")
+    report.add_argument("--sequence", help="卦象，如 阳阴阳阴")
+    report.add_argument("--multiplier", type=float, help="马丁倍数")
+    report.add_argument("--magic", type=int, help="魔术号")
+    report.add_argument("--group-by", choices=sorted(GROUP_KEYS), help="分组统计")
+    report.add_argument("--list", type=int, default=0, help="同时列出最近N笔成交")
+    importer = commands.add_parser("import", help="从交易日志导入历史成交")
+    importer.add_argument("--db", default="trades.db", help="交易记录库")
+    importer.add_argument("--symbol", default="XAUUSDm", help="日志对应的品种")
+    importer.add_argument("--magic", type=int, default=234000, help="日志对应的魔术号")
+    importer.add_argument("--encoding", default="utf-8", help="日志编码")
+    importer.add_argument("logs", nargs='+', help="日志文件，按时间顺序")
+    args = parser.parse_args(argv)
+
+    journal = TradeJournal(args.db)
+    if args.command == "import":
+        rows = _log_rows(args.logs, args.symbol, args.magic, args.encoding)
+        added = journal.import_trades(rows)
+        logger.info(f"导入完成 | 解析成交: {len(rows)} | 新增: {added} | 文件: {args.db}")
+        return added
+
+    start = time.time() - args.days * 86400 if args.days else (_parse_date(args.start) if args.start else None)
+    filters = dict(start=start, end=_parse_date(args.end) if args.end else None, symbol=args.symbol,
+                   sequence=args.sequence, multiplier=args.multiplier, magic=args.magic)
+    query_start = time.perf_counter()
+    rows = journal.summary(args.group_by, **filters)
+    elapsed = (time.perf_counter() - query_start) * 1000
+
+    for row in rows:
+        label = f"{row['key']}" if args.group_by else "合计"
+        logger.info(f"{label:<10} | 次数: {row['trades']:>6} | 胜率: {row['win_rate']:>6.1%} | "
+                    f"盈亏: {row['pnl']:>10.2f} | 平均: {row['average']:>7.2f} | 最大亏损: {row['worst']:>8.2f}")
+    if not rows:
+        logger.info("没有符合条件的成交")
+    logger.info(f"查询耗时: {elapsed:.1f}ms")
+
+    if args.list:
+        for trade in reversed(journal.trades(args.list, newest=True, **filters)):
+            moment = datetime.fromtimestamp(trade['open_time'], timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+            logger.info(f"{moment} | {trade['symbol']} | {trade['direction']} | {trade['sequence']} | "
+                        f"{trade['multiplier']:.0f}x | 开仓: {trade['open_price']:.3f} | "
+                        f"平仓: {trade['close_price']:.3f} | 盈亏: {trade['pnl']:.2f}")
+    journal.close()
+    return rows
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -2,9 +2,10 @@ import MetaTrader5 as mt5
 import time
 import random
 import os
+import logging
 from datetime import datetime
-from Logging import logger
-import pandas as pd
+
+logger = logging.getLogger(__name__)
 
 def 初始化MT5连接():
     """初始化MT5连接"""
@@ -41,11 +42,12 @@ def 生成随机数序列(随机数种子):
     当前时间戳 = int(time.time())
     组合种子 = 随机数种子 + 当前时间戳
     
-    random.seed(组合种子)
+    # 使用独立的随机数生成器，不影响全局 random 状态，结果与 random.seed(组合种子) 相同
+    生成器 = random.Random(组合种子)
     
-    随机数1 = random.randint(0, 1)
-    随机数2 = random.randint(0, 1)
-    随机数3 = random.randint(0, 1)
+    随机数1 = 生成器.randint(0, 1)
+    随机数2 = 生成器.randint(0, 1)
+    随机数3 = 生成器.randint(0, 1)
     
     return 随机数1, 随机数2, 随机数3
 
@@ -134,7 +136,7 @@ def 执行交易(交易品种, 订单类型, TP值, SL值, 手数=0.1, 当前倍
         阴阳显示 = "未知组合"
     
     # 格式化输出开仓信息 - 仿照Terminal#4-9风格
-    logger.success(f"RandomMartingale | {方向} | 开仓: {round(价格, 5)} | 止损: {round(SL值, 5)} | 止盈: {round(TP值, 5)} | 马丁倍数: {当前倍数:.0f}x --( {阴阳显示} )--")
+    logger.info(f"RandomMartingale | {方向} | 开仓: {round(价格, 5)} | 止损: {round(SL值, 5)} | 止盈: {round(TP值, 5)} | 马丁倍数: {当前倍数:.0f}x --( {阴阳显示} )--")
     
     # 返回交易成功状态、订单号和开仓价格
     return True, result.order, {"开仓价格": 价格, "订单类型": 订单类型, "手数": 手数}
@@ -228,50 +230,39 @@ def 分析连续亏损次数():
     """分析连续亏损次数并计算建议马丁倍数"""
     from datetime import datetime, timedelta
     
-    # 获取两天内的历史订单数据
+    # 一次性获取两天内的全部成交记录
     结束时间 = datetime.now()
     开始时间 = 结束时间 - timedelta(days=2)
     
-    # 获取历史订单记录
-    history_orders = mt5.history_orders_get(开始时间, 结束时间)
+    deals = mt5.history_deals_get(开始时间, 结束时间)
     
-    if history_orders is None:
+    if deals is None:
         return 0, 1  # 返回连续亏损次数0，建议倍数1
     
-    # 过滤出本策略的订单（通过magic number识别）
-    本策略订单 = [order for order in history_orders if order.magic == 234000]
+    # 在内存中按持仓ID分组：持仓盈亏 = 该持仓所有买卖成交盈亏之和，平仓时间 = 最后一笔成交时间
+    持仓盈亏 = {}
+    持仓平仓时间 = {}
+    已平仓持仓 = set()
+    for deal in deals:
+        if deal.magic != 234000:
+            continue
+        if deal.type != mt5.DEAL_TYPE_BUY and deal.type != mt5.DEAL_TYPE_SELL:
+            continue
+        持仓盈亏[deal.position_id] = 持仓盈亏.get(deal.position_id, 0) + deal.profit
+        持仓平仓时间[deal.position_id] = max(持仓平仓时间.get(deal.position_id, 0), deal.time_msc)
+        if deal.entry == mt5.DEAL_ENTRY_OUT:
+            已平仓持仓.add(deal.position_id)
     
-    if not 本策略订单:
+    if not 已平仓持仓:
         return 0, 1  # 返回连续亏损次数0，建议倍数1
     
-    # 按时间倒序排列，从最新订单开始分析
-    本策略订单.sort(key=lambda x: x.time_setup, reverse=True)
-    
     连续亏损次数 = 0
     
-    # 从最新订单开始倒序分析
-    for order in 本策略订单:
-        # 获取该订单的交易记录
-        deals = mt5.history_deals_get(ticket=order.ticket)
-        
-        if deals is None or len(deals) == 0:
-            # 尝试通过position_id获取
-            deals = mt5.history_deals_get(position=order.position_id)
-            
-        if deals is None or len(deals) == 0:
-            continue
-        
-        # 计算该订单的盈亏
-        订单盈亏 = 0
-        for deal in deals:
-            if deal.type == mt5.DEAL_TYPE_BUY or deal.type == mt5.DEAL_TYPE_SELL:
-                订单盈亏 += deal.profit
-        
-        # 如果是亏损，增加连续亏损次数
-        if 订单盈亏 < 0:
+    # 从最新平仓的持仓开始倒序分析，遇到第一笔非亏损持仓即停止
+    for 持仓ID in sorted(已平仓持仓, key=lambda x: 持仓平仓时间[x], reverse=True):
+        if 持仓盈亏[持仓ID] < 0:
             连续亏损次数 += 1
         else:
-            # 如果不是亏损，停止统计
             break
     
     # 根据连续亏损次数计算建议倍数：2^连续亏损次数
@@ -297,12 +288,12 @@ def 马丁格尔手数管理(当前手数, 交易结果, 盈亏金额, 基础手
             # 还有未回本的亏损，马丁倍数减半
             新手数 = max(基础手数, 当前手数 / 2)
             新倍数 = 新手数 / 基础手数
-            logger.trace(f"平仓结果: 盈利 +{盈亏金额:.2f} USD | 累计亏损: -{累计亏损金额:.2f} USD | 未回本，马丁减半: {新倍数:.0f}x | 余额: ${account_info.balance:.2f}")
+            logger.info(f"平仓结果: 盈利 +{盈亏金额:.2f} USD | 累计亏损: -{累计亏损金额:.2f} USD | 未回本，马丁减半: {新倍数:.0f}x | 余额: ${account_info.balance:.2f}")
         else:
             # 已回本，重置为基础手数
             新手数 = 基础手数
             新倍数 = 1
-            logger.trace(f"平仓结果: 盈利 +{盈亏金额:.2f} USD | 已回本 | 马丁重置: {新倍数:.0f}x | 余额: ${account_info.balance:.2f}")
+            logger.info(f"平仓结果: 盈利 +{盈亏金额:.2f} USD | 已回本 | 马丁重置: {新倍数:.0f}x | 余额: ${account_info.balance:.2f}")
     elif 交易结果 == "亏损":
         # 累计亏损增加
         累计亏损金额 += abs(盈亏金额)  # 盈亏金额为负数，取绝对值
@@ -315,7 +306,7 @@ def 马丁格尔手数管理(当前手数, 交易结果, 盈亏金额, 基础手
         # 平手时保持当前手数，累计亏损不变
         新手数 = 当前手数
         新倍数 = 新手数 / 基础手数
-        logger.success(f"平仓结果: 平手 {盈亏金额:.2f} USD | 累计亏损: -{累计亏损金额:.2f} USD | 下一次马丁倍数: {新倍数:.0f}x | 余额: ${account_info.balance:.2f}")
+        logger.info(f"平仓结果: 平手 {盈亏金额:.2f} USD | 累计亏损: -{累计亏损金额:.2f} USD | 下一次马丁倍数: {新倍数:.0f}x | 余额: ${account_info.balance:.2f}")
     
     return 新手数
 
@@ -471,4 +462,6 @@ def 主程序():
         mt5.shutdown()
 
 if __name__ == "__main__":
+    import log_pipeline
+    log_pipeline.setup()
     主程序()
\ No newline at end of file